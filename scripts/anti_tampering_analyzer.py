@@ -1,12 +1,39 @@
 import os
 import re
 import argparse
-import json
+from xref_index import load_xref_index, lookup_call_sites, call_site_source
+from source_files import route, route_files, is_scanned_source
+from findings import Finding, FindingWriter
+from findings_store import add_store_arguments, store_from_args
 
-def check_signature_verification(decompiled_dir):
+# the files each check reads, routed in one walk of the decompiled tree
+ROUTES = {
+    "signature_verification": route(),
+    "root_detection": route(),
+    "emulator_detection": route(),
+    "emulator_detection_all": route(scope="all"),
+    "debugger_detection": route()
+}
+
+def find_xref_issues(decompiled_dir, xref_index, xref_rules, issue_type, description_format):
     issues = []
-    java_dir = os.path.join(decompiled_dir, "sources")
     
+    for class_name, method_names, description in xref_rules:
+        for site, api in lookup_call_sites(xref_index, class_name, method_names):
+            # call sites in library, out-of-scope, generated or duplicate code are skipped like the text scan does
+            if not is_scanned_source(decompiled_dir, call_site_source(decompiled_dir, site)):
+                continue
+            issues.append(Finding(
+                issue_type,
+                "INFO",
+                description_format.format(description),
+                call_site_source(decompiled_dir, site),
+                f"{site} calls {api}"
+            ))
+    
+    return issues
+
+def check_signature_verification(decompiled_dir, files, issues):
     signature_patterns = [
         (r'PackageManager\.GET_SIGNATURES', "Signature verification check"),
         (r'getPackageInfo\([^,]+,\s*PackageManager\.GET_SIGNATURES\)', "Signature verification check"),
@@ -15,40 +42,44 @@ def check_signature_verification(decompiled_dir):
         (r'MessageDigest|digest\.update|digest\.digest', "Hash verification")
     ]
     
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
+    # api usage answered from the xref index instead of the text scan
+    signature_xrefs = {
+        r'X509Certificate|CertificateFactory\.getInstance\(': [
+            ("java.security.cert.CertificateFactory", ["getInstance", "generateCertificate"], "Certificate validation"),
+            ("java.security.cert.X509Certificate", None, "Certificate validation")
+        ],
+        r'MessageDigest|digest\.update|digest\.digest': [
+            ("java.security.MessageDigest", None, "Hash verification")
+        ]
+    }
+    
+    xref_index = load_xref_index(decompiled_dir)
+    if xref_index is not None:
+        for xref_rules in signature_xrefs.values():
+            issues.extend(find_xref_issues(decompiled_dir, xref_index, xref_rules, "Anti-Tampering", "Potential {} detected"))
+        signature_patterns = [(p, d) for p, d in signature_patterns if p not in signature_xrefs]
+    
+    for file_path, rel_path in files:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
                 
-                # skip library code
-                if "com/google/" in file_path or "androidx/" in file_path:
-                    continue
-                    
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        for pattern, description in signature_patterns:
-                            matches = re.finditer(pattern, content, re.IGNORECASE)
-                            for match in matches:
-                                context = content[max(0, match.start() - 40):match.end() + 40]
-                                issues.append({
-                                    "type": "Anti-Tampering",
-                                    "severity": "INFO",
-                                    "description": f"Potential {description} detected",
-                                    "location": rel_path,
-                                    "context": context.strip()
-                                })
-                except Exception as e:
-                    continue
+                for pattern, description in signature_patterns:
+                    matches = re.finditer(pattern, content, re.IGNORECASE)
+                    for match in matches:
+                        issues.append(Finding(
+                            "Anti-Tampering",
+                            "INFO",
+                            f"Potential {description} detected",
+                            rel_path,
+                            span=(file_path, match.start(), match.end())
+                        ))
+        except Exception as e:
+            continue
     
     return issues
 
-def check_root_detection(decompiled_dir):
-    issues = []
-    java_dir = os.path.join(decompiled_dir, "sources")
-    
+def check_root_detection(files, issues):
     root_detection_patterns = [
         (r'/system/bin/su|/system/xbin/su|/sbin/su|/system/app/Superuser\.apk|/system/app/SuperSU\.apk', 
          "Root binary detection"),
@@ -59,40 +90,27 @@ def check_root_detection(decompiled_dir):
         (r'RootDetection|detectRootedDevice|isDeviceRooted', "Root detection method")
     ]
     
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
+    for file_path, rel_path in files:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
                 
-                # skip library code
-                if "com/google/" in file_path or "androidx/" in file_path:
-                    continue
-                    
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        for pattern, description in root_detection_patterns:
-                            matches = re.finditer(pattern, content, re.IGNORECASE)
-                            for match in matches:
-                                context = content[max(0, match.start() - 40):match.end() + 40]
-                                issues.append({
-                                    "type": "Root Detection",
-                                    "severity": "INFO",
-                                    "description": f"Potential {description} mechanism found",
-                                    "location": rel_path,
-                                    "context": context.strip()
-                                })
-                except Exception as e:
-                    continue
+                for pattern, description in root_detection_patterns:
+                    matches = re.finditer(pattern, content, re.IGNORECASE)
+                    for match in matches:
+                        issues.append(Finding(
+                            "Root Detection",
+                            "INFO",
+                            f"Potential {description} mechanism found",
+                            rel_path,
+                            span=(file_path, match.start(), match.end())
+                        ))
+        except Exception as e:
+            continue
     
     return issues
 
-def check_emulator_detection(decompiled_dir):
-    issues = []
-    java_dir = os.path.join(decompiled_dir, "sources")
-    
+def check_emulator_detection(files, all_files, issues):
     emulator_detection_patterns = [
         (r'android\.os\.Build\.FINGERPRINT.*?generic|.*?sdk|.*?sdk_gphone', "Build fingerprint check"),
         (r'android\.os\.Build\.MODEL.*?sdk|.*?Emulator|.*?Android SDK', "Device model check"),
@@ -103,11 +121,7 @@ def check_emulator_detection(decompiled_dir):
         (r'qemu|goldfish|x86_64|x86\.', "QEMU/emulator string check")
     ]
     
-    total_files = 0
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                total_files += 1
+    total_files = len(all_files)
         
     # set limits
     max_matches_per_file = 5
@@ -115,69 +129,56 @@ def check_emulator_detection(decompiled_dir):
     files_with_matches = 0
     processed_files = 0
     
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                processed_files += 1
+    for file_path, rel_path in files:
+        processed_files += 1
+        
+        try:
+            file_size = os.path.getsize(file_path)
+            
+            # skip excessively large files
+            if file_size > 1000000:
+                print(f"Skipping large file ({file_size} bytes): {rel_path}")
+                continue
                 
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
                 
-                # skip library code
-                if "com/google/" in file_path or "androidx/" in file_path:
-                    continue
-                    
-                try:
-                    file_size = os.path.getsize(file_path)
-                    
-                    # skip excessively large files
-                    if file_size > 1000000:
-                        print(f"Skipping large file ({file_size} bytes): {rel_path}")
-                        continue
-                        
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        has_matches = False
-                        match_count = 0
+                has_matches = False
+                match_count = 0
+                
+                for pattern, description in emulator_detection_patterns:
+                    if re.search(pattern, content, re.IGNORECASE):
+                        has_matches = True
                         
-                        for pattern, description in emulator_detection_patterns:
-                            if re.search(pattern, content, re.IGNORECASE):
-                                has_matches = True
-                                
-                                if match_count < max_matches_per_file:
-                                    matches = re.finditer(pattern, content, re.IGNORECASE)
-                                    for match in matches:
-                                        match_count += 1
-                                        if match_count > max_matches_per_file:
-                                            break
-                                            
-                                        context = content[max(0, match.start() - 40):match.end() + 40]
-                                        issues.append({
-                                            "type": "Emulator Detection",
-                                            "severity": "INFO",
-                                            "description": f"Potential {description} found",
-                                            "location": rel_path,
-                                            "context": context.strip()
-                                        })
+                        if match_count < max_matches_per_file:
+                            matches = re.finditer(pattern, content, re.IGNORECASE)
+                            for match in matches:
+                                match_count += 1
+                                if match_count > max_matches_per_file:
+                                    break
+                                    
+                                issues.append(Finding(
+                                    "Emulator Detection",
+                                    "INFO",
+                                    f"Potential {description} found",
+                                    rel_path,
+                                    span=(file_path, match.start(), match.end())
+                                ))
+                
+                if has_matches:
+                    files_with_matches += 1
+                    
+                if files_with_matches >= max_files_with_matches:
+                    print(f"Maximum number of files with matches ({max_files_with_matches}) reached. Stopping scan.")
+                    return issues
                         
-                        if has_matches:
-                            files_with_matches += 1
-                            
-                        if files_with_matches >= max_files_with_matches:
-                            print(f"Maximum number of files with matches ({max_files_with_matches}) reached. Stopping scan.")
-                            return issues
-                                
-                except Exception as e:
-                    print(f"Error processing file {rel_path}: {str(e)}")
-                    continue
+        except Exception as e:
+            print(f"Error processing file {rel_path}: {str(e)}")
+            continue
     
     return issues
 
-def check_debugger_detection(decompiled_dir):
-    issues = []
-    java_dir = os.path.join(decompiled_dir, "sources")
-    
+def check_debugger_detection(decompiled_dir, files, issues):
     debug_detection_patterns = [
         (r'Debug\.isDebuggerConnected\(\)', "Debugger connection check"),
         (r'android\.os\.Debug', "Debug class usage"),
@@ -187,61 +188,71 @@ def check_debugger_detection(decompiled_dir):
         (r'attachBaseContext', "Potential runtime manipulation check")
     ]
     
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
+    # api usage answered from the xref index instead of the text scan
+    debug_xrefs = {
+        r'Debug\.isDebuggerConnected\(\)': [
+            ("android.os.Debug", ["isDebuggerConnected", "waitingForDebugger"], "Debugger connection check")
+        ],
+        r'android\.os\.Debug': [
+            ("android.os.Debug", None, "Debug class usage")
+        ],
+        r'ActivityManager\.isUserAMonkey\(\)': [
+            ("android.app.ActivityManager", ["isUserAMonkey"], "Test environment detection")
+        ]
+    }
+    
+    xref_index = load_xref_index(decompiled_dir)
+    if xref_index is not None:
+        for xref_rules in debug_xrefs.values():
+            issues.extend(find_xref_issues(decompiled_dir, xref_index, xref_rules, "Anti-Debugging", "Potential {} detected"))
+        debug_detection_patterns = [(p, d) for p, d in debug_detection_patterns if p not in debug_xrefs]
+    
+    for file_path, rel_path in files:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
                 
-                # skip library code
-                if "com/google/" in file_path or "androidx/" in file_path:
-                    continue
-                    
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        for pattern, description in debug_detection_patterns:
-                            matches = re.finditer(pattern, content, re.IGNORECASE)
-                            for match in matches:
-                                context = content[max(0, match.start() - 40):match.end() + 40]
-                                issues.append({
-                                    "type": "Anti-Debugging",
-                                    "severity": "INFO",
-                                    "description": f"Potential {description} detected",
-                                    "location": rel_path,
-                                    "context": context.strip()
-                                })
-                except Exception as e:
-                    continue
+                for pattern, description in debug_detection_patterns:
+                    matches = re.finditer(pattern, content, re.IGNORECASE)
+                    for match in matches:
+                        issues.append(Finding(
+                            "Anti-Debugging",
+                            "INFO",
+                            f"Potential {description} detected",
+                            rel_path,
+                            span=(file_path, match.start(), match.end())
+                        ))
+        except Exception as e:
+            continue
     
     return issues
 
 def main():
     parser = argparse.ArgumentParser(description="Analyze decompiled APK for anti-tampering mechanisms")
     parser.add_argument("decompiled_dir", help="Path to the decompiled APK directory")
-    parser.add_argument("-o", "--output", help="Output JSON file for results")
+    parser.add_argument("-o", "--output", help="Output file for results, JSON Lines when it ends in .jsonl")
+    parser.add_argument("--details", help="Write every finding here and group repeated ones in the output")
+    add_store_arguments(parser)
     
     args = parser.parse_args()
+    store = store_from_args(parser, args, "anti_tampering_analyzer")
     
-    signature_issues = check_signature_verification(args.decompiled_dir)
-    root_issues = check_root_detection(args.decompiled_dir)
-    emulator_issues = check_emulator_detection(args.decompiled_dir)
-    debug_issues = check_debugger_detection(args.decompiled_dir)
-    
-    all_issues = signature_issues + root_issues + emulator_issues + debug_issues
+    # findings go to the output file as each check produces them
+    files = route_files(args.decompiled_dir, ROUTES)
+    with FindingWriter(args.output, args.decompiled_dir, details_path=args.details, store=store) as all_issues:
+        check_signature_verification(args.decompiled_dir, files["signature_verification"], all_issues)
+        check_root_detection(files["root_detection"], all_issues)
+        check_emulator_detection(files["emulator_detection"], files["emulator_detection_all"], all_issues)
+        check_debugger_detection(args.decompiled_dir, files["debugger_detection"], all_issues)
     
     # print summary
     print(f"\nAnalysis complete! Found {len(all_issues)} potential anti-tampering mechanisms:")
-    print(f"- Signature Verification: {len(signature_issues)} mechanisms")
-    print(f"- Root Detection: {len(root_issues)} mechanisms")
-    print(f"- Emulator Detection: {len(emulator_issues)} mechanisms")
-    print(f"- Anti-Debugging: {len(debug_issues)} mechanisms")
+    print(f"- Signature Verification: {all_issues.type_counts.get('Anti-Tampering', 0)} mechanisms")
+    print(f"- Root Detection: {all_issues.type_counts.get('Root Detection', 0)} mechanisms")
+    print(f"- Emulator Detection: {all_issues.type_counts.get('Emulator Detection', 0)} mechanisms")
+    print(f"- Anti-Debugging: {all_issues.type_counts.get('Anti-Debugging', 0)} mechanisms")
     
-    # save results
     if args.output:
-        with open(args.output, 'w') as f:
-            json.dump(all_issues, f, indent=2)
         print(f"Detailed results saved to {args.output}")
 
 if __name__ == "__main__":
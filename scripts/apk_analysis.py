@@ -0,0 +1,58 @@
+import os
+import sys
+import json
+import argparse
+
+_analysis_cache = {}
+
+def analyze_apk(apk_path):
+    # (apk, dex list, analysis) of one androguard pass, the most expensive step on a large apk,
+    # so every bytecode stage run in the same process shares it
+    apk_path = os.path.abspath(apk_path)
+    if apk_path not in _analysis_cache:
+        from androguard.misc import AnalyzeAPK
+        _analysis_cache[apk_path] = AnalyzeAPK(apk_path)
+    return _analysis_cache[apk_path]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every bytecode analysis of an apk from one androguard pass")
+    parser.add_argument("apk_path", help="Path to the apk file")
+    parser.add_argument("--targeted", metavar="OUTPUT_DIR", help="Decompile the candidate app classes into this directory")
+    parser.add_argument("--package", help="App package to target (defaults to the manifest package)")
+    parser.add_argument("--xref-index", help="Output JSON file for the cross-reference index")
+    parser.add_argument("--fingerprint-db", help="Library fingerprint database (.npz) to match classes against")
+    parser.add_argument("--library-classes", help="Output JSON file for the matched library classes")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Minimum estimated similarity of a library match")
+
+    args = parser.parse_args()
+
+    try:
+        import androguard
+    except ImportError:
+        print("Warning: androguard not installed, skipping bytecode analysis")
+        sys.exit(1 if args.targeted else 0)
+
+    # all of them build on analyze_apk, so the apk is analyzed once
+    from apk_decompiler import decompile_targeted
+    from xref_index import build_xref_index
+    from library_fingerprints import match_library_classes
+
+    if args.targeted and decompile_targeted(args.apk_path, args.targeted, args.package) is None:
+        sys.exit(1)
+
+    if args.xref_index:
+        index = build_xref_index(args.apk_path)
+        if index is not None:
+            with open(args.xref_index, 'w') as f:
+                json.dump(index, f)
+            print(f"Xref index saved to {args.xref_index}")
+
+    if args.fingerprint_db and args.library_classes:
+        print("Matching library class fingerprints...")
+        matches = match_library_classes(args.apk_path, args.fingerprint_db, args.threshold)
+        with open(args.library_classes, 'w') as f:
+            json.dump(matches, f, indent=2)
+        print(f"Matched {len(matches['classes'])} library classes, saved to {args.library_classes}")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,20 @@
 import os
+import re
+import json
+import sys
 import subprocess
 import argparse
 from pathlib import Path
+from source_files import DEOBF_MAP_FILE, class_source_path
+from apk_analysis import analyze_apk
+
+JADX_FLAGS = ["--show-bad-code", "--deobf"]
+
+def jadx_flags(output_dir):
+    # the deobfuscation map is kept with the sources, so dex class names from androguard can be mapped to files
+    return [*JADX_FLAGS,
+            "--deobf-cfg-file", os.path.join(output_dir, DEOBF_MAP_FILE),
+            "--deobf-cfg-file-mode", "read-or-save"]
 
 def decompile_apk(apk_path, output_dir=None):    
     apk_path = os.path.abspath(apk_path)
@@ -27,8 +40,7 @@ def decompile_apk(apk_path, output_dir=None):
         cmd = [
             "jadx",
             "-j", "4",  # using 4 threads
-            "--show-bad-code",
-            "--deobf",
+            *jadx_flags(output_dir),
             "-d", output_dir,
             apk_path
         ]
@@ -46,11 +58,180 @@ def decompile_apk(apk_path, output_dir=None):
         print("  Install with: sudo apt-get install jadx")
         return None
 
+# strings and api classes that make an app class worth decompiling
+CANDIDATE_STRING_PATTERN = re.compile(
+    r'(?i)password|passwd|secret|token|api[_-]?key|credential|auth|firebase|https?://|/system/(x?bin|app)/|test-keys|AES|DES|RSA|SHA-?1|MD5|ECB')
+
+CANDIDATE_API_CLASSES = [
+    "Landroid/webkit/WebView;",
+    "Landroid/webkit/WebSettings;",
+    "Landroid/webkit/WebViewClient;",
+    "Landroid/util/Log;",
+    "Landroid/content/SharedPreferences$Editor;",
+    "Landroid/database/sqlite/SQLiteDatabase;",
+    "Landroid/os/Environment;",
+    "Landroid/os/Debug;",
+    "Landroid/telephony/SmsManager;",
+    "Landroid/telephony/TelephonyManager;",
+    "Ljavax/crypto/Cipher;",
+    "Ljavax/crypto/spec/SecretKeySpec;",
+    "Ljava/security/MessageDigest;",
+    "Ljava/util/Random;",
+    "Ljava/lang/Runtime;",
+    "Ljava/lang/ClassLoader;",
+    "Ldalvik/system/DexClassLoader;"
+]
+
+def outer_class_name(descriptor):
+    # Lcom/example/Foo$1; -> com.example.Foo
+    return descriptor[1:-1].split("$")[0].replace("/", ".")
+
+def find_candidate_classes(apk_path, package=None):
+    try:
+        import androguard
+    except ImportError:
+        print("Error: androguard is required for targeted decompilation")
+        return None
+    
+    try:
+        a, _, dx = analyze_apk(apk_path)
+    except Exception as e:
+        print(f"Error analyzing APK bytecode: {e}")
+        return None
+    package = package or a.get_package()
+    package_prefix = "L" + package.replace(".", "/") + "/"
+    
+    candidates = set()
+    
+    # components declared in the manifest
+    components = a.get_activities() + a.get_services() + a.get_receivers() + a.get_providers()
+    application = a.get_attribute_value("application", "name")
+    if application:
+        components.append(application)
+    for component in components:
+        if component.startswith("."):
+            component = package + component
+        candidates.add("L" + component.replace(".", "/") + ";")
+    
+    # app classes referencing interesting strings
+    for string_analysis in dx.get_strings():
+        if not CANDIDATE_STRING_PATTERN.search(string_analysis.get_value()):
+            continue
+        for class_analysis, _ in string_analysis.get_xref_from():
+            if class_analysis.name.startswith(package_prefix):
+                candidates.add(class_analysis.name)
+    
+    # app classes calling interesting apis
+    for api_class in CANDIDATE_API_CLASSES:
+        class_analysis = dx.get_class_analysis(api_class)
+        if class_analysis is None:
+            continue
+        for caller in class_analysis.get_xref_from():
+            if caller.name.startswith(package_prefix):
+                candidates.add(caller.name)
+    
+    # direct neighbours of the candidates inside the apk
+    neighbours = set()
+    for name in candidates:
+        class_analysis = dx.get_class_analysis(name)
+        if class_analysis is None:
+            continue
+        for other in list(class_analysis.get_xref_to()) + list(class_analysis.get_xref_from()):
+            if not other.is_external():
+                neighbours.add(other.name)
+    
+    return sorted({outer_class_name(name) for name in candidates | neighbours})
+
+def decompile_candidates(dx, classes, output_dir):
+    # androguard's decompiler on the analysis already in memory, one pass for all candidates where jadx
+    # reloads the whole apk for every --single-class run; inner classes go into their outer class's file
+    from androguard.decompiler.decompile import DvClass
+    
+    wanted = set(classes)
+    members = {}
+    for class_analysis in dx.get_internal_classes():
+        outer = outer_class_name(class_analysis.name)
+        if outer in wanted:
+            members.setdefault(outer, []).append(class_analysis)
+    
+    failed = sorted(wanted - set(members))
+    for outer, class_analyses in members.items():
+        sources = []
+        try:
+            for class_analysis in sorted(class_analyses, key=lambda c: ("$" in c.name, c.name)):
+                dv_class = DvClass(class_analysis.get_vm_class(), dx)
+                dv_class.inner = "$" in class_analysis.name
+                dv_class.process()
+                sources.append(dv_class.get_source())
+        except Exception as e:
+            print(f"Warning: Could not decompile {outer}: {e}")
+            failed.append(outer)
+            continue
+        
+        # the path the xref index and library matches resolve the class to, no deobfuscation map here
+        source_path = os.path.join(output_dir, class_source_path(output_dir, outer))
+        Path(os.path.dirname(source_path)).mkdir(parents=True, exist_ok=True)
+        with open(source_path, 'w') as f:
+            f.write("\n".join(sources))
+    
+    return failed
+
+def decompile_targeted(apk_path, output_dir=None, package=None):
+    apk_path = os.path.abspath(apk_path)
+    
+    if not os.path.isfile(apk_path):
+        print(f"Error: APK file not found: {apk_path}")
+        return None
+    
+    if not output_dir:
+        apk_name = os.path.basename(apk_path).split('.')[0]
+        output_dir = f"decompiled_{apk_name}"
+    
+    Path(output_dir).mkdir(exist_ok=True)
+    output_dir = os.path.abspath(output_dir)
+    
+    print(f"Finding candidate classes in {apk_path}...")
+    classes = find_candidate_classes(apk_path, package)
+    if classes is None:
+        return None
+    print(f"Selected {len(classes)} classes for decompilation")
+    
+    try:
+        # resources and manifest only, sources come from the bytecode analysis below
+        cmd = ["jadx", "--no-src", "-d", output_dir, apk_path]
+        print(f"Running command: {' '.join(cmd)}")
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        
+        if result.returncode != 0:
+            print(f"Error during decompilation: {result.stderr}")
+            return None
+    except FileNotFoundError:
+        print("Error: JADX not found. Please install JADX or check your PATH settings.")
+        print("  Install with: sudo apt-get install jadx")
+        return None
+    
+    _, _, dx = analyze_apk(apk_path)
+    failed = decompile_candidates(dx, classes, output_dir)
+    with open(os.path.join(output_dir, "targeted_classes.json"), 'w') as f:
+        json.dump({"classes": classes, "failed": failed}, f, indent=2)
+    
+    print(f"Targeted decompilation finished: {len(classes) - len(failed)}/{len(classes)} classes in {output_dir}")
+    return output_dir
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Decompile APK files using JADX")
     parser.add_argument("apk_path", help="Path to the APK file")
     parser.add_argument("-o", "--output", help="Output directory (optional)")
+    parser.add_argument("--targeted", action="store_true", help="Only decompile candidate app classes and their neighbours")
+    parser.add_argument("--package", help="App package to target (defaults to the manifest package)")
     
     args = parser.parse_args()
     
-    decompile_apk(args.apk_path, args.output)
\ No newline at end of file
+    if args.targeted:
+        output_dir = decompile_targeted(args.apk_path, args.output, args.package)
+    else:
+        output_dir = decompile_apk(args.apk_path, args.output)
+    
+    # the pipeline treats a non-zero exit as a failed stage
+    if output_dir is None:
+        sys.exit(1)
@@ -0,0 +1,462 @@
+import os
+import re
+import json
+import argparse
+import hashlib
+import numpy as np
+from pathlib import Path
+
+from source_files import (iter_source_files, load_library_files, is_library_code, load_scan_scope,
+                          in_scan_scope, write_scan_scope, load_generated_files, write_generated_files,
+                          write_file_manifest)
+from java_tokens import TokenStream, IDENT, STRING
+from generated_files import SKIP, classify_generated, skipped_summary
+
+# per-app data built in one read pass over sources/ and shared by every analyzer process
+APP_INDEX_DIR = ".app_index"
+CLASS_INDEX_FILE = "classes.json"
+LITERAL_TABLE_FILE = "literals.json"
+FILE_METRICS_FILE = "metrics.npz"
+
+PACKAGE_PATTERN = re.compile(r'^\s*package\s+([\w.]+)', re.MULTILINE)
+IMPORT_PATTERN = re.compile(r'^\s*import\s+([\w.]+)\s*;?\s*$', re.MULTILINE)
+JAVA_DECLARATION_PATTERN = re.compile(
+    r'\b(class|interface|enum)\s+(\w+)(?:\s*<[^{]*?>)?'
+    r'(?:\s+extends\s+([\w.$]+(?:\s*<[^{]*?>)?(?:\s*,\s*[\w.$]+(?:\s*<[^{]*?>)?)*))?'
+    r'(?:\s+implements\s+([^{]+?))?\s*\{')
+KOTLIN_DECLARATION_PATTERN = re.compile(r'\b(class|interface|object)\s+(\w+)[^:{\n]*:\s*([^{\n]+)')
+ANONYMOUS_CLASS_PATTERN = re.compile(r'\bnew\s+([\w.$]+)\s*(?:<[^>(]*>)?\s*\([^()]*\)\s*\{')
+GENERICS_PATTERN = re.compile(r'<[^<>]*>')
+# relocated copies of a class differ in the package line and the name in the class declaration
+PACKAGE_LINE_PATTERN = re.compile(r'^[ \t]*package\b[^\n]*\n?', re.MULTILINE)
+
+# per-file identifier statistics and obfuscation signals, one integer column each
+METRIC_COLUMNS = [
+    "lines", "identifiers",
+    "ident_len_1", "ident_len_2", "ident_len_3", "ident_len_4_7", "ident_len_8_plus",
+    "classes", "short_classes", "methods", "short_methods",
+    "reflection", "dynamic_loading", "runtime_loading",
+    "byte_array_strings", "char_code_strings", "custom_encryption"
+]
+IDENT_LENGTH_BINS = np.array([0, 0, 1, 2, 3, 3, 3, 3, 4])
+METHOD_DECLARATION_PATTERN = re.compile(
+    r'^[ \t]*(?:(?:public|private|protected|static|final|abstract|synchronized|native)\s+)+'
+    r'[\w.$<>\[\]?, ]+?\s+(\w+)\s*\(', re.MULTILINE)
+SIGNAL_PATTERNS = {
+    "reflection": re.compile(r'\b(?:getDeclaredMethod|getMethod|getDeclaredField)\s*\('),
+    "dynamic_loading": re.compile(r'\b(?:Class\.forName|loadClass|defineClass)\s*\('),
+    "runtime_loading": re.compile(r'\b(?:DexClassLoader|InMemoryDexClassLoader)\b'),
+    "byte_array_strings": re.compile(r'new\s+String\s*\(\s*new\s+byte\[\]'),
+    "char_code_strings": re.compile(r'String\.fromCharCode\('),
+    "custom_encryption": re.compile(r'Cipher\s*\.\s*getInstance\s*\(')
+}
+
+# framework and support-library edges that are not in the decompiled sources
+KNOWN_SUPERCLASSES = {
+    "android.app.ListActivity": "android.app.Activity",
+    "android.app.ExpandableListActivity": "android.app.Activity",
+    "android.app.NativeActivity": "android.app.Activity",
+    "android.preference.PreferenceActivity": "android.app.ListActivity",
+    "android.accounts.AccountAuthenticatorActivity": "android.app.Activity",
+    "androidx.core.app.ComponentActivity": "android.app.Activity",
+    "androidx.activity.ComponentActivity": "androidx.core.app.ComponentActivity",
+    "androidx.fragment.app.FragmentActivity": "androidx.activity.ComponentActivity",
+    "androidx.appcompat.app.AppCompatActivity": "androidx.fragment.app.FragmentActivity",
+    "android.support.v4.app.FragmentActivity": "android.app.Activity",
+    "android.support.v7.app.AppCompatActivity": "android.support.v4.app.FragmentActivity",
+    "android.app.IntentService": "android.app.Service",
+    "androidx.core.app.JobIntentService": "android.app.Service",
+    "androidx.lifecycle.LifecycleService": "android.app.Service",
+    "com.google.firebase.messaging.FirebaseMessagingService": "android.app.Service",
+    "androidx.webkit.WebViewClientCompat": "android.webkit.WebViewClient"
+}
+
+# well-known simple names, used when a file refers to a class without importing it
+IMPLICIT_IMPORTS = {
+    "Activity": "android.app.Activity",
+    "Service": "android.app.Service",
+    "BroadcastReceiver": "android.content.BroadcastReceiver",
+    "ContentProvider": "android.content.ContentProvider",
+    "Application": "android.app.Application",
+    "WebViewClient": "android.webkit.WebViewClient",
+    "WebChromeClient": "android.webkit.WebChromeClient",
+    "AppCompatActivity": "androidx.appcompat.app.AppCompatActivity",
+    "FragmentActivity": "androidx.fragment.app.FragmentActivity",
+    "Object": "java.lang.Object",
+    "Thread": "java.lang.Thread",
+    "Runnable": "java.lang.Runnable"
+}
+
+_app_index_cache = {}
+_literal_table_cache = {}
+
+def resolve_type(name, package, imports):
+    name = GENERICS_PATTERN.sub("", name).strip()
+    name = re.sub(r'\(.*$', "", name).strip()
+    if not name:
+        return None
+
+    # nested reference such as Outer.Inner resolves through the outer name
+    head, _, rest = name.partition(".")
+    if head in imports:
+        return imports[head] + ("." + rest if rest else "")
+    if "." in name and name[0].islower():
+        return name
+    if name in IMPLICIT_IMPORTS:
+        return IMPLICIT_IMPORTS[name]
+    return f"{package}.{name}" if package else name
+
+def split_types(clause):
+    # split "A<B, C>, D" on top-level commas only
+    clause = clause.strip()
+    while GENERICS_PATTERN.search(clause):
+        clause = GENERICS_PATTERN.sub("", clause)
+    return [t.strip() for t in clause.split(",") if t.strip()]
+
+def parse_class_declarations(content, rel_path):
+    package_match = PACKAGE_PATTERN.search(content)
+    package = package_match.group(1) if package_match else ""
+    imports = {name.split(".")[-1]: name for name in IMPORT_PATTERN.findall(content)}
+
+    classes = {}
+    outer = None
+
+    if rel_path.endswith(".kt"):
+        for kind, name, supertypes in KOTLIN_DECLARATION_PATTERN.findall(content):
+            superclass = None
+            interfaces = []
+            for supertype in split_types(supertypes):
+                resolved = resolve_type(supertype, package, imports)
+                if "(" in supertype and superclass is None:
+                    superclass = resolved
+                else:
+                    interfaces.append(resolved)
+            class_name = f"{package}.{name}" if package else name
+            outer = outer or class_name
+            classes[class_name] = {"file": rel_path, "package": package, "kind": kind,
+                                   "superclass": superclass, "interfaces": interfaces}
+    else:
+        for kind, name, extends, implements in JAVA_DECLARATION_PATTERN.findall(content):
+            extended = [resolve_type(t, package, imports) for t in split_types(extends)] if extends else []
+            implemented = [resolve_type(t, package, imports) for t in split_types(implements)] if implements else []
+
+            # interfaces extend other interfaces, classes extend one class
+            if kind == "interface":
+                superclass, interfaces = None, extended + implemented
+            else:
+                superclass, interfaces = (extended[0] if extended else None), implemented
+
+            class_name = f"{package}.{name}" if package else name
+            if outer is None:
+                outer = class_name
+            elif class_name not in classes:
+                class_name = f"{outer}${name}"
+            classes[class_name] = {"file": rel_path, "package": package, "kind": kind,
+                                   "superclass": superclass, "interfaces": interfaces}
+
+    # anonymous subclasses such as new WebViewClient() { ... }
+    for count, match in enumerate(ANONYMOUS_CLASS_PATTERN.finditer(content), start=1):
+        base = resolve_type(match.group(1), package, imports)
+        owner = outer or rel_path
+        classes[f"{owner}$anonymous{count}"] = {"file": rel_path, "package": package, "kind": "anonymous",
+                                                "superclass": base, "interfaces": [base]}
+
+    return classes
+
+def extract_literals(tokens):
+    # (value, offset, end, assignment target, target offset) for every string literal in a file
+    literals = []
+    content = tokens.content
+
+    for i, kind in enumerate(tokens.kinds):
+        if kind != STRING:
+            continue
+
+        start, end = tokens.starts[i], tokens.ends[i]
+        quote = 3 if content.startswith('"""', start) else 1
+        value = content[start + quote:max(start + quote, end - quote)]
+
+        # name = "value", and kotlin's name: Type = "value"
+        target = None
+        target_offset = None
+        if tokens.is_punct(i - 1, "="):
+            name = i - 2
+            if name >= 2 and tokens.kinds[name] == IDENT and tokens.is_punct(name - 1, ":"):
+                name -= 2
+            if name >= 0 and tokens.kinds[name] == IDENT:
+                target = tokens.text(name)
+                target_offset = tokens.starts[name]
+
+        literals.append((value, start, end, target, target_offset))
+
+    return literals
+
+def file_metrics(tokens, classes):
+    # one row of METRIC_COLUMNS for a file, identifier lengths come straight from the token arrays
+    content = tokens.content
+    kinds = np.frombuffer(tokens.kinds, dtype=np.uint8)
+    lengths = (np.frombuffer(tokens.ends, dtype=np.uint32) - np.frombuffer(tokens.starts, dtype=np.uint32))
+    ident_lengths = lengths[kinds == IDENT]
+    histogram = np.bincount(IDENT_LENGTH_BINS[np.minimum(ident_lengths, 8)], minlength=5)
+
+    class_names = [name.rsplit("$", 1)[-1].rsplit(".", 1)[-1]
+                   for name, info in classes.items() if info["kind"] != "anonymous"]
+    method_names = METHOD_DECLARATION_PATTERN.findall(content)
+
+    row = {
+        "lines": content.count("\n") + 1,
+        "identifiers": len(ident_lengths),
+        "classes": len(class_names),
+        "short_classes": sum(1 for name in class_names if len(name) <= 2),
+        "methods": len(method_names),
+        "short_methods": sum(1 for name in method_names if len(name) <= 2)
+    }
+    for column, count in zip(METRIC_COLUMNS[2:7], histogram.tolist()):
+        row[column] = count
+    for column, pattern in SIGNAL_PATTERNS.items():
+        row[column] = len(pattern.findall(content))
+
+    return [row[column] for column in METRIC_COLUMNS]
+
+def normalized_content(content, rel_path):
+    # (content, edits) with the package line dropped and the declared class name replaced, so relocated or
+    # renamed copies hash alike while imports and every other use of a name still tell classes apart,
+    # edits are [start, end, replacement length] in the original content
+    class_name = os.path.splitext(os.path.basename(rel_path))[0]
+    edits = []
+    package = PACKAGE_LINE_PATTERN.search(content)
+    if package:
+        edits.append([package.start(), package.end(), 0])
+    declaration = re.search(r'\b(?:class|interface|enum|object|record)\s+(' + re.escape(class_name) + r')\b', content)
+    if declaration:
+        edits.append([declaration.start(1), declaration.end(1), 1])
+    edits.sort()
+
+    parts = []
+    position = 0
+    for start, end, length in edits:
+        parts.append(content[position:start])
+        parts.append("$" * length)
+        position = end
+    parts.append(content[position:])
+    return "".join(parts), edits
+
+def app_index_path(decompiled_dir, name):
+    return os.path.join(decompiled_dir, APP_INDEX_DIR, name)
+
+def build_app_index(decompiled_dir):
+    print(f"Building app index for {decompiled_dir}...")
+    classes = {}
+    literal_files = []
+    literals = []
+    metric_files = []
+    metric_rows = []
+
+    generated = {}
+    skipped = {}
+
+    scope = load_scan_scope(decompiled_dir)
+
+    def record_skipped(reason, file_path):
+        entry = skipped.setdefault(reason, {"files": 0, "bytes": 0})
+        entry["files"] += 1
+        entry["bytes"] += os.path.getsize(file_path)
+
+    manifest = {}
+    duplicates = {}
+    file_edits = {}
+    first_path = {}
+
+    # the hierarchy needs every class, literals and metrics only the files in the scan scope,
+    # sorted so the first of several identical files is always the same one
+    sources = sorted(iter_source_files(decompiled_dir, skip_libraries=False, scoped=False), key=lambda x: x[1])
+    for file_path, rel_path in sources:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
+        except Exception as e:
+            continue
+
+        file_classes = parse_class_declarations(content, rel_path)
+        classes.update(file_classes)
+        if not in_scan_scope(rel_path, scope):
+            record_skipped("Outside app scope", file_path)
+            continue
+
+        # generated code is classified from its name and header, skipped files are never tokenized
+        classification = classify_generated(rel_path, content)
+        if classification is not None:
+            generated[rel_path] = classification
+            record_skipped(classification[0], file_path)
+            if classification[1] == SKIP:
+                continue
+
+        # copies of an already indexed file are scanned once, through the first path
+        normalized, file_edits[rel_path] = normalized_content(content, rel_path)
+        content_hash = hashlib.sha1(normalized.encode()).hexdigest()
+        manifest[rel_path] = [content_hash, os.path.getsize(file_path)]
+        if content_hash in first_path:
+            duplicates.setdefault(first_path[content_hash], []).append(rel_path)
+            record_skipped("Duplicate content", file_path)
+            continue
+        first_path[content_hash] = rel_path
+
+        tokens = TokenStream(content)
+        if classification is None:
+            metric_files.append(rel_path)
+            metric_rows.append(file_metrics(tokens, file_classes))
+
+        file_literals = extract_literals(tokens)
+        if file_literals:
+            file_id = len(literal_files)
+            literal_files.append(rel_path)
+            literals.extend([file_id, *literal] for literal in file_literals)
+
+    app_index = {"classes": classes}
+
+    Path(os.path.join(decompiled_dir, APP_INDEX_DIR)).mkdir(exist_ok=True)
+    with open(app_index_path(decompiled_dir, CLASS_INDEX_FILE), 'w') as f:
+        json.dump(classes, f)
+
+    # rows of [file id, value, offset, end, target, target offset] keep the table compact on disk
+    with open(app_index_path(decompiled_dir, LITERAL_TABLE_FILE), 'w') as f:
+        json.dump({"files": literal_files, "literals": literals}, f)
+
+    np.savez_compressed(app_index_path(decompiled_dir, FILE_METRICS_FILE),
+                        files=np.array(metric_files, dtype=str),
+                        columns=np.array(METRIC_COLUMNS),
+                        counts=np.array(metric_rows, dtype=np.int64).reshape(len(metric_rows), len(METRIC_COLUMNS)))
+
+    write_generated_files(decompiled_dir, generated, skipped)
+    # copies get findings at their own offsets, mapped through the normalization edits of both files
+    edits = {rel_path: file_edits[rel_path] for first, copies in duplicates.items()
+             for rel_path in [first, *copies] if file_edits[rel_path]}
+    write_file_manifest(decompiled_dir, manifest, duplicates, edits)
+
+    print(f"Indexed {len(classes)} classes and {len(literals)} string literals")
+    print(f"Skipped {skipped_summary(skipped)}")
+    _literal_table_cache.pop(decompiled_dir, None)
+
+    return app_index
+
+def load_app_index(decompiled_dir):
+    if decompiled_dir in _app_index_cache:
+        return _app_index_cache[decompiled_dir]
+
+    class_index_path = app_index_path(decompiled_dir, CLASS_INDEX_FILE)
+    app_index = None
+    if os.path.exists(class_index_path):
+        try:
+            with open(class_index_path, 'r') as f:
+                app_index = {"classes": json.load(f)}
+        except Exception as e:
+            print(f"Warning: Could not load app index, rebuilding: {e}")
+
+    if app_index is None:
+        app_index = build_app_index(decompiled_dir)
+
+    _app_index_cache[decompiled_dir] = app_index
+    return app_index
+
+def load_literal_table(decompiled_dir):
+    if decompiled_dir in _literal_table_cache:
+        return _literal_table_cache[decompiled_dir]
+
+    table_path = app_index_path(decompiled_dir, LITERAL_TABLE_FILE)
+    if not os.path.exists(table_path):
+        build_app_index(decompiled_dir)
+
+    try:
+        with open(table_path, 'r') as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Warning: Could not load string literal table: {e}")
+        data = {"files": [], "literals": []}
+
+    files = data["files"]
+    table = [{"file": files[file_id], "value": value, "offset": offset, "end": end,
+              "target": target, "target_offset": target_offset}
+             for file_id, value, offset, end, target, target_offset in data["literals"]]
+
+    _literal_table_cache[decompiled_dir] = table
+    return table
+
+def load_file_metrics(decompiled_dir):
+    # (files, counts) with one row per source file and one column per METRIC_COLUMNS entry
+    metrics_path = app_index_path(decompiled_dir, FILE_METRICS_FILE)
+    if not os.path.exists(metrics_path):
+        build_app_index(decompiled_dir)
+
+    data = np.load(metrics_path, allow_pickle=False)
+    if [str(column) for column in data["columns"]] != METRIC_COLUMNS:
+        build_app_index(decompiled_dir)
+        data = np.load(metrics_path, allow_pickle=False)
+
+    return [str(name) for name in data["files"]], data["counts"]
+
+def iter_literals(decompiled_dir, extensions=(".java", ".kt"), skip_libraries=True):
+    # string literals from the files an analyzer would scan, same filtering as iter_source_files
+    library_files = load_library_files(decompiled_dir) if skip_libraries else set()
+    scope = load_scan_scope(decompiled_dir)
+    generated = load_generated_files(decompiled_dir)
+    scanned = {}
+
+    for literal in load_literal_table(decompiled_dir):
+        rel_path = literal["file"]
+        if rel_path not in scanned:
+            # generated files with the minimal policy, such as BuildConfig, stay in the literal rules
+            scanned[rel_path] = rel_path.endswith(extensions) and in_scan_scope(rel_path, scope) and \
+                generated.get(rel_path) != SKIP and not (
+                skip_libraries and is_library_code(os.path.join(decompiled_dir, rel_path), rel_path, library_files))
+        if scanned[rel_path]:
+            yield literal
+
+def literal_span(decompiled_dir, literal):
+    # (source path, start, end) covering a literal and its assignment target
+    start = literal["target_offset"] if literal["target_offset"] is not None else literal["offset"]
+    return os.path.join(decompiled_dir, literal["file"]), start, literal["end"]
+
+def subclasses_of(app_index, base):
+    # every class that transitively extends or implements base
+    children = {}
+    for class_name, info in app_index["classes"].items():
+        for parent in [info["superclass"]] + info["interfaces"]:
+            if parent:
+                children.setdefault(parent, set()).add(class_name)
+    for class_name, parent in KNOWN_SUPERCLASSES.items():
+        children.setdefault(parent, set()).add(class_name)
+
+    found = set()
+    pending = [base]
+    while pending:
+        for child in children.get(pending.pop(), ()):
+            if child not in found:
+                found.add(child)
+                pending.append(child)
+
+    return {name for name in found if name in app_index["classes"]}
+
+def files_of_subclasses(app_index, base):
+    classes = app_index["classes"]
+    return sorted({classes[name]["file"] for name in subclasses_of(app_index, base)})
+
+def file_of_class(app_index, class_name):
+    info = app_index["classes"].get(class_name)
+    return info["file"] if info else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the shared per-app index for a decompiled APK")
+    parser.add_argument("decompiled_dir", help="Path to the decompiled APK directory")
+    parser.add_argument("--scope", choices=["app", "full"], default="app",
+                        help="Scan only the app's own namespaces (default) or the full source tree")
+
+    args = parser.parse_args()
+
+    scope = write_scan_scope(args.decompiled_dir, args.scope)
+    if scope["mode"] == "app":
+        print(f"Scan scope: {', '.join(scope['namespaces'])} and {len(scope['obfuscated_packages'])} renamed packages "
+              f"they import")
+    build_app_index(args.decompiled_dir)
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,93 @@
-import os
 import re
 import argparse
-import json
+from source_files import route, route_files
+from java_tokens import tokenize_file
+from app_index import iter_literals, literal_span
+from findings import Finding, FindingWriter
+from findings_store import add_store_arguments, store_from_args
 
-def analyze_authentication(decompiled_dir):
-    issues = []
-    java_dir = os.path.join(decompiled_dir, "sources")
-    
+# the files each check reads, routed in one walk of the decompiled tree
+ROUTES = {
+    "authentication": route(),
+    "cryptography": route()
+}
+
+def find_password_comparisons(tokens):
+    # x.equals(y) where the receiver or the arguments mention a password, outside comments
+    for i in tokens.identifiers("equals"):
+        if not tokens.is_punct(i - 1, "."):
+            continue
+        arguments = tokens.call_arguments(i)
+        if arguments is None:
+            continue
+        
+        receiver = tokens.receiver_start(i)
+        if tokens.find_in_range(receiver, i, "password") is None and \
+                tokens.find_in_range(arguments[0], arguments[1], "password") is None:
+            continue
+        
+        yield tokens.starts[receiver], tokens.ends[arguments[1]]
+
+def analyze_authentication(decompiled_dir, files, issues):
     # authentication issues
     auth_patterns = [
-        (r'(username|user|login)\s*=\s*["\']([^"\']+)["\']', 
-         "Hardcoded username found"),
-        (r'password\s*=\s*["\']([^"\']+)["\']',
-         "Hardcoded password found"),
         (r'SHA-?1|MD5', 
          "Weak hash algorithm used for passwords"),
-        (r'\.equals\(.*?password', 
-         "Potential timing attack vulnerability in password comparison"),
         (r'getSharedPreferences\([^)]*\)\.getString\([^)]*password[^)]*\)',
          "Reading password from SharedPreferences without encryption")
     ]
     
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
+    for file_path, rel_path in files:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
                 
-                # skip library code
-                if "com/google/" in file_path or "androidx/" in file_path:
-                    continue
-                    
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        for pattern, description in auth_patterns:
-                            matches = re.finditer(pattern, content, re.IGNORECASE)
-                            for match in matches:
-                                context = content[max(0, match.start() - 40):match.end() + 40]
-                                issues.append({
-                                    "type": "Authentication Issue",
-                                    "severity": "HIGH",
-                                    "description": description,
-                                    "location": rel_path,
-                                    "context": context.strip()
-                                })
-                except Exception as e:
-                    continue
+                for pattern, description in auth_patterns:
+                    matches = re.finditer(pattern, content, re.IGNORECASE)
+                    for match in matches:
+                        issues.append(Finding(
+                            "Authentication Issue",
+                            "HIGH",
+                            description,
+                            rel_path,
+                            span=(file_path, match.start(), match.end())
+                        ))
+                
+                if ".equals(" in content and "password" in content.lower():
+                    for start, end in find_password_comparisons(tokenize_file(file_path, content)):
+                        issues.append(Finding(
+                            "Authentication Issue",
+                            "HIGH",
+                            "Potential timing attack vulnerability in password comparison",
+                            rel_path,
+                            span=(file_path, start, end)
+                        ))
+        except Exception as e:
+            continue
+    
+    # hardcoded credentials, matched on the assignment target of each string literal
+    credential_rules = [
+        (re.compile(r'(username|user|login)$', re.IGNORECASE), "Hardcoded username found"),
+        (re.compile(r'password$', re.IGNORECASE), "Hardcoded password found")
+    ]
+    
+    for literal in iter_literals(decompiled_dir):
+        if not literal["target"] or not re.fullmatch(r'[^"\']+', literal["value"]):
+            continue
+        
+        for target_pattern, description in credential_rules:
+            if target_pattern.search(literal["target"]):
+                issues.append(Finding(
+                    "Authentication Issue",
+                    "HIGH",
+                    description,
+                    literal["file"],
+                    span=literal_span(decompiled_dir, literal)
+                ))
     
     return issues
 
-def analyze_cryptography(decompiled_dir):
-    issues = []
-    java_dir = os.path.join(decompiled_dir, "sources")
-    
+def analyze_cryptography(decompiled_dir, files, issues):
     # cryptography issues
     crypto_patterns = [
         (r'DES|3DES|RC2|RC4|BLOWFISH|MD4|MD5|SHA-?1', 
@@ -67,69 +100,73 @@ def analyze_cryptography(decompiled_dir):
          "Cipher implementation - check for proper configuration"),
         (r'java\.util\.Random|Math\.random', 
          "Insecure random number generator used for cryptography"),
-        (r'const val IV|static final byte\[\] IV|final static byte\[\] IV|String IV|static String IV',
+        (r'static final byte\[\] IV|final static byte\[\] IV',
          "Hardcoded Initialization Vector")
     ]
     
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
+    for file_path, rel_path in files:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
                 
-                # skip library code
-                if "com/google/" in file_path or "androidx/" in file_path:
-                    continue
-                    
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
+                for pattern, description in crypto_patterns:
+                    matches = re.finditer(pattern, content, re.IGNORECASE)
+                    for match in matches:
+                        # check for Cipher.getInstance to determine if its a weak config,
+                        # the finding's own context comes from its span
+                        if "Cipher.getInstance" in pattern:
+                            context = content[max(0, match.start() - 40):match.end() + 40]
+                            if "ECB" in context or not ("CBC" in context or "GCM" in context):
+                                description = "Potentially insecure cipher mode (not using CBC/GCM)"
+                            else:
+                                continue
                         
-                        for pattern, description in crypto_patterns:
-                            matches = re.finditer(pattern, content, re.IGNORECASE)
-                            for match in matches:
-                                context = content[max(0, match.start() - 40):match.end() + 40]
-                                
-                                # check for Cipher.getInstance to determine if its a weak config
-                                if "Cipher.getInstance" in pattern:
-                                    if "ECB" in context or not ("CBC" in context or "GCM" in context):
-                                        description = "Potentially insecure cipher mode (not using CBC/GCM)"
-                                    else:
-                                        continue
-                                
-                                issues.append({
-                                    "type": "Cryptography Issue",
-                                    "severity": "HIGH",
-                                    "description": description,
-                                    "location": rel_path,
-                                    "context": context.strip()
-                                })
-                except Exception as e:
-                    continue
+                        issues.append(Finding(
+                            "Cryptography Issue",
+                            "HIGH",
+                            description,
+                            rel_path,
+                            span=(file_path, match.start(), match.end())
+                        ))
+        except Exception as e:
+            continue
+    
+    # string-valued IVs come from the literal table, byte[] initializers are matched above
+    for literal in iter_literals(decompiled_dir):
+        target = (literal["target"] or "").upper()
+        if target == "IV" or target.endswith("_IV"):
+            issues.append(Finding(
+                "Cryptography Issue",
+                "HIGH",
+                "Hardcoded Initialization Vector",
+                literal["file"],
+                span=literal_span(decompiled_dir, literal)
+            ))
     
     return issues
 
 def main():
     parser = argparse.ArgumentParser(description="Analyze decompiled APK for authentication and cryptography issues")
     parser.add_argument("decompiled_dir", help="Path to the decompiled APK directory")
-    parser.add_argument("-o", "--output", help="Output JSON file for results")
+    parser.add_argument("-o", "--output", help="Output file for results, JSON Lines when it ends in .jsonl")
+    parser.add_argument("--details", help="Write every finding here and group repeated ones in the output")
+    add_store_arguments(parser)
     
     args = parser.parse_args()
+    store = store_from_args(parser, args, "auth_crypto_analyzer")
     
-    auth_issues = analyze_authentication(args.decompiled_dir)
-    crypto_issues = analyze_cryptography(args.decompiled_dir)
-    
-    all_issues = auth_issues + crypto_issues
+    # findings go to the output file as each check produces them
+    files = route_files(args.decompiled_dir, ROUTES)
+    with FindingWriter(args.output, args.decompiled_dir, details_path=args.details, store=store) as all_issues:
+        analyze_authentication(args.decompiled_dir, files["authentication"], all_issues)
+        analyze_cryptography(args.decompiled_dir, files["cryptography"], all_issues)
     
     # print summary
     print(f"\nAnalysis complete! Found {len(all_issues)} potential auth/crypto issues:")
-    print(f"- Authentication Issues: {len(auth_issues)} issues")
-    print(f"- Cryptography Issues: {len(crypto_issues)} issues")
+    print(f"- Authentication Issues: {all_issues.type_counts.get('Authentication Issue', 0)} issues")
+    print(f"- Cryptography Issues: {all_issues.type_counts.get('Cryptography Issue', 0)} issues")
     
-    # save results
     if args.output:
-        with open(args.output, 'w') as f:
-            json.dump(all_issues, f, indent=2)
         print(f"Detailed results saved to {args.output}")
 
 if __name__ == "__main__":
@@ -0,0 +1,254 @@
+import os
+import argparse
+import sqlite3
+import threading
+import time
+import json
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from main import run_analysis, file_sha256, parse_stage_limits
+
+JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sha256 TEXT NOT NULL UNIQUE,
+    apk_path TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    output_dir TEXT,
+    total_issues INTEGER,
+    incomplete_stages TEXT,
+    error TEXT,
+    queued_at REAL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, id);
+"""
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+def collect_apks(source):
+    # a directory is scanned for .apk files, anything else is a manifest of "path [priority]" lines
+    apks = []
+
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for file in sorted(files):
+                if file.endswith(".apk"):
+                    apks.append((os.path.join(root, file), 0))
+        return apks
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            parts = line.rsplit(None, 1)
+            priority = 0
+            if len(parts) == 2 and parts[1].lstrip("-").isdigit():
+                line, priority = parts[0], int(parts[1])
+
+            apks.append((os.path.join(base_dir, line), priority))
+
+    return apks
+
+def enqueue_apks(conn, apks, output_root):
+    queued = 0
+    duplicates = 0
+    missing = 0
+
+    conn.execute("BEGIN")
+    for apk_path, priority in apks:
+        if not os.path.isfile(apk_path):
+            print(f"Warning: APK file not found: {apk_path}")
+            missing += 1
+            continue
+
+        sha256 = file_sha256(apk_path)
+        app_name = os.path.basename(apk_path).split('.')[0]
+        output_dir = os.path.join(output_root, f"{app_name}_{sha256[:12]}")
+
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO jobs (sha256, apk_path, priority, output_dir, queued_at) VALUES (?, ?, ?, ?, ?)",
+            (sha256, os.path.abspath(apk_path), priority, output_dir, time.time()))
+
+        if cursor.rowcount:
+            queued += 1
+        else:
+            # same content already known, keep the highest priority asked for
+            conn.execute("UPDATE jobs SET priority = MAX(priority, ?) WHERE sha256 = ?", (priority, sha256))
+            duplicates += 1
+    conn.execute("COMMIT")
+
+    print(f"Queued {queued} APKs ({duplicates} duplicates, {missing} missing)")
+
+def claim_job(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    job = conn.execute(
+        "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority DESC, id LIMIT 1").fetchone()
+    if job is not None:
+        conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ? WHERE id = ?",
+                     (time.time(), job["id"]))
+    conn.execute("COMMIT")
+    return job
+
+def finish_job(conn, job, result, error, max_attempts):
+    incomplete = {}
+    if result is not None:
+        incomplete = {s: d["status"] for s, d in result["stage_status"].items()
+                      if d["status"] not in ("completed", "skipped")}
+
+    if result is not None and not incomplete:
+        status = "completed"
+    elif job["attempts"] + 1 < max_attempts:
+        status = "queued"
+    elif result is not None:
+        status = "incomplete"
+    else:
+        status = "failed"
+
+    conn.execute(
+        "UPDATE jobs SET status = ?, total_issues = ?, incomplete_stages = ?, error = ?, finished_at = ? WHERE id = ?",
+        (status,
+         result["total_issues"] if result else None,
+         json.dumps(incomplete) if incomplete else None,
+         error,
+         time.time(),
+         job["id"]))
+
+    return status
+
+def worker(db_path, options, decompile_slots):
+    conn = connect(db_path)
+
+    while True:
+        job = claim_job(conn)
+        if job is None:
+            break
+
+        print(f"\n=== [{job['id']}] {job['apk_path']} (attempt {job['attempts'] + 1}) ===")
+        result = None
+        error = None
+        try:
+            # retries pick up from the checkpoints of the previous attempt
+            result = run_analysis(job["apk_path"], job["output_dir"],
+                                  targeted=options["targeted"],
+                                  resume=options["resume"] or job["attempts"] > 0,
+                                  limits=options["limits"],
+                                  decompile_slots=decompile_slots,
+                                  fingerprint_db=options["fingerprint_db"],
+                                  scope=options["scope"],
+                                  store=options["store"])
+            if result is None:
+                error = "decompilation failed"
+        except Exception as e:
+            error = str(e)
+
+        try:
+            status = finish_job(conn, job, result, error, options["max_attempts"])
+        except sqlite3.Error as e:
+            # the job stays 'running' and is queued again by the next batch
+            print(f"Error: Could not record the result of job {job['id']}: {e}")
+            continue
+        print(f"=== [{job['id']}] {os.path.basename(job['apk_path'])}: {status} ===")
+
+    conn.close()
+
+def print_summary(conn, duration):
+    print("\nBatch complete!")
+    print(f"Time taken: {duration:.2f} seconds")
+
+    for row in conn.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status ORDER BY status"):
+        print(f"- {row['status']}: {row['count']} APKs")
+
+    total = conn.execute("SELECT SUM(total_issues) FROM jobs WHERE total_issues IS NOT NULL").fetchone()[0]
+    print(f"Total issues found: {total or 0}")
+
+    problems = conn.execute(
+        "SELECT apk_path, status, attempts, error, incomplete_stages FROM jobs "
+        "WHERE status IN ('failed', 'incomplete') ORDER BY id").fetchall()
+    if problems:
+        print("\nAPKs needing attention:")
+        for row in problems:
+            detail = row["error"] or f"incomplete stages: {row['incomplete_stages']}"
+            print(f"- {row['apk_path']}: {row['status']} after {row['attempts']} attempts ({detail})")
+
+def run_batch(source, output_root, workers=2, max_jadx=1, memory_limit_mb=None, timeout=None,
+              max_attempts=2, targeted=False, resume=False, db_path=None, requeue_failed=False,
+              fingerprint_db=None, scope="app", store=None):
+    start_time = time.time()
+    Path(output_root).mkdir(parents=True, exist_ok=True)
+    db_path = db_path or os.path.join(output_root, "batch_jobs.db")
+
+    conn = connect(db_path)
+    conn.executescript(JOB_SCHEMA)
+
+    # jobs left running by a killed batch go back on the queue
+    conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+    if requeue_failed:
+        conn.execute("UPDATE jobs SET status = 'queued', attempts = 0 WHERE status IN ('failed', 'incomplete')")
+
+    enqueue_apks(conn, collect_apks(source), output_root)
+
+    # the memory budget is shared between the workers
+    per_job_memory = memory_limit_mb // workers if memory_limit_mb else None
+    options = {
+        "targeted": targeted,
+        "resume": resume,
+        "limits": parse_stage_limits(timeout, per_job_memory),
+        "max_attempts": max_attempts,
+        "fingerprint_db": fingerprint_db,
+        "scope": scope,
+        "store": store
+    }
+    decompile_slots = threading.Semaphore(max_jadx)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(worker, db_path, options, decompile_slots) for _ in range(workers)]
+
+    # a worker that died on a database error would otherwise go unnoticed
+    for future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Error: Batch worker stopped: {e}")
+
+    print_summary(conn, time.time() - start_time)
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run security analysis on a batch of android apks")
+    parser.add_argument("source", help="Directory of apk files or a manifest with one 'path [priority]' per line")
+    parser.add_argument("-o", "--output", default="batch_analysis", help="Output directory for all scans")
+    parser.add_argument("-w", "--workers", type=int, default=2, help="Number of apks analyzed concurrently")
+    parser.add_argument("--max-jadx", type=int, default=1, help="Maximum concurrent jadx processes")
+    parser.add_argument("--memory-limit", type=int, help="Total memory budget in MB, split between workers")
+    parser.add_argument("--timeout", type=float, help="Wall-clock limit per stage in seconds")
+    parser.add_argument("--retries", type=int, default=1, help="Retries for a failed or incomplete apk")
+    parser.add_argument("--targeted", action="store_true", help="Use targeted decompilation for every apk")
+    parser.add_argument("--resume", action="store_true", help="Skip stages whose checkpoints are still valid")
+    parser.add_argument("--db", help="Job database path (defaults to <output>/batch_jobs.db)")
+    parser.add_argument("--requeue-failed", action="store_true", help="Queue failed apks from a previous batch again")
+    parser.add_argument("--fingerprint-db", help="Library fingerprint database used to skip obfuscated library code "
+                             "(default: library_fingerprints.npz next to the scripts)")
+    parser.add_argument("--scope", choices=["app", "full"], default="app",
+                        help="Scan only each app's own namespaces in depth (default) or the full source tree")
+    parser.add_argument("--store", help="Findings store (SQLite database) every scan adds its findings to")
+
+    args = parser.parse_args()
+
+    run_batch(args.source, args.output, args.workers, args.max_jadx, args.memory_limit, args.timeout,
+              args.retries + 1, args.targeted, args.resume, args.db, args.requeue_failed, args.fingerprint_db,
+              args.scope, args.store)
+
+if __name__ == "__main__":
+    main()
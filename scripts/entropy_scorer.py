@@ -0,0 +1,110 @@
+import numpy as np
+
+# literals are scored on their first WIDTH bytes, padded into one fixed-width matrix
+WIDTH = 128
+MIN_LENGTH = 16
+MIN_DIGITS = 2
+CHUNK_SIZE = 8192
+
+# entropy as a fraction of what a random string of the same length and alphabet would reach
+MIN_NORMALIZED_ENTROPY = 0.85
+
+LOWER = 1
+UPPER = 2
+DIGIT = 4
+SYMBOL = 8
+SPACE = 16
+
+_bytes = np.arange(256, dtype=np.uint8)
+CLASS_BITS = np.full(256, SYMBOL, dtype=np.uint8)
+CLASS_BITS[(_bytes >= ord("a")) & (_bytes <= ord("z"))] = LOWER
+CLASS_BITS[(_bytes >= ord("A")) & (_bytes <= ord("Z"))] = UPPER
+CLASS_BITS[(_bytes >= ord("0")) & (_bytes <= ord("9"))] = DIGIT
+CLASS_BITS[[ord(c) for c in " \t\r\n"]] = SPACE
+
+HEX_CHARS = np.zeros(256, dtype=bool)
+HEX_CHARS[[ord(c) for c in "0123456789abcdefABCDEF"]] = True
+BASE64_CHARS = CLASS_BITS != SYMBOL
+BASE64_CHARS[[ord(c) for c in "+/=_-"]] = True
+BASE64_CHARS[CLASS_BITS == SPACE] = False
+
+def pack_rows(encoded, lengths):
+    # zero-padded uint8 matrix as wide as the longest row, literals are never empty here
+    width = max(int(lengths.max()), 1)
+    flat = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    rows = np.repeat(np.arange(len(encoded)), lengths)
+    columns = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    data = np.zeros((len(encoded), width), dtype=np.uint8)
+    data[rows, columns] = flat
+    return data
+
+def shannon_entropy(data, lengths):
+    # bits per byte from the runs of equal bytes in each sorted row, padding sorts first and is dropped
+    rows = np.sort(data, axis=1)
+    width = rows.shape[1]
+    flat = rows.ravel()
+
+    starts = np.ones(len(flat), dtype=bool)
+    starts[1:] = flat[1:] != flat[:-1]
+    starts[::width] = True
+    bounds = np.flatnonzero(starts)
+    counts = np.diff(np.append(bounds, len(flat)))
+
+    keep = flat[bounds] != 0
+    counts = counts[keep].astype(np.float64)
+    weighted = np.bincount(bounds[keep] // width, weights=counts * np.log2(counts), minlength=len(rows))
+
+    size = np.maximum(lengths, 1)
+    return np.log2(size) - weighted / size
+
+def score_literals(values):
+    # length, entropy and character-class features for every literal, batched in chunks of similar length
+    encoded = [value.encode("utf-8", "replace")[:WIDTH] for value in values]
+    lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+
+    scores = {
+        "length": lengths,
+        "entropy": np.zeros(len(encoded)),
+        "classes": np.zeros(len(encoded), dtype=np.uint8),
+        "digits": np.zeros(len(encoded), dtype=np.int64),
+        "hex": np.zeros(len(encoded), dtype=bool),
+        "base64": np.zeros(len(encoded), dtype=bool)
+    }
+
+    # sorting by length keeps padding, and the work spent on it, small
+    order = np.argsort(lengths, kind="stable")
+    order = order[lengths[order] > 0]
+    for lo in range(0, len(order), CHUNK_SIZE):
+        index = order[lo:lo + CHUNK_SIZE]
+        data = pack_rows([encoded[i] for i in index], lengths[index])
+        valid = data != 0
+        char_classes = np.where(valid, CLASS_BITS[data], 0)
+
+        scores["classes"][index] = np.bitwise_or.reduce(char_classes, axis=1)
+        scores["digits"][index] = (char_classes == DIGIT).sum(axis=1)
+        scores["hex"][index] = np.all(HEX_CHARS[data] | ~valid, axis=1)
+        scores["base64"][index] = np.all(BASE64_CHARS[data] | ~valid, axis=1)
+        scores["entropy"][index] = shannon_entropy(data, lengths[index])
+
+    # a random string of length L over C symbols shows about C * (1 - (1 - 1/C)^L) distinct ones
+    alphabet = np.where(scores["hex"], 16, 64)
+    distinct = alphabet * (1 - (1 - 1 / alphabet) ** lengths)
+    scores["normalized"] = scores["entropy"] / np.log2(np.maximum(distinct, 2))
+
+    return scores
+
+def find_secret_candidates(values):
+    # indices of token-like literals whose entropy is close to that of random data
+    scores = score_literals(values)
+    classes = scores["classes"]
+
+    token_like = (scores["hex"] | scores["base64"]) & (scores["length"] >= MIN_LENGTH)
+    # hex needs letters and digits, anything else all three classes, which identifiers and words rarely have
+    has_letters = (classes & (LOWER | UPPER)) != 0
+    all_classes = (classes & (LOWER | UPPER | DIGIT)) == (LOWER | UPPER | DIGIT)
+    mixed = (scores["digits"] >= MIN_DIGITS) & ((scores["hex"] & has_letters) | all_classes)
+    outliers = scores["normalized"] >= MIN_NORMALIZED_ENTROPY
+
+    candidates = np.flatnonzero(token_like & mixed & outliers)
+    return candidates.tolist(), scores
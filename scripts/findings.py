@@ -0,0 +1,308 @@
+import os
+import sys
+import json
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from source_files import load_duplicate_files, copy_offset
+
+# characters of source shown on either side of a match
+CONTEXT_WIDTH = 40
+MAX_CACHED_SOURCES = 16
+
+# locations listed on a group of repeated findings, the details file has all of them
+MAX_SAMPLE_LOCATIONS = 10
+
+# every distinct location is stored once per process, findings keep its index
+_paths = []
+_path_ids = {}
+_source_cache = {}
+
+def path_id(path):
+    index = _path_ids.get(path)
+    if index is None:
+        index = _path_ids[path] = len(_paths)
+        _paths.append(path)
+    return index
+
+def path_of(index):
+    return _paths[index]
+
+def _cached_source(source_path):
+    # [content, line starts], findings come grouped by file so a few reopened files serve most lookups
+    entry = _source_cache.get(source_path)
+    if entry is None:
+        with open(source_path, 'r', encoding='utf-8', errors='ignore') as f:
+            entry = [f.read(), None]
+        if len(_source_cache) >= MAX_CACHED_SOURCES:
+            _source_cache.pop(next(iter(_source_cache)))
+        _source_cache[source_path] = entry
+    return entry
+
+def read_source(source_path):
+    return _cached_source(source_path)[0]
+
+def source_context(source_path, start, end, width=CONTEXT_WIDTH):
+    try:
+        content = read_source(source_path)
+    except OSError:
+        return None
+    return content[max(0, start - width):end + width].strip()
+
+def line_starts(content):
+    # offset of the first character of every line
+    return array('I', accumulate((len(line) + 1 for line in content.split("\n")[:-1]), initial=0))
+
+def line_column(source_path, offset):
+    # 1-based (line, column) of a character offset, a binary search over the file's line starts
+    try:
+        entry = _cached_source(source_path)
+    except OSError:
+        return None
+    if entry[1] is None:
+        entry[1] = line_starts(entry[0])
+    line = bisect_right(entry[1], offset)
+    return line, offset - entry[1][line - 1] + 1
+
+class Finding:
+    # one issue in a few pointers, the JSON dict is only built when results are written
+    # span is (source path, start, end) of the match, its context is cut from the file on demand
+    __slots__ = ("type", "severity", "description", "path_id", "context", "source_id", "start", "end", "duplicates")
+
+    def __init__(self, issue_type, severity, description, location, context=None, span=None):
+        self.type = sys.intern(issue_type)
+        self.severity = sys.intern(severity)
+        self.description = sys.intern(description)
+        self.path_id = path_id(location)
+        self.context = context
+        self.source_id = None
+        self.start = None
+        self.end = None
+        self.duplicates = None
+
+        if span is not None:
+            source_path, self.start, self.end = span
+            self.source_id = path_id(source_path)
+
+    @property
+    def location(self):
+        return _paths[self.path_id]
+
+    def context_text(self, width=CONTEXT_WIDTH):
+        if self.source_id is None:
+            return self.context
+        return source_context(_paths[self.source_id], self.start, self.end, width)
+
+    def position(self):
+        if self.source_id is None:
+            return None
+        return line_column(_paths[self.source_id], self.start)
+
+    def position_label(self):
+        position = self.position()
+        return f"{self.location}:{position[0]}" if position else self.location
+
+    def match_text(self):
+        # the matched code with whitespace collapsed, or the fixed context of findings without a span
+        if self.source_id is None:
+            return self.context
+        try:
+            text = read_source(_paths[self.source_id])[self.start:self.end]
+        except OSError:
+            return None
+        return " ".join(text.split())
+
+    def to_dict(self, context_width=CONTEXT_WIDTH):
+        # the issue shape the visualizer and earlier results use, plus the match position
+        issue = {
+            "type": self.type,
+            "severity": self.severity,
+            "description": self.description,
+            "location": self.location
+        }
+        position = self.position()
+        if position is not None:
+            issue["line"], issue["column"] = position
+        context = self.context_text(context_width)
+        if context is not None:
+            issue["context"] = context
+        if self.start is not None:
+            issue["offsets"] = [self.start, self.end]
+        if self.duplicates:
+            issue["duplicate_locations"] = [copy_location(*copy) for copy in self.duplicates]
+        return issue
+
+def serialize_findings(findings, context_width=CONTEXT_WIDTH):
+    return [finding.to_dict(context_width) for finding in findings]
+
+def copy_location(location_id, source_id, start, end):
+    # where a finding sits in one duplicate copy, at the copy's own line and offsets
+    copy = {"location": _paths[location_id]}
+    if source_id is not None:
+        position = line_column(_paths[source_id], start)
+        if position is not None:
+            copy["line"], copy["column"] = position
+        copy["offsets"] = [start, end]
+    return copy
+
+def duplicate_copies(decompiled_dir, duplicates, finding):
+    # (path id, source path id, start, end) for every copy of the file a finding is in,
+    # its location may be relative or absolute and its span is mapped into each copy
+    prefix = os.path.join(decompiled_dir, "")
+    location = finding.location
+    absolute = location.startswith(prefix)
+    rel_path = location[len(prefix):] if absolute else location
+    copies = duplicates.get(rel_path)
+    if not copies:
+        return None
+
+    result = []
+    for copy in copies:
+        location_id = path_id(os.path.join(decompiled_dir, copy) if absolute else copy)
+        if finding.source_id is None:
+            result.append((location_id, None, None, None))
+            continue
+        result.append((location_id, path_id(os.path.join(decompiled_dir, copy)),
+                       copy_offset(decompiled_dir, rel_path, copy, finding.start),
+                       copy_offset(decompiled_dir, rel_path, copy, finding.end)))
+    return result
+
+def attach_duplicate_locations(decompiled_dir, findings):
+    # a finding in a scanned file also holds for every copy of it, listed once on the same finding
+    duplicates, _ = load_duplicate_files(decompiled_dir)
+    if not duplicates:
+        return findings
+
+    for finding in findings:
+        finding.duplicates = duplicate_copies(decompiled_dir, duplicates, finding)
+
+    return findings
+
+class FindingWriter:
+    # findings are written the moment they are appended, only the counts stay in memory
+    # a .jsonl output gets one finding per line, anything else the indented JSON array
+    # with a details file every finding is streamed there and the output gets one record per group
+    # of repeated findings, written when the writer is closed
+    def __init__(self, output_path=None, decompiled_dir=None, context_width=CONTEXT_WIDTH, details_path=None,
+                 max_samples=MAX_SAMPLE_LOCATIONS, store=None):
+        self.output = open(output_path, 'w') if output_path else None
+        self.jsonl = bool(output_path) and output_path.endswith(".jsonl")
+        self.decompiled_dir = decompiled_dir
+        self.duplicates = load_duplicate_files(decompiled_dir)[0] if decompiled_dir else {}
+        self.context_width = context_width
+        self.details = FindingWriter(details_path, context_width=context_width) if details_path else None
+        self.max_samples = max_samples
+        # every finding also goes to the findings store when one is given, see findings_store.py
+        self.store = store
+        self.groups = {}
+        self.written = 0
+        self.count = 0
+        self.type_counts = {}
+        self.severity_counts = {}
+
+        if self.output and not self.jsonl:
+            self.output.write("[")
+
+    def append(self, finding, group=None):
+        # group is the number of the grouped output record a details file entry belongs to
+        if self.duplicates:
+            finding.duplicates = duplicate_copies(self.decompiled_dir, self.duplicates, finding)
+
+        if self.store is not None:
+            self.store.add(finding)
+
+        if self.details is not None:
+            self.details.append(finding, self.add_to_group(finding))
+        elif group is not None:
+            self.write({**finding.to_dict(self.context_width), "group": group})
+        else:
+            self.write(finding.to_dict(self.context_width))
+
+        self.count += 1
+        self.type_counts[finding.type] = self.type_counts.get(finding.type, 0) + 1
+        self.severity_counts[finding.severity] = self.severity_counts.get(finding.severity, 0) + 1
+
+    def add_to_group(self, finding):
+        # same rule, same description and the same matched code, differing only in where
+        key = (finding.type, finding.severity, finding.description, finding.match_text())
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = [finding, 0, [], len(self.groups)]
+        group[1] += 1
+        if len(group[2]) < self.max_samples:
+            group[2].append(finding.position_label())
+        return group[3]
+
+    def write(self, issue):
+        if not self.output:
+            return
+        if self.jsonl:
+            self.output.write(json.dumps(issue) + "\n")
+        else:
+            item = json.dumps(issue, indent=2).replace("\n", "\n  ")
+            self.output.write(("," if self.written else "") + "\n  " + item)
+        self.written += 1
+
+    def extend(self, findings):
+        for finding in findings:
+            self.append(finding)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        if self.details is not None:
+            # records are written in group number order, the numbers details entries refer to
+            for finding, count, samples, _ in self.groups.values():
+                issue = finding.to_dict(self.context_width)
+                if count > 1:
+                    issue["count"] = count
+                    issue["sample_locations"] = samples
+                self.write(issue)
+            self.groups = {}
+            self.details.close()
+
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+        if self.output:
+            if not self.jsonl:
+                self.output.write("\n]" if self.written else "]")
+            self.output.close()
+            self.output = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def iter_result_issues(result_file):
+    # issues of one analyzer result, JSON Lines are read line by line and a line still being written is skipped
+    if result_file.endswith(".jsonl"):
+        with open(result_file, 'r') as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    with open(result_file, 'r') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("issues", [])
+    yield from data
+
+def count_result_issues(result_file):
+    # occurrences in one analyzer result, only the JSON Lines records of grouped findings are parsed
+    if result_file.endswith(".jsonl"):
+        total = 0
+        with open(result_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n") or not line.strip():
+                    continue
+                total += json.loads(line).get("count", 1) if b'"count": ' in line else 1
+        return total
+    return sum(issue.get("count", 1) for issue in iter_result_issues(result_file))
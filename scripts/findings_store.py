@@ -0,0 +1,265 @@
+import os
+import argparse
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from rule_registry import normalized_location
+
+ANDROID_NS = "{http://schemas.android.com/apk/res/android}"
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS apps (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    package TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_id INTEGER NOT NULL REFERENCES apps (id),
+    version_name TEXT,
+    version_code TEXT,
+    apk_sha256 TEXT NOT NULL,
+    output_dir TEXT NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    total_issues INTEGER,
+    UNIQUE (apk_sha256, output_dir)
+);
+CREATE TABLE IF NOT EXISTS rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    analyzer TEXT NOT NULL,
+    type TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    description TEXT NOT NULL,
+    UNIQUE (analyzer, type, severity, description)
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS findings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scan_id INTEGER NOT NULL REFERENCES scans (id),
+    rule_id INTEGER NOT NULL REFERENCES rules (id),
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    line INTEGER,
+    col INTEGER,
+    start_offset INTEGER,
+    end_offset INTEGER,
+    context TEXT
+);
+CREATE INDEX IF NOT EXISTS scans_app ON scans (app_id);
+CREATE INDEX IF NOT EXISTS rules_type ON rules (type, severity);
+CREATE INDEX IF NOT EXISTS findings_scan ON findings (scan_id, rule_id);
+CREATE INDEX IF NOT EXISTS findings_rule ON findings (rule_id);
+CREATE INDEX IF NOT EXISTS findings_file ON findings (file_id);
+"""
+
+# findings are inserted in one transaction per batch
+BATCH_SIZE = 5000
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(STORE_SCHEMA)
+    return conn
+
+def app_identity(decompiled_dir):
+    # (package, versionName, versionCode) from the decompiled manifest
+    manifest_path = os.path.join(decompiled_dir, "resources", "AndroidManifest.xml")
+    try:
+        root = ET.parse(manifest_path).getroot()
+    except Exception as e:
+        print(f"Warning: Could not read manifest for the findings store: {e}")
+        return "unknown", None, None
+    return (root.get("package") or "unknown",
+            root.get(f"{ANDROID_NS}versionName"),
+            root.get(f"{ANDROID_NS}versionCode"))
+
+def begin_scan(db_path, decompiled_dir, apk_sha256, output_dir):
+    # scan id for one apk in one output directory, a resumed or repeated run reuses its row
+    package, version_name, version_code = app_identity(decompiled_dir)
+    output_dir = os.path.abspath(output_dir)
+
+    conn = connect(db_path)
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("INSERT OR IGNORE INTO apps (package) VALUES (?)", (package,))
+    app_id = conn.execute("SELECT id FROM apps WHERE package = ?", (package,)).fetchone()[0]
+    conn.execute(
+        "INSERT OR IGNORE INTO scans (app_id, version_name, version_code, apk_sha256, output_dir) "
+        "VALUES (?, ?, ?, ?, ?)", (app_id, version_name, version_code, apk_sha256, output_dir))
+    scan_id = conn.execute("SELECT id FROM scans WHERE apk_sha256 = ? AND output_dir = ?",
+                           (apk_sha256, output_dir)).fetchone()[0]
+    conn.execute("UPDATE scans SET started_at = ?, finished_at = NULL WHERE id = ?", (time.time(), scan_id))
+    conn.execute("COMMIT")
+    conn.close()
+    return scan_id
+
+def finish_scan(db_path, scan_id, total_issues):
+    conn = connect(db_path)
+    conn.execute("UPDATE scans SET finished_at = ?, total_issues = ? WHERE id = ?",
+                 (time.time(), total_issues, scan_id))
+    conn.close()
+
+class FindingStore:
+    # one analyzer's findings for one scan, buffered and written in bulk transactions
+    def __init__(self, db_path, scan_id, analyzer):
+        self.conn = connect(db_path)
+        self.scan_id = scan_id
+        self.analyzer = analyzer
+        self.rule_ids = {}
+        self.file_ids = {}
+        self.rows = []
+
+        # a rerun analyzer replaces what it stored for this scan before
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.execute("DELETE FROM findings WHERE scan_id = ? AND rule_id IN "
+                          "(SELECT id FROM rules WHERE analyzer = ?)", (scan_id, analyzer))
+        self.conn.execute("COMMIT")
+
+    def rule_id(self, key):
+        # key is (type, severity, description), ids are cached for the life of the store
+        rule_id = self.rule_ids.get(key)
+        if rule_id is None:
+            self.conn.execute("INSERT OR IGNORE INTO rules (analyzer, type, severity, description) VALUES (?, ?, ?, ?)",
+                              (self.analyzer, *key))
+            rule_id = self.rule_ids[key] = self.conn.execute(
+                "SELECT id FROM rules WHERE analyzer = ? AND type = ? AND severity = ? AND description = ?",
+                (self.analyzer, *key)).fetchone()[0]
+        return rule_id
+
+    def file_id(self, location):
+        file_id = self.file_ids.get(location)
+        if file_id is None:
+            path = normalized_location(location)
+            self.conn.execute("INSERT OR IGNORE INTO files (path) VALUES (?)", (path,))
+            file_id = self.file_ids[location] = self.conn.execute(
+                "SELECT id FROM files WHERE path = ?", (path,)).fetchone()[0]
+        return file_id
+
+    def add(self, finding):
+        line, column = finding.position() or (None, None)
+        self.rows.append(((finding.type, finding.severity, finding.description), finding.location,
+                          line, column, finding.start, finding.end, finding.context_text()))
+        if len(self.rows) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        # new rules and files are inserted in the same transaction as the findings
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.executemany(
+            "INSERT INTO findings (scan_id, rule_id, file_id, line, col, start_offset, end_offset, context) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(self.scan_id, self.rule_id(rule), self.file_id(location), *rest) for rule, location, *rest in self.rows])
+        self.conn.execute("COMMIT")
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+def add_store_arguments(parser):
+    parser.add_argument("--store", help="Findings store (SQLite database) to add the findings to")
+    parser.add_argument("--scan-id", type=int, help="Scan the stored findings belong to, created by main.py --store")
+
+def store_from_args(parser, args, analyzer):
+    if not args.store:
+        return None
+    if args.scan_id is None:
+        parser.error("--store needs --scan-id")
+    return FindingStore(args.store, args.scan_id, analyzer)
+
+def query_findings(conn, package=None, issue_type=None, severity=None, text=None, latest=False):
+    # findings joined with their scan, app, rule and file, text matches the description or the context
+    conditions = []
+    params = []
+    if package:
+        conditions.append("apps.package = ?")
+        params.append(package)
+    if issue_type:
+        conditions.append("rules.type = ?")
+        params.append(issue_type)
+    if severity:
+        conditions.append("rules.severity = ?")
+        params.append(severity.upper())
+    if text:
+        conditions.append("(rules.description LIKE ? OR findings.context LIKE ?)")
+        params.extend([f"%{text}%", f"%{text}%"])
+    if latest:
+        # only the most recent scan of every app
+        conditions.append("scans.id = (SELECT MAX(s.id) FROM scans s WHERE s.app_id = scans.app_id)")
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return conn.execute(f"""
+        SELECT apps.package, scans.id AS scan_id, scans.version_name, rules.analyzer, rules.type,
+               rules.severity, rules.description, files.path, findings.line, findings.context
+        FROM findings
+        JOIN scans ON scans.id = findings.scan_id
+        JOIN apps ON apps.id = scans.app_id
+        JOIN rules ON rules.id = findings.rule_id
+        JOIN files ON files.id = findings.file_id
+        {where}
+        ORDER BY apps.package, scans.id, files.path, findings.line
+    """, params)
+
+def iter_scan_findings(conn, scan_id):
+    # every stored finding of one scan in the issue shape of the result files
+    rows = conn.execute("""
+        SELECT rules.type, rules.severity, rules.description, files.path, findings.line, findings.col, findings.context
+        FROM findings
+        JOIN rules ON rules.id = findings.rule_id
+        JOIN files ON files.id = findings.file_id
+        WHERE findings.scan_id = ?
+    """, (scan_id,))
+    for row in rows:
+        issue = {"type": row["type"], "severity": row["severity"], "description": row["description"],
+                 "location": row["path"]}
+        if row["line"] is not None:
+            issue["line"], issue["column"] = row["line"], row["col"]
+        if row["context"] is not None:
+            issue["context"] = row["context"]
+        yield issue
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the findings store shared by all scans")
+    parser.add_argument("db", help="Findings store (SQLite database)")
+    parser.add_argument("--app", help="Only this app package")
+    parser.add_argument("--type", help="Only findings of this type, e.g. 'Cryptography Issue'")
+    parser.add_argument("--severity", help="Only findings of this severity")
+    parser.add_argument("--match", help="Text contained in the description or the context, e.g. ECB")
+    parser.add_argument("--latest", action="store_true", help="Only the most recent scan of every app")
+    parser.add_argument("--list", action="store_true", help="List every finding instead of counts per app")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Error: findings store not found: {args.db}")
+        return
+
+    conn = connect(args.db)
+    rows = query_findings(conn, args.app, args.type, args.severity, args.match, args.latest)
+
+    if args.list:
+        for row in rows:
+            location = f"{row['path']}:{row['line']}" if row["line"] else row["path"]
+            print(f"{row['package']} {row['version_name'] or ''} [{row['severity']}] {row['type']}: "
+                  f"{row['description']} ({location})")
+        conn.close()
+        return
+
+    # counts per app version, the answer to "which apps ..."
+    counts = {}
+    for row in rows:
+        key = (row["package"], row["version_name"], row["scan_id"])
+        counts[key] = counts.get(key, 0) + 1
+
+    print(f"{len(counts)} scans with matching findings")
+    for (package, version_name, scan_id), count in counts.items():
+        print(f"- {package} {version_name or ''} (scan {scan_id}): {count} findings")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
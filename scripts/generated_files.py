@@ -0,0 +1,59 @@
+import re
+
+GENERATED_FILES_FILE = "generated_files.json"
+
+# only the start of a file is sniffed, generator markers sit in the header or the class declaration
+HEADER_BYTES = 2048
+
+# "skip" files are never scanned, "minimal" ones only by the string literal rules
+SKIP = "skip"
+MINIMAL = "minimal"
+
+# (reason, policy, file name pattern, header pattern), the header pattern, when there is one, must also match
+# for names hand-written code uses too
+NAME_RULES = [
+    ("R class", SKIP, re.compile(r'^R(?:\$\w+)?\.(?:java|kt)$'), None),
+    ("Manifest class", SKIP, re.compile(r'^Manifest(?:\$\w+)?\.java$'), None),
+    ("BuildConfig", MINIMAL, re.compile(r'^BuildConfig\.(?:java|kt)$'), None),
+    ("Data binding", SKIP, re.compile(r'^(?:BR|DataBinderMapperImpl|DataBindingComponent)\.java$'), None),
+    ("Data binding", SKIP, re.compile(r'BindingImpl\.java$'),
+     re.compile(r'\bandroidx?\.databinding\.|@(?:javax\.annotation\.(?:processing\.)?)?Generated\b')),
+    ("Dagger", SKIP, re.compile(r'_(?:\w*Factory|MembersInjector)\.java$|^Dagger\w+\.java$'),
+     re.compile(r'\bdagger\.internal\.|@(?:javax\.annotation\.(?:processing\.)?)?Generated\b'))
+]
+
+# (reason, policy, header pattern), sniffed from the first HEADER_BYTES characters
+HEADER_RULES = [
+    ("Protobuf message", SKIP, re.compile(r'extends GeneratedMessage(?:Lite|V3)\b|Generated by the protocol buffer compiler')),
+    ("Data binding", SKIP, re.compile(r'extends ViewDataBinding\b')),
+    ("Generated annotation", SKIP, re.compile(r'@(?:javax\.annotation\.(?:processing\.)?)?Generated\b|AUTO-GENERATED FILE'))
+]
+
+def classify_generated(rel_path, header):
+    # (reason, policy) for a generated file, None for hand-written code
+    name = rel_path.replace("\\", "/").rsplit("/", 1)[-1]
+
+    for reason, policy, pattern, header_pattern in NAME_RULES:
+        if pattern.search(name) and (header_pattern is None or header_pattern.search(header[:HEADER_BYTES])):
+            return reason, policy
+
+    for reason, policy, pattern in HEADER_RULES:
+        if pattern.search(header[:HEADER_BYTES]):
+            return reason, policy
+
+    return None
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def skipped_summary(skipped):
+    # one line such as "1.2 MB in 40 files: R class 900.0 KB (2 files), Dagger ..."
+    total_bytes = sum(entry["bytes"] for entry in skipped.values())
+    total_files = sum(entry["files"] for entry in skipped.values())
+    reasons = ", ".join(f"{reason} {format_bytes(entry['bytes'])} ({entry['files']} files)"
+                        for reason, entry in sorted(skipped.items(), key=lambda x: x[1]["bytes"], reverse=True))
+    return f"{format_bytes(total_bytes)} in {total_files} files: {reasons}" if total_files else "nothing"
@@ -0,0 +1,151 @@
+import re
+from array import array
+
+# token kinds, comments and whitespace are dropped
+IDENT = 1
+STRING = 2
+CHAR = 3
+NUMBER = 4
+PUNCT = 5
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>"""(?:.*?)(?:"""|\Z)|"(?:[^"\\\n]|\\.)*"?)
+  | (?P<char>'(?:[^'\\\n]|\\.)*'?)
+  | (?P<ident>[A-Za-z_$][\w$]*)
+  | (?P<number>\d[\w.]*)
+  | (?P<punct>[^\s\w])
+''', re.VERBOSE | re.DOTALL)
+
+TOKEN_KINDS = {"string": STRING, "char": CHAR, "ident": IDENT, "number": NUMBER, "punct": PUNCT}
+
+MAX_CACHED_FILES = 256
+
+_token_cache = {}
+
+class TokenStream:
+    # parallel arrays keep a file's tokens at a few bytes each instead of one object per token
+    __slots__ = ("content", "kinds", "starts", "ends", "depths")
+
+    def __init__(self, content):
+        self.content = content
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.depths = array('H')
+
+        depth = 0
+        for match in TOKEN_PATTERN.finditer(content):
+            group = match.lastgroup
+            if group == "comment":
+                continue
+
+            kind = TOKEN_KINDS[group]
+            start, end = match.span()
+            if kind == PUNCT and content[start] == "}" and depth:
+                depth -= 1
+
+            self.kinds.append(kind)
+            self.starts.append(start)
+            self.ends.append(end)
+            self.depths.append(min(depth, 0xFFFF))
+
+            if kind == PUNCT and content[start] == "{":
+                depth += 1
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def text(self, i):
+        return self.content[self.starts[i]:self.ends[i]]
+
+    def is_punct(self, i, char):
+        return 0 <= i < len(self.kinds) and self.kinds[i] == PUNCT and self.content[self.starts[i]] == char
+
+    def identifiers(self, name):
+        # indices of every identifier token spelled exactly name
+        content = self.content
+        starts = self.starts
+        ends = self.ends
+        size = len(name)
+        for i, kind in enumerate(self.kinds):
+            if kind == IDENT and ends[i] - starts[i] == size and content.startswith(name, starts[i]):
+                yield i
+
+    def matching(self, i):
+        # index of the bracket closing the one at i, or None when the file ends first
+        opening = self.content[self.starts[i]]
+        closing = {"(": ")", "{": "}", "[": "]"}[opening]
+        level = 0
+        for j in range(i, len(self.kinds)):
+            if self.kinds[j] != PUNCT:
+                continue
+            char = self.content[self.starts[j]]
+            if char == opening:
+                level += 1
+            elif char == closing:
+                level -= 1
+                if level == 0:
+                    return j
+        return None
+
+    def call_arguments(self, i):
+        # token range (lo, hi) between the parentheses following token i
+        if not self.is_punct(i + 1, "("):
+            return None
+        close = self.matching(i + 1)
+        if close is None:
+            return None
+        return i + 2, close
+
+    def method_body(self, i):
+        # token range (lo, hi) inside the braces when token i names a declared method, not a call
+        arguments = self.call_arguments(i)
+        if arguments is None:
+            return None
+
+        for j in range(arguments[1] + 1, len(self.kinds)):
+            if self.kinds[j] != PUNCT:
+                continue
+            char = self.content[self.starts[j]]
+            if char == "{":
+                close = self.matching(j)
+                return (j + 1, close) if close is not None else None
+            if char in ";}=)":
+                return None
+        return None
+
+    def find_call(self, lo, hi, name):
+        # first call of name(...) in [lo, hi), or None
+        for j in range(lo, hi):
+            if (self.kinds[j] == IDENT and self.ends[j] - self.starts[j] == len(name)
+                    and self.content.startswith(name, self.starts[j]) and self.is_punct(j + 1, "(")):
+                return j
+        return None
+
+    def receiver_start(self, i):
+        # first token of a dotted receiver chain ending just before token i, e.g. this.password.equals
+        j = i
+        while j >= 2 and self.is_punct(j - 1, ".") and self.kinds[j - 2] == IDENT:
+            j -= 2
+        return j
+
+    def find_in_range(self, lo, hi, needle, kinds=(IDENT, STRING)):
+        # first token in [lo, hi) whose text contains needle (case-insensitive)
+        needle = needle.lower()
+        for j in range(lo, hi):
+            if self.kinds[j] in kinds and needle in self.text(j).lower():
+                return j
+        return None
+
+def tokenize_file(file_path, content):
+    # analyzers run several rules over the same file, so the stream is built once per process
+    tokens = _token_cache.get(file_path)
+    if tokens is not None and tokens.content == content:
+        return tokens
+
+    tokens = TokenStream(content)
+    if len(_token_cache) >= MAX_CACHED_FILES:
+        _token_cache.pop(next(iter(_token_cache)))
+    _token_cache[file_path] = tokens
+    return tokens
@@ -0,0 +1,256 @@
+import os
+import re
+import zlib
+import json
+import argparse
+import numpy as np
+from apk_analysis import analyze_apk
+
+# database the pipeline uses unless told otherwise, built with the build subcommand from reference apks
+DEFAULT_DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "library_fingerprints.npz")
+
+# minhash/lsh parameters: 8 bands of 4 rows catch pairs with jaccard similarity above ~0.6
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+MERSENNE_PRIME = (1 << 31) - 1
+MIN_SHINGLES = 4
+
+# classes hashed per batch, the permutation matrix is NUM_PERM x shingles of the batch
+CHUNK_SIZE = 4096
+
+# a package counts as library code only when most of its fingerprinted classes match
+MIN_PACKAGE_FRACTION = 0.5
+
+# types from these packages survive obfuscation, everything else is normalized away
+FRAMEWORK_PREFIXES = ("Ljava/", "Ljavax/", "Landroid/", "Landroidx/", "Lkotlin/", "Lkotlinx/", "Ldalvik/", "Lorg/json/")
+
+_rng = np.random.RandomState(0x5eed)
+PERM_A = _rng.randint(1, MERSENNE_PRIME, size=NUM_PERM).astype(np.uint64)
+PERM_B = _rng.randint(0, MERSENNE_PRIME, size=NUM_PERM).astype(np.uint64)
+BAND_MIX = _rng.randint(1, 1 << 62, size=ROWS, dtype=np.int64).astype(np.uint64)
+
+TYPE_PATTERN = re.compile(r'L[^;]+;')
+
+def normalize_type(match):
+    name = match.group(0)
+    return name if name.startswith(FRAMEWORK_PREFIXES) else "L;"
+
+def class_shingles(class_analysis):
+    # structural features that R8/ProGuard renaming leaves intact
+    shingles = set()
+
+    vm_class = class_analysis.get_vm_class()
+    superclass = vm_class.get_superclassname()
+    shingles.add("super:" + TYPE_PATTERN.sub(normalize_type, superclass))
+    shingles.add(f"interfaces:{len(vm_class.get_interfaces() or [])}")
+
+    for field in vm_class.get_fields():
+        shingles.add("field:" + field.get_access_flags_string() + ":" +
+                     TYPE_PATTERN.sub(normalize_type, field.get_descriptor()))
+
+    for method in class_analysis.get_methods():
+        if method.is_external():
+            continue
+        descriptor = TYPE_PATTERN.sub(normalize_type, method.descriptor)
+        size = method.get_method().get_length().bit_length()
+        shingles.add(f"method:{method.get_access_flags_string()}:{descriptor}:{size}")
+
+    return shingles
+
+def minhash_signatures(shingle_sets):
+    # vectorized over the shingles of CHUNK_SIZE classes at a time, reduced per class with reduceat
+    signatures = np.zeros((len(shingle_sets), NUM_PERM), dtype=np.uint32)
+
+    for lo in range(0, len(shingle_sets), CHUNK_SIZE):
+        chunk = shingle_sets[lo:lo + CHUNK_SIZE]
+        lengths = np.array([len(s) for s in chunk], dtype=np.int64)
+        if lengths.sum() == 0:
+            continue
+
+        hashes = np.fromiter((zlib.crc32(s.encode()) for shingles in chunk for s in shingles),
+                             dtype=np.uint64, count=int(lengths.sum()))
+        permuted = (PERM_A[:, None] * hashes[None, :] + PERM_B[:, None]) % MERSENNE_PRIME
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        signatures[lo:lo + len(chunk)] = np.minimum.reduceat(permuted, offsets, axis=1).T
+
+    return signatures
+
+def band_keys(signatures):
+    bands = signatures.reshape(len(signatures), BANDS, ROWS).astype(np.uint64)
+    return (bands * BAND_MIX).sum(axis=2)
+
+def app_class_filter(apk):
+    # (package prefix, component descriptors) of the app's own code, never treated as library code
+    package = apk.get_package()
+    components = apk.get_activities() + apk.get_services() + apk.get_receivers() + apk.get_providers()
+    application = apk.get_attribute_value("application", "name")
+    if application:
+        components.append(application)
+
+    descriptors = set()
+    for component in components:
+        if component.startswith("."):
+            component = package + component
+        descriptors.add("L" + component.replace(".", "/") + ";")
+    return "L" + package.replace(".", "/") + "/", descriptors
+
+def analyze_classes(path, package_prefix=None, exclude_app=False):
+    if path.endswith(".dex"):
+        from androguard.misc import AnalyzeDex
+        _, _, dx = AnalyzeDex(path)
+        apk = None
+    else:
+        apk, _, dx = analyze_apk(path)
+
+    prefix = "L" + package_prefix.replace(".", "/") if package_prefix else None
+    app_prefix, components = app_class_filter(apk) if exclude_app and apk is not None else (None, set())
+
+    names = []
+    shingle_sets = []
+    for class_analysis in dx.get_internal_classes():
+        if prefix and not class_analysis.name.startswith(prefix):
+            continue
+        if app_prefix and (class_analysis.name.startswith(app_prefix) or
+                           class_analysis.name.split("$")[0].rstrip(";") + ";" in components):
+            continue
+        shingles = class_shingles(class_analysis)
+        if len(shingles) >= MIN_SHINGLES:
+            names.append(class_analysis.name)
+            shingle_sets.append(shingles)
+
+    return names, shingle_sets
+
+def load_database(db_path):
+    data = np.load(db_path, allow_pickle=False)
+    return {
+        "libraries": [str(name) for name in data["libraries"]],
+        "library_ids": data["library_ids"],
+        "signatures": data["signatures"]
+    }
+
+def save_database(db_path, database):
+    np.savez_compressed(db_path,
+                        libraries=np.array(database["libraries"]),
+                        library_ids=database["library_ids"],
+                        signatures=database["signatures"])
+
+def build_database(db_path, library_name, reference_paths, package_prefix=None):
+    if os.path.exists(db_path):
+        database = load_database(db_path)
+    else:
+        database = {
+            "libraries": [],
+            "library_ids": np.zeros(0, dtype=np.uint16),
+            "signatures": np.zeros((0, NUM_PERM), dtype=np.uint32)
+        }
+
+    if library_name not in database["libraries"]:
+        database["libraries"].append(library_name)
+    library_id = database["libraries"].index(library_name)
+
+    for reference_path in reference_paths:
+        print(f"Fingerprinting {library_name} classes in {reference_path}...")
+        _, shingle_sets = analyze_classes(reference_path, package_prefix)
+        signatures = minhash_signatures(shingle_sets)
+
+        database["signatures"] = np.vstack([database["signatures"], signatures])
+        database["library_ids"] = np.concatenate(
+            [database["library_ids"], np.full(len(signatures), library_id, dtype=np.uint16)])
+        print(f"Added {len(signatures)} class fingerprints")
+
+    save_database(db_path, database)
+    print(f"Fingerprint database saved to {db_path} ({len(database['signatures'])} classes, "
+          f"{len(database['libraries'])} libraries)")
+
+def match_library_classes(apk_path, db_path, threshold=0.8):
+    database = load_database(db_path)
+    names, shingle_sets = analyze_classes(apk_path, exclude_app=True)
+    if not names:
+        return {"libraries": {}, "classes": {}}
+
+    signatures = minhash_signatures(shingle_sets)
+
+    # lsh buckets over the database, keyed by (band, band hash)
+    buckets = {}
+    for row, keys in enumerate(band_keys(database["signatures"])):
+        for band, key in enumerate(keys.tolist()):
+            buckets.setdefault((band, key), []).append(row)
+
+    matched = {}
+    for index, keys in enumerate(band_keys(signatures)):
+        candidates = set()
+        for band, key in enumerate(keys.tolist()):
+            candidates.update(buckets.get((band, key), ()))
+        if not candidates:
+            continue
+
+        candidates = np.fromiter(candidates, dtype=np.int64)
+        similarity = (database["signatures"][candidates] == signatures[index]).mean(axis=1)
+        best = int(similarity.argmax())
+        if similarity[best] < threshold:
+            continue
+
+        matched[index] = database["libraries"][database["library_ids"][candidates[best]]]
+
+    # one near-duplicate helper does not make its package library code
+    package_sizes = {}
+    package_matches = {}
+    for index, name in enumerate(names):
+        package = name.rpartition("/")[0]
+        package_sizes[package] = package_sizes.get(package, 0) + 1
+        if index in matched:
+            package_matches[package] = package_matches.get(package, 0) + 1
+
+    classes = {}
+    libraries = {}
+    for index, library in matched.items():
+        package = names[index].rpartition("/")[0]
+        if package_matches[package] < MIN_PACKAGE_FRACTION * package_sizes[package]:
+            continue
+        class_name = names[index][1:-1].replace("/", ".")
+        classes[class_name] = library
+        libraries[library] = libraries.get(library, 0) + 1
+
+    return {"libraries": libraries, "classes": classes}
+
+def main():
+    parser = argparse.ArgumentParser(description="Identify obfuscated library classes from structural fingerprints")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Add a library's class fingerprints to the database")
+    build_parser.add_argument("references", nargs="+", help="APK or DEX files containing the library")
+    build_parser.add_argument("--name", required=True, help="Library name and version, e.g. 'OkHttp 4.9.3'")
+    build_parser.add_argument("--package", help="Only fingerprint classes under this package")
+    build_parser.add_argument("--db", default=DEFAULT_DATABASE, help="Fingerprint database (.npz), created if missing")
+
+    match_parser = subparsers.add_parser("match", help="Find library classes in an apk")
+    match_parser.add_argument("apk_path", help="Path to the apk file")
+    match_parser.add_argument("--db", default=DEFAULT_DATABASE, help="Fingerprint database (.npz)")
+    match_parser.add_argument("--threshold", type=float, default=0.8, help="Minimum estimated similarity")
+    match_parser.add_argument("-o", "--output", help="Output JSON file for matched classes")
+
+    args = parser.parse_args()
+
+    try:
+        import androguard
+    except ImportError:
+        print("Warning: androguard not installed, skipping library fingerprinting")
+        return
+
+    if args.command == "build":
+        build_database(args.db, args.name, args.references, args.package)
+        return
+
+    matches = match_library_classes(args.apk_path, args.db, args.threshold)
+    print(f"Matched {len(matches['classes'])} library classes:")
+    for library, count in sorted(matches["libraries"].items(), key=lambda x: x[1], reverse=True):
+        print(f"- {library}: {count} classes")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(matches, f, indent=2)
+        print(f"Detailed results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
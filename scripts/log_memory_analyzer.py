@@ -1,12 +1,16 @@
-import os
 import re
 import argparse
-import json
+from source_files import route, route_files
+from findings import Finding, FindingWriter
+from findings_store import add_store_arguments, store_from_args
 
-def analyze_log_leakage(decompiled_dir):
-    issues = []
-    java_dir = os.path.join(decompiled_dir, "sources")
-    
+# the files each check reads, routed in one walk of the decompiled tree
+ROUTES = {
+    "log_leakage": route(),
+    "memory_leakage": route()
+}
+
+def analyze_log_leakage(files, issues):
     # logging of sensitive information
     sensitive_log_patterns = [
         (r'Log\.(v|d|i|w|e)\([^)]*?(?:password|token|key|secret|cred|auth|user|email)[^)]*?\)', 
@@ -18,40 +22,27 @@ def analyze_log_leakage(decompiled_dir):
     ]
     
     # possible log leakage issues
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
+    for file_path, rel_path in files:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
                 
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        # skip library code
-                        if "com/google/" in file_path or "androidx/" in file_path:
-                            continue
-                            
-                        for pattern, description in sensitive_log_patterns:
-                            matches = re.finditer(pattern, content, re.IGNORECASE)
-                            for match in matches:
-                                context = content[max(0, match.start() - 40):match.end() + 40]
-                                issues.append({
-                                    "type": "Log Leakage",
-                                    "severity": "HIGH",
-                                    "description": description,
-                                    "location": rel_path,
-                                    "context": context.strip()
-                                })
-                except Exception as e:
-                    continue
+                for pattern, description in sensitive_log_patterns:
+                    matches = re.finditer(pattern, content, re.IGNORECASE)
+                    for match in matches:
+                        issues.append(Finding(
+                            "Log Leakage",
+                            "HIGH",
+                            description,
+                            rel_path,
+                            span=(file_path, match.start(), match.end())
+                        ))
+        except Exception as e:
+            continue
     
     return issues
 
-def analyze_memory_leakage(decompiled_dir):
-    issues = []
-    java_dir = os.path.join(decompiled_dir, "sources")
-    
+def analyze_memory_leakage(files, issues):
     # possible memory leakage risks
     memory_patterns = [
         (r'\.getText\(\).toString\(\)', 
@@ -65,57 +56,48 @@ def analyze_memory_leakage(decompiled_dir):
     ]
     
     # memory leakage issues
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
+    for file_path, rel_path in files:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
                 
-                # skip library code
-                if "com/google/" in file_path or "androidx/" in file_path:
-                    continue
-                    
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        for pattern, description in memory_patterns:
-                            matches = re.finditer(pattern, content, re.IGNORECASE)
-                            for match in matches:
-                                context = content[max(0, match.start() - 40):match.end() + 40]
-                                issues.append({
-                                    "type": "Memory Leakage",
-                                    "severity": "MEDIUM",
-                                    "description": description,
-                                    "location": rel_path,
-                                    "context": context.strip()
-                                })
-                except Exception as e:
-                    continue
+                for pattern, description in memory_patterns:
+                    matches = re.finditer(pattern, content, re.IGNORECASE)
+                    for match in matches:
+                        issues.append(Finding(
+                            "Memory Leakage",
+                            "MEDIUM",
+                            description,
+                            rel_path,
+                            span=(file_path, match.start(), match.end())
+                        ))
+        except Exception as e:
+            continue
     
     return issues
 
 def main():
     parser = argparse.ArgumentParser(description="Analyze decompiled APK for log and memory leakage")
     parser.add_argument("decompiled_dir", help="Path to the decompiled APK directory")
-    parser.add_argument("-o", "--output", help="Output JSON file for results")
+    parser.add_argument("-o", "--output", help="Output file for results, JSON Lines when it ends in .jsonl")
+    parser.add_argument("--details", help="Write every finding here and group repeated ones in the output")
+    add_store_arguments(parser)
     
     args = parser.parse_args()
+    store = store_from_args(parser, args, "log_memory_analyzer")
     
-    log_issues = analyze_log_leakage(args.decompiled_dir)
-    memory_issues = analyze_memory_leakage(args.decompiled_dir)
-    
-    all_issues = log_issues + memory_issues
+    # findings go to the output file as each check produces them
+    files = route_files(args.decompiled_dir, ROUTES)
+    with FindingWriter(args.output, args.decompiled_dir, details_path=args.details, store=store) as all_issues:
+        analyze_log_leakage(files["log_leakage"], all_issues)
+        analyze_memory_leakage(files["memory_leakage"], all_issues)
     
     # print summary
     print(f"\nAnalysis complete! Found {len(all_issues)} potential log/memory leakage issues:")
-    print(f"- Log Leakage: {len(log_issues)} issues")
-    print(f"- Memory Leakage: {len(memory_issues)} issues")
+    print(f"- Log Leakage: {all_issues.type_counts.get('Log Leakage', 0)} issues")
+    print(f"- Memory Leakage: {all_issues.type_counts.get('Memory Leakage', 0)} issues")
     
-    # save results
     if args.output:
-        with open(args.output, 'w') as f:
-            json.dump(all_issues, f, indent=2)
         print(f"Detailed results saved to {args.output}")
 
 if __name__ == "__main__":
@@ -1,11 +1,187 @@
 import os
+import sys
+import signal
 import argparse
 import subprocess
 import time
 import json
+import hashlib
 from pathlib import Path
+from findings import count_result_issues
+from findings_store import begin_scan, finish_scan
+from library_fingerprints import DEFAULT_DATABASE
 
-def run_analysis(apk_path, output_dir=None):    
+try:
+    import resource
+except ImportError:
+    resource = None
+
+CHECKPOINT_DIR = ".checkpoints"
+
+# (stage name, progress message, script, result file)
+ANALYZER_STAGES = [
+    ("base_security", "Running base security analyzer...", "security_analyzer.py", "base_security.jsonl"),
+    ("log_memory", "Analyzing log and memory security...", "log_memory_analyzer.py", "log_memory_security.jsonl"),
+    ("auth_crypto", "Analyzing authentication and cryptography...", "auth_crypto_analyzer.py", "auth_crypto_security.jsonl"),
+    ("storage", "Analyzing storage security...", "storage_analyzer.py", "storage_security.jsonl"),
+    ("platform", "Analyzing platform API security...", "platform_analyzer.py", "platform_security.jsonl"),
+    ("anti_tampering", "Analyzing anti-tampering mechanisms...", "anti_tampering_analyzer.py", "anti_tampering.jsonl"),
+    ("permissions", "Analyzing app permissions...", "permission_analyzer.py", "permissions.json"),
+    ("libraries", "Analyzing third-party libraries...", "third_party_analyzer.py", "libraries.json")
+]
+
+# extra analyzer arguments, checks shared between analyzers run once in the one that owns them
+ANALYZER_ARGS = {
+    "base_security": ["--skip-shared-rules"]
+}
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def code_digest(script_dir):
+    # any change to the analyzers or their shared modules invalidates analysis checkpoints
+    sha = hashlib.sha256()
+    for name in sorted(os.listdir(script_dir)):
+        if name.endswith(".py") and name != "main.py":
+            sha.update(name.encode())
+            sha.update(file_sha256(os.path.join(script_dir, name)).encode())
+    return sha.hexdigest()
+
+def inputs_digest(inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+def checkpoint_path(output_dir, stage):
+    return os.path.join(output_dir, CHECKPOINT_DIR, f"{stage}.json")
+
+def is_stage_complete(output_dir, stage, digest, outputs):
+    marker = checkpoint_path(output_dir, stage)
+    if not os.path.exists(marker):
+        return False
+    
+    try:
+        with open(marker, 'r') as f:
+            checkpoint = json.load(f)
+    except Exception:
+        return False
+    
+    if checkpoint.get("inputs_digest") != digest:
+        return False
+    
+    # outputs must still be there and, for files, unchanged since the stage ran
+    for output in outputs:
+        if not os.path.exists(output):
+            return False
+        recorded = checkpoint.get("outputs", {}).get(output)
+        if os.path.isfile(output) and recorded != file_sha256(output):
+            return False
+    
+    return True
+
+def mark_stage_complete(output_dir, stage, inputs, digest, outputs):
+    Path(os.path.join(output_dir, CHECKPOINT_DIR)).mkdir(exist_ok=True)
+    
+    checkpoint = {
+        "stage": stage,
+        "inputs": inputs,
+        "inputs_digest": digest,
+        "outputs": {o: file_sha256(o) if os.path.isfile(o) else None for o in outputs},
+        "completed_at": time.time()
+    }
+    
+    # write atomically so a pre-empted run never leaves a half-written marker
+    marker = checkpoint_path(output_dir, stage)
+    with open(marker + ".tmp", 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(marker + ".tmp", marker)
+
+def run_limited(cmd, timeout=None, memory_limit_mb=None, jvm_heap=False):
+    env = None
+    address_limit = None
+    
+    if memory_limit_mb:
+        if jvm_heap:
+            # the jvm reserves far more address space than it uses, so cap its heap instead
+            env = dict(os.environ, JADX_OPTS=f"-Xmx{memory_limit_mb}m")
+        elif resource is not None and hasattr(resource, "prlimit"):
+            address_limit = memory_limit_mb * 1024 * 1024
+    
+    # own session so a timeout also kills grandchildren such as jadx
+    process = subprocess.Popen(cmd, stderr=subprocess.PIPE, text=True, env=env, start_new_session=True)
+    
+    # set from the parent after the fork, preexec_fn is unsafe while batch.py runs analyses in threads
+    if address_limit:
+        try:
+            resource.prlimit(process.pid, resource.RLIMIT_AS, (address_limit, address_limit))
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not limit memory of {os.path.basename(cmd[1])}: {e}")
+    
+    try:
+        _, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        _, stderr = process.communicate()
+        sys.stderr.write(stderr)
+        return "timeout", f"killed after {timeout} seconds"
+    
+    sys.stderr.write(stderr)
+    
+    if "MemoryError" in stderr or "OutOfMemoryError" in stderr:
+        return "memory_limit", f"exceeded {memory_limit_mb} MB" if memory_limit_mb else "out of memory"
+    if process.returncode < 0:
+        return "killed", f"killed by signal {-process.returncode}"
+    if process.returncode != 0:
+        return "failed", f"exit code {process.returncode}"
+    
+    return "completed", None
+
+def run_stage(output_dir, stage, cmd, inputs, outputs, resume=False, limits=None, stage_status=None, jvm_heap=False):
+    digest = inputs_digest(inputs)
+    if stage_status is None:
+        stage_status = {}
+    
+    if resume and is_stage_complete(output_dir, stage, digest, outputs):
+        print(f"Skipping {stage}: checkpoint is still valid")
+        stage_status[stage] = {"status": "skipped", "detail": "checkpoint is still valid", "duration": 0}
+        return digest
+    
+    # drop the old marker first so a crash mid-stage cannot leave it looking valid
+    marker = checkpoint_path(output_dir, stage)
+    if os.path.exists(marker):
+        os.remove(marker)
+    
+    timeout, memory_limit_mb = (limits or {}).get(stage, (limits or {}).get("default", (None, None)))
+    
+    stage_start = time.time()
+    status, detail = run_limited(cmd, timeout, memory_limit_mb, jvm_heap)
+    stage_status[stage] = {"status": status, "detail": detail, "duration": round(time.time() - stage_start, 2)}
+    
+    if status != "completed":
+        print(f"Warning: stage {stage} did not complete ({detail}), continuing with the remaining stages")
+        return None
+    
+    if all(os.path.exists(o) for o in outputs):
+        mark_stage_complete(output_dir, stage, inputs, digest, outputs)
+        return digest
+    
+    return None
+
+def parse_stage_limits(timeout=None, memory_limit_mb=None, stage_limits=None):
+    # STAGE=SECONDS[:MB], either part may be left empty
+    limits = {"default": (timeout, memory_limit_mb)}
+    
+    for spec in stage_limits or []:
+        stage, _, values = spec.partition("=")
+        seconds, _, megabytes = values.partition(":")
+        limits[stage] = (float(seconds) if seconds else timeout, int(megabytes) if megabytes else memory_limit_mb)
+    
+    return limits
+
+def run_analysis(apk_path, output_dir=None, targeted=False, package=None, resume=False, limits=None, decompile_slots=None,
+                 fingerprint_db=None, scope="app", store=None):
     start_time = time.time()
     
     if not output_dir:
@@ -15,127 +191,228 @@ def run_analysis(apk_path, output_dir=None):
     Path(output_dir).mkdir(exist_ok=True)
     
     script_dir = os.path.dirname(os.path.abspath(__file__))
+    total_stages = len(ANALYZER_STAGES) + 2
+    stage_status = {}
+    
+    if not os.path.isfile(apk_path):
+        print(f"Error: APK file not found: {apk_path}")
+        return None
+    apk_hash = file_sha256(apk_path)
+    
+    decompiled_dir = os.path.join(output_dir, "decompiled")
+    
+    # one androguard pass over the bytecode builds the xref index used by api-usage rules and matches
+    # library classes by structural fingerprint so analyzers can skip them (optional, needs androguard)
+    bytecode_script = os.path.join(script_dir, "apk_analysis.py")
+    xref_index_path = os.path.join(decompiled_dir, "xref_index.json")
+    library_classes_path = os.path.join(decompiled_dir, "library_classes.json")
+    bytecode_cmd = ["python", bytecode_script, apk_path, "--xref-index", xref_index_path]
+    bytecode_outputs = [xref_index_path]
+    
+    fingerprint_db = fingerprint_db or DEFAULT_DATABASE
+    if os.path.exists(fingerprint_db):
+        bytecode_cmd += ["--fingerprint-db", fingerprint_db, "--library-classes", library_classes_path]
+        bytecode_outputs.append(library_classes_path)
+    else:
+        print(f"No library fingerprint database at {fingerprint_db}, obfuscated library code will be scanned "
+              f"(build one with library_fingerprints.py build)")
+    
+    bytecode_inputs = {
+        "apk": apk_hash,
+        "scripts": [file_sha256(os.path.join(script_dir, name)) for name in
+                    ("apk_analysis.py", "apk_decompiler.py", "xref_index.py", "library_fingerprints.py")],
+        "db": file_sha256(fingerprint_db) if os.path.exists(fingerprint_db) else None
+    }
     
     # decompile the apk
-    print("\n[1/6] Decompiling APK...")
+    print(f"\n[1/{total_stages}] Decompiling APK...")
     decompile_script = os.path.join(script_dir, "apk_decompiler.py")
-    decompiled_dir = os.path.join(output_dir, "decompiled")
-    subprocess.run(["python", decompile_script, apk_path, "-o", decompiled_dir])
+    decompile_cmd = ["python", decompile_script, apk_path, "-o", decompiled_dir]
+    if targeted:
+        # candidate classes are decompiled from the same androguard pass as the bytecode analysis
+        decompile_cmd = bytecode_cmd + ["--targeted", decompiled_dir]
+        if package:
+            decompile_cmd.extend(["--package", package])
+    decompile_inputs = {
+        "apk": apk_hash,
+        "script": file_sha256(decompile_script),
+        "targeted": targeted,
+        "package": package,
+        "bytecode": bytecode_inputs if targeted else None
+    }
+    # batch runs share a semaphore that caps concurrent jadx processes
+    if decompile_slots is not None:
+        decompile_slots.acquire()
+    try:
+        decompile_digest = run_stage(output_dir, "decompile", decompile_cmd, decompile_inputs,
+                                     [os.path.join(decompiled_dir, "sources")], resume, limits, stage_status, jvm_heap=True)
+    finally:
+        if decompile_slots is not None:
+            decompile_slots.release()
     
-    if not os.path.exists(decompiled_dir):
+    if decompile_digest is None:
         print("Error: Decompilation failed. Exiting.")
-        return
+        return None
+    
+    if targeted:
+        bytecode_digest = decompile_digest
+    else:
+        print("\nAnalyzing APK bytecode...")
+        bytecode_digest = run_stage(output_dir, "bytecode_analysis", bytecode_cmd,
+                                    bytecode_inputs, bytecode_outputs, resume, limits, stage_status)
+    
+    # fix the scan scope and index classes, string literals and file metrics once,
+    # so every analyzer process shares one read pass
+    print("\nBuilding app index...")
+    app_index_script = os.path.join(script_dir, "app_index.py")
+    app_index_inputs = {
+        "decompile": decompile_digest,
+        "bytecode": bytecode_digest,
+        "scope": scope,
+        "script": file_sha256(app_index_script)
+    }
+    app_index_digest = run_stage(output_dir, "app_index",
+                                 ["python", app_index_script, decompiled_dir, "--scope", scope],
+                                 app_index_inputs,
+                                 [os.path.join(decompiled_dir, "scan_scope.json"),
+                                  os.path.join(decompiled_dir, "generated_files.json"),
+                                  os.path.join(decompiled_dir, "file_manifest.json"),
+                                  os.path.join(decompiled_dir, ".app_index", "classes.json"),
+                                  os.path.join(decompiled_dir, ".app_index", "literals.json"),
+                                  os.path.join(decompiled_dir, ".app_index", "metrics.npz")],
+                                 resume, limits, stage_status)
     
     # results directory
     results_dir = os.path.join(output_dir, "results")
     Path(results_dir).mkdir(exist_ok=True)
+    details_dir = os.path.join(results_dir, "details")
+    Path(details_dir).mkdir(exist_ok=True)
+    
+    analysis_code = code_digest(script_dir)
+    result_files = []
     
-    # run basic security analyzer
-    print("\n[2/10] Running base security analyzer...")
-    security_analyzer = os.path.join(script_dir, "security_analyzer.py")
-    base_results = os.path.join(results_dir, "base_security.json")
-    subprocess.run(["python", security_analyzer, decompiled_dir, "-o", base_results])
-    
-    # run log and memory analyzer
-    print("\n[3/10] Analyzing log and memory security...")
-    log_memory_analyzer = os.path.join(script_dir, "log_memory_analyzer.py")
-    log_memory_results = os.path.join(results_dir, "log_memory_security.json")
-    subprocess.run(["python", log_memory_analyzer, decompiled_dir, "-o", log_memory_results])
-    
-    # run authentication and crypto analyzer
-    print("\n[4/10] Analyzing authentication and cryptography...")
-    auth_crypto_analyzer = os.path.join(script_dir, "auth_crypto_analyzer.py")
-    auth_crypto_results = os.path.join(results_dir, "auth_crypto_security.json")
-    subprocess.run(["python", auth_crypto_analyzer, decompiled_dir, "-o", auth_crypto_results])
-    
-    # run storage analyzer
-    print("\n[5/10] Analyzing storage security...")
-    storage_analyzer = os.path.join(script_dir, "storage_analyzer.py")
-    storage_results = os.path.join(results_dir, "storage_security.json")
-    subprocess.run(["python", storage_analyzer, decompiled_dir, "-o", storage_results])
-    
-    # run platform api analyzer
-    print("\n[6/10] Analyzing platform API security...")
-    platform_analyzer = os.path.join(script_dir, "platform_analyzer.py")
-    platform_results = os.path.join(results_dir, "platform_security.json")
-    subprocess.run(["python", platform_analyzer, decompiled_dir, "-o", platform_results])
-    
-    # run anti-tampering analyzer
-    print("\n[7/10] Analyzing anti-tampering mechanisms...")
-    anti_tampering_analyzer = os.path.join(script_dir, "anti_tampering_analyzer.py")
-    anti_tampering_results = os.path.join(results_dir, "anti_tampering.json")
-    subprocess.run(["python", anti_tampering_analyzer, decompiled_dir, "-o", anti_tampering_results])
-    
-    # run permission analyzer
-    print("\n[8/10] Analyzing app permissions...")
-    permission_analyzer = os.path.join(script_dir, "permission_analyzer.py")
-    permission_results = os.path.join(results_dir, "permissions.json")
-    subprocess.run(["python", permission_analyzer, decompiled_dir, "-o", permission_results])
-    
-    # run third-party library analyzer
-    print("\n[9/10] Analyzing third-party libraries...")
-    library_analyzer = os.path.join(script_dir, "third_party_analyzer.py")
-    library_results = os.path.join(results_dir, "libraries.json")
-    subprocess.run(["python", library_analyzer, decompiled_dir, "-o", library_results])
+    # every finding of this scan also goes to the shared findings store
+    scan_id = begin_scan(store, decompiled_dir, apk_hash, output_dir) if store else None
+    
+    # run the analyzers, each one is a resumable stage keyed on the decompiled tree and code version
+    for number, (stage, message, script, result_name) in enumerate(ANALYZER_STAGES, start=2):
+        print(f"\n[{number}/{total_stages}] {message}")
+        analyzer = os.path.join(script_dir, script)
+        result_file = os.path.join(results_dir, result_name)
+        stage_inputs = {
+            "decompile": decompile_digest,
+            "bytecode": bytecode_digest,
+            "app_index": app_index_digest,
+            "code": analysis_code,
+            "store": [os.path.abspath(store), scan_id] if store else None
+        }
+        cmd = ["python", analyzer, decompiled_dir, "-o", result_file, *ANALYZER_ARGS.get(stage, [])]
+        outputs = [result_file]
+        
+        # finding analyzers group repeated findings in the result and keep every one in a details file
+        if result_name.endswith(".jsonl"):
+            details_file = os.path.join(details_dir, result_name)
+            cmd += ["--details", details_file]
+            outputs.append(details_file)
+            if store:
+                cmd += ["--store", store, "--scan-id", str(scan_id)]
+        
+        run_stage(output_dir, stage, cmd,
+                  stage_inputs, outputs, resume, limits, stage_status)
+        result_files.append(result_file)
     
     # generate report
-    print("\n[10/10] Generating final report...")
+    print(f"\n[{total_stages}/{total_stages}] Generating final report...")
     app_name = os.path.basename(apk_path).split('.')[0]
     report_generator = os.path.join(script_dir, "security_visualizer.py")
     report_path = os.path.join(output_dir, "security_report.html")
     
-    result_files = [
-        base_results,
-        log_memory_results,
-        auth_crypto_results,
-        storage_results,
-        platform_results,
-        anti_tampering_results,
-        permission_results,
-        library_results
-    ]
-    
-    # filter only existing result files
-    existing_result_files = [f for f in result_files if os.path.exists(f)]
-    
-    subprocess.run([
+    # filter only existing result files, a killed stage leaves none or a partial one
+    existing_result_files = [f for f, (stage, _, _, _) in zip(result_files, ANALYZER_STAGES)
+                             if os.path.exists(f) and stage_status[stage]["status"] in ("completed", "skipped")]
+    
+    # stage outcomes so the report can flag an incomplete analysis
+    status_path = os.path.join(results_dir, "stage_status.json")
+    with open(status_path, 'w') as f:
+        json.dump(stage_status, f, indent=2)
+    
+    # bytes left out by the scan scope and the generated file classifier
+    skipped_path = os.path.join(decompiled_dir, "generated_files.json")
+    skipped_args = ["--skipped-files", skipped_path] if os.path.exists(skipped_path) else []
+    
+    report_inputs = {
+        "results": {f: file_sha256(f) for f in existing_result_files},
+        "stage_status": {s: d["status"] for s, d in stage_status.items()},
+        "skipped": file_sha256(skipped_path) if skipped_args else None,
+        "code": analysis_code
+    }
+    run_stage(output_dir, "report", [
         "python", 
         report_generator, 
         app_name, 
         *existing_result_files,
+        "--stage-status", status_path,
+        *skipped_args,
         "-o", report_path
-    ])
+    ], report_inputs, [report_path], resume, limits, stage_status)
     
-    # get total issues
+    # get total issues, json lines results are counted without being parsed
     total_issues = 0
     for result_file in existing_result_files:
         try:
-            with open(result_file, 'r') as f:
-                result_data = json.load(f)
-                if isinstance(result_data, list):
-                    total_issues += len(result_data)
-                elif isinstance(result_data, dict) and "issues" in result_data:
-                    total_issues += len(result_data["issues"])
+            total_issues += count_result_issues(result_file)
         except:
             pass
     
+    if store:
+        finish_scan(store, scan_id, total_issues)
+    
     end_time = time.time()
     duration = end_time - start_time
     
     print(f"\nAnalysis complete!")
     print(f"Total issues found: {total_issues}")
     print(f"Time taken: {duration:.2f} seconds")
+    
+    incomplete = {s: d for s, d in stage_status.items() if d["status"] not in ("completed", "skipped")}
+    if incomplete:
+        print(f"Incomplete stages: {len(incomplete)}")
+        for stage, data in incomplete.items():
+            print(f"- {stage}: {data['status']} ({data['detail']})")
+    
     print(f"Report saved to: {report_path}")
     print(f"You can open this HTML file in any web browser to view the results.")
+    
+    return {
+        "total_issues": total_issues,
+        "duration": duration,
+        "report_path": report_path,
+        "stage_status": stage_status
+    }
 
 def main():
     parser = argparse.ArgumentParser(description="Run comprehensive security analysis on an android apk")
     parser.add_argument("apk_path", help="Path to the apk file")
     parser.add_argument("-o", "--output", help="Output directory (optional)")
+    parser.add_argument("--targeted", action="store_true", help="Only decompile and analyze candidate app classes and their neighbours")
+    parser.add_argument("--package", help="App package for targeted mode (defaults to the manifest package)")
+    parser.add_argument("--resume", action="store_true", help="Skip stages whose checkpoints are still valid")
+    parser.add_argument("--timeout", type=float, help="Default wall-clock limit per stage in seconds")
+    parser.add_argument("--memory-limit", type=int, help="Default memory limit per stage in MB")
+    parser.add_argument("--stage-limit", action="append", metavar="STAGE=SECONDS[:MB]",
+                        help="Override the limits for one stage, e.g. decompile=3600:8192 (repeatable)")
+    parser.add_argument("--fingerprint-db", help="Library fingerprint database used to skip obfuscated library code "
+                             "(default: library_fingerprints.npz next to the scripts)")
+    parser.add_argument("--scope", choices=["app", "full"], default="app",
+                        help="Scan only the app's own namespaces in depth (default) or the full source tree")
+    parser.add_argument("--store", help="Findings store (SQLite database) shared by all scans, see findings_store.py")
     
     args = parser.parse_args()
     
-    run_analysis(args.apk_path, args.output)
+    limits = parse_stage_limits(args.timeout, args.memory_limit, args.stage_limit)
+    
+    run_analysis(args.apk_path, args.output, args.targeted, args.package, args.resume, limits,
+                 fingerprint_db=args.fingerprint_db, scope=args.scope, store=args.store)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,6 +3,13 @@ import re
 import argparse
 import json
 import xml.etree.ElementTree as ET
+from bisect import bisect_right
+from xref_index import load_xref_index, lookup_call_sites, call_site_source
+from source_files import route, route_files, is_scanned_source
+from findings import Finding, serialize_findings, attach_duplicate_locations
+
+# the files each check reads, routed in one walk of the decompiled tree
+ROUTES = {"permission_usage": route()}
 
 def extract_permissions(decompiled_dir):
     permissions = []
@@ -111,29 +118,140 @@ def classify_permissions(permissions):
     
     return classified
 
-def analyze_permission_usage(decompiled_dir, permissions):
-    java_dir = os.path.join(decompiled_dir, "sources")
-    permission_usage = {}
+# permission -> api table, see permission_api_map.json for the entry format
+PERMISSION_MAP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "permission_api_map.json")
+
+IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_$][\w$]*')
+STRING_LITERAL_PATTERN = re.compile(r'"((?:[^"\\\n]|\\.)*)"')
+
+# member names too generic to count without their class in front of them
+GENERIC_MEMBERS = {
+    "open", "query", "insert", "update", "delete", "start", "read", "listen", "notify", "cancel", "enable",
+    "connect", "capture", "commit", "enqueue", "acquire", "vibrate", "authenticate", "transceive", "getClient"
+}
+
+MAX_EVIDENCE = 3
+
+def load_permission_map(map_path=PERMISSION_MAP_FILE):
+    with open(map_path, 'r') as f:
+        return json.load(f)["permissions"]
+
+def compile_permission_matcher(permission_map, permissions):
+    # entries are "pkg.Class", "pkg.Class#member" or "string:literal" (a trailing ':' makes it a prefix,
+    # a content uri or path also matches the uris and paths below it)
+    xref_rules = {}
+    identifiers = {}
+    strings = {}
+    string_prefixes = {}
+    
+    for permission in permissions:
+        for api in permission_map.get(permission, []):
+            if api.startswith("string:"):
+                literal = api[len("string:"):]
+                table = string_prefixes if literal.endswith(":") else strings
+                table.setdefault(literal, []).append((permission, api))
+                if "://" in literal or literal.startswith("/"):
+                    string_prefixes.setdefault(literal.rstrip("/") + "/", []).append((permission, api))
+                continue
+            
+            class_name, _, member = api.partition("#")
+            simple_class = class_name.split(".")[-1].split("$")[-1]
+            
+            # constants are inlined by the compiler and never show up in the xref index,
+            # calls to platform classes and to sdks bundled in the apk do
+            in_xref = not (member and member.isupper())
+            if in_xref:
+                xref_rules.setdefault(permission, []).append((class_name, [member] if member else None))
+            
+            # a member counts when called on its class or in a file that refers to the class,
+            # an app method of the same name is no use of the api
+            if not member:
+                identifiers.setdefault(simple_class, []).append((permission, api, None, None, in_xref))
+            elif member in GENERIC_MEMBERS:
+                identifiers.setdefault(member, []).append((permission, api, simple_class + ".", None, in_xref))
+            else:
+                identifiers.setdefault(member, []).append(
+                    (permission, api, simple_class + ".", class_name.replace("$", "."), in_xref))
     
-    # map permissions to their common api usage patterns
-    permission_patterns = {
-        "android.permission.INTERNET": [r'HttpURLConnection|URL\.openConnection|Socket|OkHttp|Retrofit|HttpClient'],
-        "android.permission.ACCESS_FINE_LOCATION": [r'getLastKnownLocation|requestLocationUpdates|FusedLocationProviderClient'],
-        "android.permission.ACCESS_COARSE_LOCATION": [r'getLastKnownLocation|requestLocationUpdates|FusedLocationProviderClient'],
-        "android.permission.CAMERA": [r'Camera\.|CameraManager|CameraDevice|cameraCaptureSessions'],
-        "android.permission.READ_CONTACTS": [r'ContactsContract|getContentResolver\(\)\.query\([^)]*Contacts'],
-        "android.permission.WRITE_CONTACTS": [r'ContactsContract|getContentResolver\(\)\.insert\([^)]*Contacts'],
-        "android.permission.READ_EXTERNAL_STORAGE": [r'getExternalStorageDirectory|getExternalFilesDir|Environment\.getExternalStoragePublicDirectory'],
-        "android.permission.WRITE_EXTERNAL_STORAGE": [r'getExternalStorageDirectory|getExternalFilesDir|Environment\.getExternalStoragePublicDirectory'],
-        "android.permission.RECORD_AUDIO": [r'AudioRecord|MediaRecorder\.setAudioSource|startRecording'],
-        "android.permission.SEND_SMS": [r'SmsManager\.send'],
-        "android.permission.READ_SMS": [r'getContentResolver\(\)\.query\([^)]*sms'],
-        "android.permission.RECEIVE_SMS": [r'android\.provider\.Telephony\.SMS_RECEIVED'],
-        "android.permission.READ_PHONE_STATE": [r'TelephonyManager|getDeviceId|getImei|getLine1Number|getSubscriberId'],
-        "android.permission.CALL_PHONE": [r'ACTION_CALL|Intent\([^)]*tel:'],
-        "android.permission.READ_CALENDAR": [r'CalendarContract|getContentResolver\(\)\.query\([^)]*Calendar'],
-        "android.permission.WRITE_CALENDAR": [r'CalendarContract|getContentResolver\(\)\.insert\([^)]*Calendar']
+    return {
+        "xref_rules": xref_rules,
+        "identifiers": identifiers,
+        "strings": strings,
+        "string_prefixes": string_prefixes,
+        "prefix_list": sorted(string_prefixes)
     }
+
+def matching_prefixes(prefixes, value):
+    # entries of a sorted prefix list that start value, each bisect lands on the longest one left
+    hits = []
+    hi = bisect_right(prefixes, value)
+    while hi:
+        candidate = prefixes[hi - 1]
+        if value.startswith(candidate):
+            hits.append(candidate)
+            hi -= 1
+        else:
+            # any shorter prefix of value is also a prefix of what it shares with the candidate
+            hi = bisect_right(prefixes, os.path.commonprefix([candidate, value]), 0, hi - 1)
+    return hits
+
+def refers_to_class(content, class_name, cache):
+    # the fully qualified name shows up in an import or a qualified reference, or its package is imported
+    referenced = cache.get(class_name)
+    if referenced is None:
+        package = class_name.rpartition(".")[0]
+        referenced = cache[class_name] = class_name in content or f"import {package}.*;" in content
+    return referenced
+
+def match_permission_apis(matcher, content, use_xref):
+    # every identifier and string literal is looked up once, whatever the size of the table
+    identifiers = matcher["identifiers"]
+    referenced = {}
+    for match in IDENTIFIER_PATTERN.finditer(content):
+        hits = identifiers.get(match.group())
+        if not hits:
+            continue
+        
+        for permission, api, qualifier, owner, in_xref in hits:
+            if use_xref and in_xref:
+                continue
+            if qualifier and not content.endswith(qualifier, 0, match.start()):
+                if owner is None or not refers_to_class(content, owner, referenced):
+                    continue
+            yield permission, api, match
+    
+    strings = matcher["strings"]
+    string_prefixes = matcher["string_prefixes"]
+    if not strings and not string_prefixes:
+        return
+    
+    prefix_list = matcher["prefix_list"]
+    for match in STRING_LITERAL_PATTERN.finditer(content):
+        value = match.group(1)
+        for permission, api in strings.get(value, ()):
+            yield permission, api, match
+        for prefix in matching_prefixes(prefix_list, value):
+            for permission, api in string_prefixes[prefix]:
+                yield permission, api, match
+
+def record_permission_usage(usage, file, context):
+    usage["used"] = True
+    usage["usage_count"] += 1
+    
+    if len(usage["evidence"]) < MAX_EVIDENCE:
+        usage["evidence"].append({
+            "file": file,
+            "context": context
+        })
+
+def analyze_permission_usage(decompiled_dir, files, permissions, permission_map=None):
+    permission_usage = {}
+    
+    if permission_map is None:
+        permission_map = load_permission_map()
+    matcher = compile_permission_matcher(permission_map, permissions)
+    
+    xref_index = load_xref_index(decompiled_dir)
     
     # initialize usage tracking for each permission
     for permission in permissions:
@@ -145,38 +263,32 @@ def analyze_permission_usage(decompiled_dir, permissions):
             "short_name": short_name
         }
     
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
-                
-                # skip library code
-                if "com/google/" in file_path or "androidx/" in file_path:
-                    continue
-                    
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        for permission, patterns in permission_patterns.items():
-                            if permission in permissions:
-                                for pattern in patterns:
-                                    matches = re.finditer(pattern, content, re.IGNORECASE)
-                                    for match in matches:
-                                        context = content[max(0, match.start() - 30):match.end() + 30].strip()
-                                        
-                                        # update permission usage
-                                        permission_usage[permission]["used"] = True
-                                        permission_usage[permission]["usage_count"] += 1
-                                        
-                                        if len(permission_usage[permission]["evidence"]) < 3:
-                                            permission_usage[permission]["evidence"].append({
-                                                "file": rel_path,
-                                                "context": context
-                                            })
-                except Exception as e:
-                    continue
+    # answer api usage from the xref index where possible, the text scan only covers the rest
+    use_xref = xref_index is not None
+    if use_xref:
+        for permission, apis in matcher["xref_rules"].items():
+            for class_name, method_names in apis:
+                for site, api in lookup_call_sites(xref_index, class_name, method_names):
+                    # library, out-of-scope, generated and duplicate call sites are no evidence of app usage
+                    if not is_scanned_source(decompiled_dir, call_site_source(decompiled_dir, site)):
+                        continue
+                    record_permission_usage(permission_usage[permission], call_site_source(decompiled_dir, site), f"{site} calls {api}")
+    
+    needs_text_scan = matcher["strings"] or matcher["string_prefixes"] or any(
+        not in_xref or not use_xref for hits in matcher["identifiers"].values() for _, _, _, _, in_xref in hits)
+    if not needs_text_scan:
+        return permission_usage
+    
+    for file_path, rel_path in files:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
+        except Exception as e:
+            continue
+        
+        for permission, api, match in match_permission_apis(matcher, content, use_xref):
+            context = content[max(0, match.start() - 30):match.end() + 30].strip()
+            record_permission_usage(permission_usage[permission], rel_path, context)
     
     return permission_usage
 
@@ -190,37 +302,37 @@ def find_permission_issues(permissions, permission_usage):
             
             if permission in [p for p, d in permission_usage.items() if not d["used"] and p.startswith("android.permission.")]:
                 short_name = data["short_name"]
-                issues.append({
-                    "type": "Unused Permission",
-                    "severity": "MEDIUM",
-                    "description": f"Permission {short_name} is requested but appears unused in code",
-                    "location": "AndroidManifest.xml",
-                    "context": f"The app requests the {short_name} permission but no usage was detected in code"
-                })
+                issues.append(Finding(
+                    "Unused Permission",
+                    "MEDIUM",
+                    f"Permission {short_name} is requested but appears unused in code",
+                    "AndroidManifest.xml",
+                    f"The app requests the {short_name} permission but no usage was detected in code"
+                ))
     
     # check for dangerous permissions
     dangerous_count = len([p for p in permissions if p in permission_usage and p.startswith("android.permission.") and p in permission_usage])
     if dangerous_count >= 5:
-        issues.append({
-            "type": "Excessive Permissions",
-            "severity": "MEDIUM",
-            "description": f"App requests {dangerous_count} dangerous permissions which may raise privacy concerns",
-            "location": "AndroidManifest.xml",
-            "context": f"The app requests multiple dangerous permissions including: " + 
-                      ", ".join([permission_usage[p]["short_name"] for p in permissions 
-                               if p in permission_usage and p.startswith("android.permission.")])[:100] + "..."
-        })
+        issues.append(Finding(
+            "Excessive Permissions",
+            "MEDIUM",
+            f"App requests {dangerous_count} dangerous permissions which may raise privacy concerns",
+            "AndroidManifest.xml",
+            f"The app requests multiple dangerous permissions including: " + 
+            ", ".join([permission_usage[p]["short_name"] for p in permissions 
+                     if p in permission_usage and p.startswith("android.permission.")])[:100] + "..."
+        ))
     
     # check for custom permissions
     custom_perms = [p for p in permissions if p.startswith("Custom:")]
     if custom_perms:
-        issues.append({
-            "type": "Custom Permissions",
-            "severity": "INFO",
-            "description": f"App defines {len(custom_perms)} custom permissions",
-            "location": "AndroidManifest.xml",
-            "context": "Custom permissions may expose functionality to other apps if not properly protected"
-        })
+        issues.append(Finding(
+            "Custom Permissions",
+            "INFO",
+            f"App defines {len(custom_perms)} custom permissions",
+            "AndroidManifest.xml",
+            "Custom permissions may expose functionality to other apps if not properly protected"
+        ))
     
     return issues
 
@@ -228,13 +340,17 @@ def main():
     parser = argparse.ArgumentParser(description="Analyze permissions in decompiled APK")
     parser.add_argument("decompiled_dir", help="Path to the decompiled APK directory")
     parser.add_argument("-o", "--output", help="Output JSON file for results")
+    parser.add_argument("--permission-map", default=PERMISSION_MAP_FILE, help="Permission to API mapping table (JSON)")
     
     args = parser.parse_args()
     
     permissions = extract_permissions(args.decompiled_dir)
     classified_perms = classify_permissions(permissions)
-    permission_usage = analyze_permission_usage(args.decompiled_dir, permissions)
+    permission_map = load_permission_map(args.permission_map)
+    files = route_files(args.decompiled_dir, ROUTES)
+    permission_usage = analyze_permission_usage(args.decompiled_dir, files["permission_usage"], permissions, permission_map)
     issues = find_permission_issues(permissions, permission_usage)
+    attach_duplicate_locations(args.decompiled_dir, issues)
     
     # print summary
     print(f"\nPermission Analysis Complete!")
@@ -255,7 +371,7 @@ def main():
     results = {
         "permissions": classified_perms,
         "usage": permission_usage,
-        "issues": issues
+        "issues": serialize_findings(issues)
     }
     
     # save results
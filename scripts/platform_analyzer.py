@@ -1,13 +1,33 @@
 import os
 import re
 import argparse
-import json
 import xml.etree.ElementTree as ET
+from source_files import route, route_files
+from app_index import load_app_index, file_of_class
+from java_tokens import tokenize_file
+from findings import Finding, FindingWriter
+from findings_store import add_store_arguments, store_from_args
 
-def check_webview_security(decompiled_dir):
-    issues = []
-    java_dir = os.path.join(decompiled_dir, "sources")
-    
+# the files each check reads, routed in one walk of the decompiled tree,
+# ssl error handlers only matter where a WebViewClient is actually implemented
+ROUTES = {
+    "webview": route(),
+    "webview_clients": route(subclass_of="android.webkit.WebViewClient"),
+    "activities": route(subclass_of="android.app.Activity")
+}
+
+def find_ignored_ssl_errors(tokens):
+    # onReceivedSslError overrides whose body calls proceed(), ignoring comments and strings
+    for i in tokens.identifiers("onReceivedSslError"):
+        body = tokens.method_body(i)
+        if body is None:
+            continue
+        
+        proceed = tokens.find_call(body[0], body[1], "proceed")
+        if proceed is not None:
+            yield tokens.starts[i], tokens.ends[proceed]
+
+def check_webview_security(files, client_files, issues):
     # patterns for webview issues
     webview_patterns = [
         (r'setJavaScriptEnabled\(true\)', 
@@ -23,45 +43,44 @@ def check_webview_security(decompiled_dir):
         (r'setDomStorageEnabled\(true\)',
          "DOM storage enabled in WebView which may store sensitive data"),
         (r'setSavePassword\(true\)',
-         "Password saving enabled in WebView which may store credentials"),
-        (r'onReceivedSslError[^{]*\{[^}]*proceed',
-         "SSL errors ignored in WebView which defeats HTTPS protections")
+         "Password saving enabled in WebView which may store credentials")
     ]
     
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
+    client_files = {rel_path for _, rel_path in client_files}
+    
+    for file_path, rel_path in files:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
                 
-                # skip library code
-                if "com/google/" in file_path or "androidx/" in file_path:
-                    continue
-                    
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        # check if file contains webview
-                        if "WebView" in content:
-                            for pattern, description in webview_patterns:
-                                matches = re.finditer(pattern, content, re.IGNORECASE)
-                                for match in matches:
-                                    context = content[max(0, match.start() - 40):match.end() + 40]
-                                    issues.append({
-                                        "type": "WebView Issue",
-                                        "severity": "HIGH",
-                                        "description": description,
-                                        "location": rel_path,
-                                        "context": context.strip()
-                                    })
-                except Exception as e:
-                    continue
+                # check if file contains webview
+                if "WebView" in content:
+                    for pattern, description in webview_patterns:
+                        matches = re.finditer(pattern, content, re.IGNORECASE)
+                        for match in matches:
+                            issues.append(Finding(
+                                "WebView Issue",
+                                "HIGH",
+                                description,
+                                rel_path,
+                                span=(file_path, match.start(), match.end())
+                            ))
+                
+                if rel_path in client_files and "onReceivedSslError" in content:
+                    for start, end in find_ignored_ssl_errors(tokenize_file(file_path, content)):
+                        issues.append(Finding(
+                            "WebView Issue",
+                            "HIGH",
+                            "SSL errors ignored in WebView which defeats HTTPS protections",
+                            rel_path,
+                            span=(file_path, start, end)
+                        ))
+        except Exception as e:
+            continue
     
     return issues
 
-def check_exported_components(decompiled_dir):
-    issues = []
+def check_exported_components(decompiled_dir, issues):
     manifest_path = os.path.join(decompiled_dir, "resources", "AndroidManifest.xml")
     
     if not os.path.exists(manifest_path):
@@ -73,6 +92,8 @@ def check_exported_components(decompiled_dir):
         root = tree.getroot()
         
         ns = {"android": "http://schemas.android.com/apk/res/android"}
+        package = root.get("package", "")
+        app_index = load_app_index(decompiled_dir)
         
         # check for exported components (activities, services, receivers, providers)
         components = [
@@ -98,19 +119,28 @@ def check_exported_components(decompiled_dir):
                 if is_exported:
                     # check if exported component has a permission defined
                     if not permission:
-                        issues.append({
-                            "type": "Exported Component",
-                            "severity": "HIGH",
-                            "description": f"{component_type} '{name}' is exported without permission protection",
-                            "location": "AndroidManifest.xml"
-                        })
+                        issue = Finding(
+                            "Exported Component",
+                            "HIGH",
+                            f"{component_type} '{name}' is exported without permission protection",
+                            "AndroidManifest.xml"
+                        )
+                        
+                        # point at the implementing class when it was decompiled
+                        class_name = package + name if name and name.startswith(".") else name
+                        if class_name and "." not in class_name:
+                            class_name = f"{package}.{class_name}"
+                        source_file = file_of_class(app_index, class_name) if class_name else None
+                        if source_file:
+                            issue.context = f"Implemented in {source_file}"
+                        
+                        issues.append(issue)
     except Exception as e:
         print(f"Error checking exported components: {e}")
     
     return issues
 
-def check_deep_links(decompiled_dir):
-    issues = []
+def check_deep_links(decompiled_dir, issues):
     manifest_path = os.path.join(decompiled_dir, "resources", "AndroidManifest.xml")
     
     if not os.path.exists(manifest_path):
@@ -153,81 +183,68 @@ def check_deep_links(decompiled_dir):
                         schemes_str = ", ".join(schemes) if schemes else "any"
                         hosts_str = ", ".join(hosts) if hosts else "any"
                         
-                        issues.append({
-                            "type": "Deep Link Issue",
-                            "severity": "MEDIUM",
-                            "description": f"Deep link handler '{component_name}' is accessible without permission protection (schemes: {schemes_str}, hosts: {hosts_str})",
-                            "location": "AndroidManifest.xml"
-                        })
+                        issues.append(Finding(
+                            "Deep Link Issue",
+                            "MEDIUM",
+                            f"Deep link handler '{component_name}' is accessible without permission protection (schemes: {schemes_str}, hosts: {hosts_str})",
+                            "AndroidManifest.xml"
+                        ))
     except Exception as e:
         print(f"Error checking deep links: {e}")
     
     return issues
 
-def check_flag_secure(decompiled_dir):
-    issues = []
-    java_dir = os.path.join(decompiled_dir, "sources")
-    
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
+def check_flag_secure(activity_files, issues):
+    # every direct or indirect Activity subclass, whatever base class the app uses
+    for file_path, rel_path in activity_files:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
                 
-                # skip library code
-                if "com/google/" in file_path or "androidx/" in file_path:
-                    continue
-                    
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        if ("extends Activity" in content or "extends AppCompatActivity" in content or 
-                            ": Activity(" in content or ": AppCompatActivity(" in content):
-                            
-                            # check if sensitive screen
-                            is_sensitive = any(term in content.lower() for term in 
-                                             ["password", "login", "auth", "credit", "payment", "secure", 
-                                              "personal", "profile", "account"])
-                            
-                            # check if FLAG_SECURE is set
-                            if is_sensitive and "FLAG_SECURE" not in content:
-                                issues.append({
-                                    "type": "Missing FLAG_SECURE",
-                                    "severity": "MEDIUM",
-                                    "description": "Sensitive screen missing FLAG_SECURE, allowing screenshots and screen recording",
-                                    "location": rel_path
-                                })
-                except Exception as e:
-                    continue
+                # check if sensitive screen
+                is_sensitive = any(term in content.lower() for term in 
+                                 ["password", "login", "auth", "credit", "payment", "secure", 
+                                  "personal", "profile", "account"])
+                
+                # check if FLAG_SECURE is set
+                if is_sensitive and "FLAG_SECURE" not in content:
+                    issues.append(Finding(
+                        "Missing FLAG_SECURE",
+                        "MEDIUM",
+                        "Sensitive screen missing FLAG_SECURE, allowing screenshots and screen recording",
+                        rel_path
+                    ))
+        except Exception as e:
+            continue
     
     return issues
 
 def main():
     parser = argparse.ArgumentParser(description="Analyze decompiled APK for platform API security issues")
     parser.add_argument("decompiled_dir", help="Path to the decompiled APK directory")
-    parser.add_argument("-o", "--output", help="Output JSON file for results")
+    parser.add_argument("-o", "--output", help="Output file for results, JSON Lines when it ends in .jsonl")
+    parser.add_argument("--details", help="Write every finding here and group repeated ones in the output")
+    add_store_arguments(parser)
     
     args = parser.parse_args()
+    store = store_from_args(parser, args, "platform_analyzer")
     
-    webview_issues = check_webview_security(args.decompiled_dir)
-    component_issues = check_exported_components(args.decompiled_dir)
-    deeplink_issues = check_deep_links(args.decompiled_dir)
-    flag_secure_issues = check_flag_secure(args.decompiled_dir)
-    
-    all_issues = webview_issues + component_issues + deeplink_issues + flag_secure_issues
+    # findings go to the output file as each check produces them
+    files = route_files(args.decompiled_dir, ROUTES)
+    with FindingWriter(args.output, args.decompiled_dir, details_path=args.details, store=store) as all_issues:
+        check_webview_security(files["webview"], files["webview_clients"], all_issues)
+        check_exported_components(args.decompiled_dir, all_issues)
+        check_deep_links(args.decompiled_dir, all_issues)
+        check_flag_secure(files["activities"], all_issues)
     
     # print summary
     print(f"\nAnalysis complete! Found {len(all_issues)} potential platform API security issues:")
-    print(f"- WebView Issues: {len(webview_issues)} issues")
-    print(f"- Exported Component Issues: {len(component_issues)} issues")
-    print(f"- Deep Link Issues: {len(deeplink_issues)} issues")
-    print(f"- FLAG_SECURE Issues: {len(flag_secure_issues)} issues")
+    print(f"- WebView Issues: {all_issues.type_counts.get('WebView Issue', 0)} issues")
+    print(f"- Exported Component Issues: {all_issues.type_counts.get('Exported Component', 0)} issues")
+    print(f"- Deep Link Issues: {all_issues.type_counts.get('Deep Link Issue', 0)} issues")
+    print(f"- FLAG_SECURE Issues: {all_issues.type_counts.get('Missing FLAG_SECURE', 0)} issues")
     
-    # save results
     if args.output:
-        with open(args.output, 'w') as f:
-            json.dump(all_issues, f, indent=2)
         print(f"Detailed results saved to {args.output}")
 
 if __name__ == "__main__":
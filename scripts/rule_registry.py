@@ -0,0 +1,103 @@
+import re
+from functools import lru_cache
+
+# checks implemented by more than one analyzer: rule -> (canonical analyzer, implementations)
+# an implementation is (analyzer, finding type, description prefix or None for any description)
+SHARED_RULES = {
+    "webview_javascript": ("platform_analyzer", [
+        ("platform_analyzer", "WebView Issue", "JavaScript enabled in WebView"),
+        ("security_analyzer", "Insecure WebView", None)
+    ]),
+    "exported_components": ("platform_analyzer", [
+        ("platform_analyzer", "Exported Component", None),
+        ("security_analyzer", "Exported Activity", None)
+    ]),
+    "insecure_random": ("auth_crypto_analyzer", [
+        ("auth_crypto_analyzer", "Cryptography Issue", "Insecure random number generator"),
+        ("security_analyzer", "Insecure Random", None)
+    ]),
+    "sensitive_logging": ("log_memory_analyzer", [
+        ("log_memory_analyzer", "Log Leakage", "Sensitive data may be logged"),
+        ("security_analyzer", "Sensitive Logging", None)
+    ])
+}
+
+# manifest findings have no line, the component named in the description tells them apart
+SUBJECT_PATTERNS = {
+    "exported_components": re.compile(r"^(?:Activity|Service|Broadcast Receiver|Content Provider) '?([^' ]+)'? is exported")
+}
+
+_implementations = {}
+for _rule, (_owner, _entries) in SHARED_RULES.items():
+    for _analyzer, _issue_type, _prefix in _entries:
+        _implementations.setdefault(_issue_type, []).append((_rule, _prefix, _analyzer == _owner))
+
+def shared_rules_skipped_by(analyzer):
+    # shared rules this analyzer implements but another analyzer owns
+    return {rule for rule, (owner, entries) in SHARED_RULES.items()
+            if owner != analyzer and any(entry[0] == analyzer for entry in entries)}
+
+def shared_rule_of(issue):
+    # (rule, is canonical) for a finding produced by a shared rule, None otherwise
+    description = issue.get("description", "")
+    for rule, prefix, canonical in _implementations.get(issue.get("type"), ()):
+        if prefix is None or description.startswith(prefix):
+            return rule, canonical
+    return None
+
+@lru_cache(maxsize=None)
+def normalized_location(location):
+    # path inside the decompiled tree, whether the analyzer wrote it absolute or relative
+    location = (location or "").replace("\\", "/")
+    for root in ("sources/", "resources/"):
+        index = location.rfind("/" + root)
+        if index >= 0:
+            return location[index + 1:]
+    return location
+
+def shared_fingerprint(issue):
+    # (fingerprint, is canonical) of a shared-rule finding: the rule, the file and the subject, where in the
+    # file is left to SharedFindingIndex since analyzers report different hits of the same code
+    shared = shared_rule_of(issue)
+    if shared is None:
+        return None
+
+    rule, canonical = shared
+    subject = SUBJECT_PATTERNS.get(rule)
+    subject = subject.match(issue.get("description", "")) if subject else None
+    fingerprint = (rule, normalized_location(issue.get("location")), subject.group(1) if subject else None)
+    return fingerprint, canonical
+
+class SharedFindingIndex:
+    # where the canonical analyzers reported each shared rule, a non-canonical finding whose match overlaps
+    # one of those spans is a duplicate, findings without offsets fall back to the line
+    def __init__(self):
+        self.places = {}
+
+    def add(self, issue):
+        shared = shared_fingerprint(issue)
+        if shared is not None and shared[1]:
+            self.places.setdefault(shared[0], []).append((issue.get("offsets"), issue.get("line")))
+
+    def is_duplicate(self, issue):
+        shared = shared_fingerprint(issue)
+        if shared is None or shared[1]:
+            return False
+
+        offsets = issue.get("offsets")
+        line = issue.get("line")
+        for canonical_offsets, canonical_line in self.places.get(shared[0], ()):
+            if offsets and canonical_offsets:
+                if offsets[0] < canonical_offsets[1] and canonical_offsets[0] < offsets[1]:
+                    return True
+            elif line == canonical_line:
+                return True
+        return False
+
+def merge_duplicate_findings(issues):
+    # drop findings of non-canonical implementations where the canonical one reported the same place,
+    # a grouped record stands for findings elsewhere too and is never dropped as a whole
+    index = SharedFindingIndex()
+    for issue in issues:
+        index.add(issue)
+    return [issue for issue in issues if issue.get("count", 1) > 1 or not index.is_duplicate(issue)]
@@ -0,0 +1,154 @@
+import os
+import re
+import json
+import hashlib
+import argparse
+from functools import lru_cache
+from findings import iter_result_issues
+from findings_store import connect, iter_scan_findings
+from rule_registry import normalized_location, merge_duplicate_findings
+
+SEVERITIES = ["HIGH", "MEDIUM", "LOW", "INFO"]
+
+# DB:SCAN_ID, a scan recorded in the findings store
+STORE_SCAN = re.compile(r"^(.+):(\d+)$")
+
+# counts and scores in a description change from build to build without the finding changing
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+@lru_cache(maxsize=None)
+def normalized_description(description):
+    return _NUMBER.sub("#", description)
+
+def finding_fingerprint(issue):
+    # stable across builds of an app: rule, path in the decompiled tree and the code around the match,
+    # never the line number, which moves whenever code above the match changes
+    description = normalized_description(issue.get("description", ""))
+    context = " ".join((issue.get("context") or "").split())
+    key = "\0".join((issue.get("type", ""), description, normalized_location(issue.get("location")), context))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=12).hexdigest()
+
+def scan_result_files(output_dir):
+    # result files of a main.py output directory, every finding from the details file where there is one
+    results_dir = os.path.join(output_dir, "results")
+    files = []
+    for name in sorted(os.listdir(results_dir)):
+        if not name.endswith((".json", ".jsonl")) or name == "stage_status.json":
+            continue
+        details_file = os.path.join(results_dir, "details", name)
+        files.append(details_file if os.path.exists(details_file) else os.path.join(results_dir, name))
+    return files
+
+def expanded_records(issues):
+    # a grouped record from a result without its details file stands for count findings, each one is
+    # diffed on its own so a fix of some of them shows up
+    for issue in issues:
+        count = issue.pop("count", 1)
+        issue.pop("sample_locations", None)
+        yield issue
+        for _ in range(count - 1):
+            yield dict(issue)
+
+def load_scan(source):
+    # findings of one scan: a main.py output directory, a single result file or DB:SCAN_ID
+    store_scan = STORE_SCAN.match(source)
+    if store_scan and os.path.isfile(store_scan.group(1)):
+        conn = connect(store_scan.group(1))
+        issues = list(iter_scan_findings(conn, int(store_scan.group(2))))
+        conn.close()
+        return merge_duplicate_findings(issues)
+
+    if os.path.isdir(source):
+        result_files = scan_result_files(source)
+    elif os.path.isfile(source):
+        result_files = [source]
+    else:
+        raise FileNotFoundError(f"scan not found: {source}")
+
+    issues = []
+    for result_file in result_files:
+        try:
+            issues.extend(expanded_records(iter_result_issues(result_file)))
+        except json.JSONDecodeError:
+            print(f"Warning: Could not parse {result_file}")
+    # the same findings the report shows
+    return merge_duplicate_findings(issues)
+
+def index_findings(issues):
+    # fingerprint -> findings with it, in scan order
+    index = {}
+    for issue in issues:
+        fingerprint = issue["fingerprint"] = finding_fingerprint(issue)
+        index.setdefault(fingerprint, []).append(issue)
+    return index
+
+def diff_scans(old_issues, new_issues):
+    # hash join of the two scans on the finding fingerprint, linear in the number of findings
+    # a fingerprint found n times before and m times now gives min(n, m) remaining findings
+    old_index = index_findings(old_issues)
+    new_index = index_findings(new_issues)
+
+    delta = {"new": [], "fixed": [], "remaining": []}
+    for fingerprint, issues in new_index.items():
+        before = len(old_index.get(fingerprint, ()))
+        delta["remaining"].extend(issues[:before])
+        delta["new"].extend(issues[before:])
+    for fingerprint, issues in old_index.items():
+        delta["fixed"].extend(issues[len(new_index.get(fingerprint, ())):])
+    return delta
+
+def severity_counts(issues):
+    counts = {}
+    for issue in issues:
+        severity = issue.get("severity", "UNKNOWN")
+        counts[severity] = counts.get(severity, 0) + 1
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the findings of two scans of an app")
+    parser.add_argument("old", help="Earlier scan: main.py output directory, result file or DB:SCAN_ID")
+    parser.add_argument("new", help="Later scan, in any of the same forms")
+    parser.add_argument("-o", "--output", help="Output file for the delta report, JSON Lines when it ends in .jsonl")
+    parser.add_argument("--remaining", action="store_true", help="List the remaining findings in the report too")
+
+    args = parser.parse_args()
+
+    try:
+        old_issues = load_scan(args.old)
+        new_issues = load_scan(args.new)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return
+
+    delta = diff_scans(old_issues, new_issues)
+
+    # print summary
+    print(f"\nCompared {len(old_issues)} findings in {args.old} with {len(new_issues)} in {args.new}:")
+    for status in ("new", "fixed", "remaining"):
+        counts = severity_counts(delta[status])
+        by_severity = ", ".join(f"{counts[s]} {s}" for s in SEVERITIES + sorted(set(counts) - set(SEVERITIES))
+                                if counts.get(s))
+        print(f"- {status.capitalize()}: {len(delta[status])} findings" + (f" ({by_severity})" if by_severity else ""))
+
+    statuses = ["new", "fixed", "remaining"] if args.remaining else ["new", "fixed"]
+    if args.output and args.output.endswith(".jsonl"):
+        # one finding per line with its status, the way the analyzers stream results
+        with open(args.output, 'w') as f:
+            for status in statuses:
+                for issue in delta[status]:
+                    f.write(json.dumps({"status": status, **issue}) + "\n")
+        print(f"Delta report saved to {args.output}")
+    elif args.output:
+        report = {
+            "old": args.old,
+            "new": args.new,
+            "summary": {status: len(issues) for status, issues in delta.items()}
+        }
+        for status in statuses:
+            report[f"{status}_findings"] = delta[status]
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Delta report saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -2,24 +2,48 @@ import os
 import re
 import argparse
 import xml.etree.ElementTree as ET
-import json
+import numpy as np
+from source_files import route, route_files
+from app_index import iter_literals, literal_span, load_file_metrics, METRIC_COLUMNS
+from entropy_scorer import find_secret_candidates
+from findings import Finding, FindingWriter
+from findings_store import add_store_arguments, store_from_args
+from rule_registry import shared_rules_skipped_by
+
+# the files each check reads, routed in one walk of the decompiled tree
+ROUTES = {
+    "webview": route(extensions=(".java",), scope="all"),
+    "insecure_random": route(extensions=(".java",)),
+    "logging": route(extensions=(".java",)),
+    "code_obfuscation": route(extensions=(".java",)),
+    "debug_flags": route(extensions=(".java",))
+}
 
 class SecurityAnalyzer:
-    def __init__(self, decompiled_dir):
+    def __init__(self, decompiled_dir, issues=None, skip_rules=()):
         self.decompiled_dir = decompiled_dir
         self.manifest_path = os.path.join(decompiled_dir, "resources", "AndroidManifest.xml")
         self.java_dir = os.path.join(decompiled_dir, "sources")
-        self.issues = []
+        # any list-like sink, main() passes a FindingWriter so findings are written as they are found
+        self.issues = [] if issues is None else issues
+        # shared rules left to their canonical analyzer, see rule_registry.py
+        self.skip_rules = set(skip_rules)
     
     def analyze(self):
         print(f"Analyzing decompiled code in {self.decompiled_dir}...")
         
-        self.check_exported_components()
-        self.check_webview_security()
+        self.files = route_files(self.decompiled_dir, ROUTES)
+        
+        if "exported_components" not in self.skip_rules:
+            self.check_exported_components()
+        if "webview_javascript" not in self.skip_rules:
+            self.check_webview_security()
         self.check_insecure_connections()
         self.check_hardcoded_secrets()
-        self.check_insecure_random()
-        self.check_logging()
+        if "insecure_random" not in self.skip_rules:
+            self.check_insecure_random()
+        if "sensitive_logging" not in self.skip_rules:
+            self.check_logging()
         self.check_code_obfuscation()
         self.check_debug_flags()
         
@@ -43,12 +67,12 @@ class SecurityAnalyzer:
                 
                 if exported == "true":
                     exported_activities.append(name)
-                    self.issues.append({
-                        "type": "Exported Activity",
-                        "severity": "HIGH",
-                        "description": f"Activity {name} is exported and might be accessible by other apps",
-                        "location": "AndroidManifest.xml"
-                    })
+                    self.issues.append(Finding(
+                        "Exported Activity",
+                        "HIGH",
+                        f"Activity {name} is exported and might be accessible by other apps",
+                        "AndroidManifest.xml"
+                    ))
                     
             print(f"Found {len(exported_activities)} exported activities")
             
@@ -58,24 +82,23 @@ class SecurityAnalyzer:
     def check_webview_security(self):
         js_enabled_pattern = re.compile(r'\.setJavaScriptEnabled\s*\(\s*true\s*\)')
         
-        for root, _, files in os.walk(self.java_dir):
-            for file in files:
-                if file.endswith(".java"):
-                    file_path = os.path.join(root, file)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            
-                            # check for js enabled
-                            if js_enabled_pattern.search(content):
-                                self.issues.append({
-                                    "type": "Insecure WebView",
-                                    "severity": "MEDIUM",
-                                    "description": "JavaScript is enabled in WebView which can lead to XSS attacks",
-                                    "location": file_path
-                                })
-                    except:
-                        continue
+        for file_path, rel_path in self.files["webview"]:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                    
+                    # check for js enabled
+                    match = js_enabled_pattern.search(content)
+                    if match:
+                        self.issues.append(Finding(
+                            "Insecure WebView",
+                            "MEDIUM",
+                            "JavaScript is enabled in WebView which can lead to XSS attacks",
+                            file_path,
+                            span=(file_path, match.start(), match.end())
+                        ))
+            except:
+                continue
     
     def check_insecure_connections(self):
         if not os.path.exists(self.manifest_path):
@@ -90,12 +113,12 @@ class SecurityAnalyzer:
                                       {"android": "http://schemas.android.com/apk/res/android"})
             
             if cleartext_allowed is not None:
-                self.issues.append({
-                    "type": "Insecure Network",
-                    "severity": "HIGH",
-                    "description": "App allows cleartext traffic which can be intercepted",
-                    "location": "AndroidManifest.xml"
-                })
+                self.issues.append(Finding(
+                    "Insecure Network",
+                    "HIGH",
+                    "App allows cleartext traffic which can be intercepted",
+                    "AndroidManifest.xml"
+                ))
                 
             # look for network security config
             config_file = os.path.join(self.decompiled_dir, "resources", "res", "xml", "network_security_config.xml")
@@ -103,48 +126,65 @@ class SecurityAnalyzer:
                 with open(config_file, 'r', encoding='utf-8') as f:
                     content = f.read()
                     if "cleartextTrafficPermitted=\"true\"" in content:
-                        self.issues.append({
-                            "type": "Insecure Network Config",
-                            "severity": "HIGH",
-                            "description": "Cleartext traffic is permitted in the network security config",
-                            "location": config_file
-                        })
+                        self.issues.append(Finding(
+                            "Insecure Network Config",
+                            "HIGH",
+                            "Cleartext traffic is permitted in the network security config",
+                            config_file
+                        ))
         except:
             pass
     
     def check_hardcoded_secrets(self):
-        secret_patterns = [
-            (r'(?i)api[_-]?key\s*=\s*["\']([^"\']{10,})["\']', "API Key"),
-            (r'(?i)password\s*=\s*["\']([^"\']{3,})["\']', "Password"),
-            (r'(?i)secret\s*=\s*["\']([^"\']{5,})["\']', "Secret"),
-            (r'(?i)firebase.*\.com', "Firebase URL"),
-            (r'AIza[0-9A-Za-z_-]{35}', "Google API Key"),
+        # (assignment target pattern, value pattern, secret type), run over the string literal table,
+        # value patterns search anywhere in the literal so a key inside a header or url is still found
+        secret_rules = [
+            (re.compile(r'(?i)api[_-]?key$'), re.compile(r'[^"\']{10,}'), "API Key"),
+            (re.compile(r'(?i)password$'), re.compile(r'[^"\']{3,}'), "Password"),
+            (re.compile(r'(?i)secret$'), re.compile(r'[^"\']{5,}'), "Secret"),
+            (None, re.compile(r'(?i)api[_-]?key\s*[=:]\s*["\']?[^"\'&\s]{10,}'), "API Key"),
+            (None, re.compile(r'(?i)password\s*[=:]\s*["\']?[^"\'&\s]{3,}'), "Password"),
+            (None, re.compile(r'(?i)secret\s*[=:]\s*["\']?[^"\'&\s]{5,}'), "Secret"),
+            (None, re.compile(r'(?i)\bBearer\s+[\w.~+/-]{16,}|\bsk_live_[0-9A-Za-z]{16,}'), "Bearer Token"),
+            (None, re.compile(r'(?i)firebase.*\.com'), "Firebase URL"),
+            (None, re.compile(r'AIza[0-9A-Za-z_-]{35}'), "Google API Key"),
         ]
         
-        for root, _, files in os.walk(self.java_dir):
-            for file in files:
-                if file.endswith(".java"):
-                    file_path = os.path.join(root, file)
-                    
-                    # skip library code
-                    if "com/google/" in file_path or "androidx/" in file_path:
-                        continue
-                        
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            
-                            for pattern, secret_type in secret_patterns:
-                                matches = re.findall(pattern, content)
-                                for match in matches:
-                                    self.issues.append({
-                                        "type": "Hardcoded Secret",
-                                        "severity": "HIGH",
-                                        "description": f"Potential {secret_type} found in source code",
-                                        "location": file_path
-                                    })
-                    except:
-                        continue
+        literals = list(iter_literals(self.decompiled_dir, (".java",)))
+        flagged = set()
+        
+        for number, literal in enumerate(literals):
+            found = set()
+            for target_pattern, value_pattern, secret_type in secret_rules:
+                if target_pattern is not None and not (literal["target"] and target_pattern.search(literal["target"])):
+                    continue
+                # a named value that also embeds name=value is reported once
+                if secret_type in found or not value_pattern.search(literal["value"]):
+                    continue
+                found.add(secret_type)
+                flagged.add(number)
+                self.issues.append(Finding(
+                    "Hardcoded Secret",
+                    "HIGH",
+                    f"Potential {secret_type} found in source code",
+                    os.path.join(self.decompiled_dir, literal["file"]),
+                    span=literal_span(self.decompiled_dir, literal)
+                ))
+        
+        # random-looking tokens under any name, scored in one batch
+        candidates, scores = find_secret_candidates([literal["value"] for literal in literals])
+        for number in candidates:
+            if number in flagged:
+                continue
+            literal = literals[number]
+            self.issues.append(Finding(
+                "Hardcoded Secret",
+                "MEDIUM",
+                f"High-entropy string may be a hardcoded secret "
+                f"({scores['entropy'][number]:.2f} bits/char, {scores['length'][number]} chars)",
+                os.path.join(self.decompiled_dir, literal["file"]),
+                span=literal_span(self.decompiled_dir, literal)
+            ))
     
     def check_insecure_random(self):
         insecure_random_patterns = [
@@ -152,114 +192,110 @@ class SecurityAnalyzer:
             r'Math\.random\(\)'
         ]
         
-        for root, _, files in os.walk(self.java_dir):
-            for file in files:
-                if file.endswith(".java"):
-                    file_path = os.path.join(root, file)
+        for file_path, rel_path in self.files["insecure_random"]:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
                     
-                    # skip library code
-                    if "com/google/" in file_path or "androidx/" in file_path:
-                        continue
-                        
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            
-                            for pattern in insecure_random_patterns:
-                                if re.search(pattern, content):
-                                    self.issues.append({
-                                        "type": "Insecure Random",
-                                        "severity": "MEDIUM",
-                                        "description": "Insecure random number generator used",
-                                        "location": file_path
-                                    })
-                    except:
-                        continue
+                    for pattern in insecure_random_patterns:
+                        match = re.search(pattern, content)
+                        if match:
+                            self.issues.append(Finding(
+                                "Insecure Random",
+                                "MEDIUM",
+                                "Insecure random number generator used",
+                                file_path,
+                                span=(file_path, match.start(), match.end())
+                            ))
+            except:
+                continue
     
     def check_logging(self):
         log_patterns = [
             r'Log\.(v|d|i|w|e)\([^)]*((password|token|key|secret|credential)[^)]*)\)',
         ]
         
-        for root, _, files in os.walk(self.java_dir):
-            for file in files:
-                if file.endswith(".java"):
-                    file_path = os.path.join(root, file)
+        for file_path, rel_path in self.files["logging"]:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
                     
-                    # skip library code
-                    if "com/google/" in file_path or "androidx/" in file_path:
-                        continue
-                        
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            
-                            for pattern in log_patterns:
-                                if re.search(pattern, content, re.IGNORECASE):
-                                    self.issues.append({
-                                        "type": "Sensitive Logging",
-                                        "severity": "MEDIUM",
-                                        "description": "Potentially sensitive information being logged",
-                                        "location": file_path
-                                    })
-                    except:
-                        continue
+                    for pattern in log_patterns:
+                        match = re.search(pattern, content, re.IGNORECASE)
+                        if match:
+                            self.issues.append(Finding(
+                                "Sensitive Logging",
+                                "MEDIUM",
+                                "Potentially sensitive information being logged",
+                                file_path,
+                                span=(file_path, match.start(), match.end())
+                            ))
+            except:
+                continue
                         
     def check_code_obfuscation(self):
-        # signs of obfuscation
-        obfuscation_patterns = [
-            (r'Class\s+[a-z]{1,2}(?:\$[a-z]{1,2})*\s*(?:extends|implements)', "Short class names"),
-            (r'(?:public|private|protected)\s+[a-z]{1,2}\s*\(', "Short method names"),
-            (r'String\.fromCharCode\(.*?\)', "Character code obfuscation"),
-            (r'new\s+String\s*\(\s*new\s+byte\[\]', "Byte array string construction"),
-            (r'(?:Class\.forName|ClassLoader|loadClass|defineClass)\s*\(', "Dynamic class loading"),
-            (r'(?:getDeclaredMethod|getMethod)\s*\([^)]*\)\.invoke\(', "Reflection usage"),
-            (r'dexClassLoader|dalvik\.system\.DexClassLoader', "Runtime code loading"),
-            (r'Cipher\s*\.\s*getInstance\s*\([^)]*\)', "Custom encryption")
+        # app-wide obfuscation signals, (metric column, technique) reported once each
+        techniques = [
+            ("reflection", "Reflection usage"),
+            ("dynamic_loading", "Dynamic class loading"),
+            ("runtime_loading", "Runtime code loading"),
+            ("byte_array_strings", "Byte array string construction"),
+            ("char_code_strings", "Character code obfuscation"),
+            ("custom_encryption", "Custom encryption")
         ]
         
-        # obfuscation techniques
-        obfuscation_counts = {}
-        for _, technique in obfuscation_patterns:
-            obfuscation_counts[technique] = 0
-            
-        for root, _, files in os.walk(self.java_dir):
-            for file in files:
-                if file.endswith(".java"):
-                    file_path = os.path.join(root, file)
-                    
-                    # skip library code
-                    if "com/google/" in file_path or "androidx/" in file_path:
-                        continue
-                        
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            
-                            for pattern, technique in obfuscation_patterns:
-                                matches = re.findall(pattern, content)
-                                if matches:
-                                    obfuscation_counts[technique] += len(matches)
-                                    
-                                    if len(matches) > 0:
-                                        self.issues.append({
-                                            "type": "Code Obfuscation",
-                                            "severity": "INFO",
-                                            "description": f"Potential {technique} detected ({len(matches)} occurrences)",
-                                            "location": file_path
-                                        })
-                    except:
-                        continue
-                        
+        files, counts = load_file_metrics(self.decompiled_dir)
+        scanned = {rel_path for _, rel_path in self.files["code_obfuscation"]}
+        rows = np.array([rel_path in scanned for rel_path in files], dtype=bool)
+        if not rows.any():
+            return
+        
+        counts = counts[rows]
+        files = [rel_path for rel_path, keep in zip(files, rows) if keep]
+        column = {name: counts[:, index] for index, name in enumerate(METRIC_COLUMNS)}
+        totals = {name: int(values.sum()) for name, values in column.items()}
+        
+        # renamed classes and methods carry most of the weight, short identifiers and reflection the rest
+        short_classes = totals["short_classes"] / max(totals["classes"], 1)
+        short_methods = totals["short_methods"] / max(totals["methods"], 1)
+        short_identifiers = (totals["ident_len_1"] + totals["ident_len_2"]) / max(totals["identifiers"], 1)
+        reflection_density = (totals["reflection"] + totals["dynamic_loading"]) * 1000 / max(totals["lines"], 1)
+        
+        score = round(100 * (0.35 * short_classes +
+                             0.30 * short_methods +
+                             0.20 * min(max(short_identifiers - 0.15, 0) / 0.35, 1) +
+                             0.15 * min(reflection_density / 5, 1)))
+        
+        for name, technique in techniques:
+            if totals[name] == 0:
+                continue
+            densest = int(column[name].argmax())
+            self.issues.append(Finding(
+                "Code Obfuscation",
+                "INFO",
+                f"{technique} detected ({totals[name]} occurrences in "
+                f"{int(np.count_nonzero(column[name]))} files)",
+                os.path.join(self.decompiled_dir, files[densest])
+            ))
+        
         # summary of obfuscation findings
-        total_obfuscation = sum(obfuscation_counts.values())
-        if total_obfuscation > 10:
-            self.issues.append({
-                "type": "Code Obfuscation",
-                "severity": "MEDIUM",
-                "description": f"App appears to be heavily obfuscated with {total_obfuscation} obfuscation techniques detected",
-                "location": "Multiple files"
-            })
+        summary = (f"obfuscation score {score}/100: {short_classes:.0%} short class names, "
+                   f"{short_methods:.0%} short method names, "
+                   f"{reflection_density:.1f} reflective calls per 1000 lines")
+        if score >= 50:
+            self.issues.append(Finding(
+                "Code Obfuscation",
+                "MEDIUM",
+                f"App appears to be heavily obfuscated ({summary})",
+                "Multiple files"
+            ))
+        elif score >= 25:
+            self.issues.append(Finding(
+                "Code Obfuscation",
+                "LOW",
+                f"App appears to be partially obfuscated ({summary})",
+                "Multiple files"
+            ))
     
     def check_debug_flags(self):
         if not os.path.exists(self.manifest_path):
@@ -274,67 +310,55 @@ class SecurityAnalyzer:
                                {"android": "http://schemas.android.com/apk/res/android"})
             
             if debuggable is not None:
-                self.issues.append({
-                    "type": "Debug Flag",
-                    "severity": "HIGH",
-                    "description": "App is debuggable in production build",
-                    "location": "AndroidManifest.xml"
-                })
+                self.issues.append(Finding(
+                    "Debug Flag",
+                    "HIGH",
+                    "App is debuggable in production build",
+                    "AndroidManifest.xml"
+                ))
                 
             # check for StrictMode
-            for root_dir, _, files in os.walk(self.java_dir):
-                for file in files:
-                    if file.endswith(".java"):
-                        file_path = os.path.join(root_dir, file)
+            for file_path, rel_path in self.files["debug_flags"]:
+                try:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        content = f.read()
                         
-                        # skip library code
-                        if "com/google/" in file_path or "androidx/" in file_path:
-                            continue
-                            
-                        try:
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                content = f.read()
-                                
-                                if "StrictMode" in content and "enableDefaults" in content:
-                                    self.issues.append({
-                                        "type": "Debug Flag",
-                                        "severity": "MEDIUM",
-                                        "description": "StrictMode is enabled in potentially production code",
-                                        "location": file_path
-                                    })
-                        except:
-                            continue
+                        if "StrictMode" in content and "enableDefaults" in content:
+                            self.issues.append(Finding(
+                                "Debug Flag",
+                                "MEDIUM",
+                                "StrictMode is enabled in potentially production code",
+                                file_path
+                            ))
+                except:
+                    continue
         except:
             pass
 
 def main():
     parser = argparse.ArgumentParser(description="Analyze decompiled APK for security issues")
     parser.add_argument("decompiled_dir", help="Path to the decompiled APK directory")
-    parser.add_argument("-o", "--output", help="Output JSON file for results")
+    parser.add_argument("-o", "--output", help="Output file for results, JSON Lines when it ends in .jsonl")
+    parser.add_argument("--details", help="Write every finding here and group repeated ones in the output")
+    add_store_arguments(parser)
+    parser.add_argument("--skip-shared-rules", action="store_true",
+                        help="Leave checks shared with other analyzers to the analyzer that owns them")
     
     args = parser.parse_args()
+    store = store_from_args(parser, args, "security_analyzer")
+    
+    skip_rules = shared_rules_skipped_by("security_analyzer") if args.skip_shared_rules else ()
     
-    analyzer = SecurityAnalyzer(args.decompiled_dir)
-    issues = analyzer.analyze()
+    with FindingWriter(args.output, args.decompiled_dir, details_path=args.details, store=store) as issues:
+        SecurityAnalyzer(args.decompiled_dir, issues, skip_rules).analyze()
     
     #print summary
     print(f"\nAnalysis complete! Found {len(issues)} potential security issues.")
     
-    if issues:
-        issues_by_severity = {}
-        for issue in issues:
-            severity = issue["severity"]
-            if severity not in issues_by_severity:
-                issues_by_severity[severity] = 0
-            issues_by_severity[severity] += 1
-            
-        for severity, count in issues_by_severity.items():
-            print(f"- {severity}: {count} issues")
+    for severity, count in issues.severity_counts.items():
+        print(f"- {severity}: {count} issues")
     
-    # save results
     if args.output:
-        with open(args.output, 'w') as f:
-            json.dump(issues, f, indent=2)
         print(f"Detailed results saved to {args.output}")
 
 if __name__ == "__main__":
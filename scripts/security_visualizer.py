@@ -2,28 +2,164 @@ import os
 import json
 import argparse
 import datetime
+from generated_files import skipped_summary
+from findings import source_context, iter_result_issues
+from rule_registry import SharedFindingIndex
 
-def generate_html_report(app_name, result_files):    
-    # load all results
-    all_issues = []
+def details_file_of(result_file):
+    # main.py keeps every finding of a grouped result in results/details under the same name
+    details_file = os.path.join(os.path.dirname(result_file), "details", os.path.basename(result_file))
+    return details_file if os.path.exists(details_file) else None
+
+def shared_duplicates(result_files):
+    # findings from overlapping rules of different analyzers, worked out on every finding before grouping:
+    # (index of the canonical findings, {(result file, group number): duplicate findings in that group})
+    index = SharedFindingIndex()
+    sources = [details_file_of(f) or f for f in result_files if os.path.exists(f)]
+    for source in sources:
+        try:
+            for issue in iter_result_issues(source):
+                index.add(issue)
+        except json.JSONDecodeError:
+            continue
+
+    duplicates = {}
+    for result_file in result_files:
+        details_file = details_file_of(result_file)
+        if details_file is None:
+            continue
+        for issue in iter_result_issues(details_file):
+            if index.is_duplicate(issue):
+                key = (result_file, issue.get("group"))
+                duplicates[key] = duplicates.get(key, 0) + 1
+    return index, duplicates
+
+def merged_records(result_file, records, index, duplicates):
+    # records of one result without the shared-rule duplicates, a grouped record loses only its duplicate members
+    grouped = details_file_of(result_file) is not None
+    for number, issue in enumerate(records):
+        if grouped:
+            count = issue.get("count", 1) - duplicates.get((result_file, number), 0)
+            if count <= 0:
+                continue
+            if "count" in issue:
+                issue["count"] = count
+        elif issue.get("count", 1) == 1 and index.is_duplicate(issue):
+            continue
+        yield issue
+
+def issue_row(issue, source_dir=None, context_width=None):
+    # table row of one finding, rendered as the finding is read
+    severity = issue.get("severity", "UNKNOWN")
+    description = issue.get("description", "No description")
+    location = issue.get("location", "Unknown")
+    context = issue.get("context", "")
+
+    # findings keep their match offsets, so the snippet can be re-cut at another width
+    if source_dir and context_width is not None and "offsets" in issue:
+        start, end = issue["offsets"]
+        context = source_context(os.path.join(source_dir, location), start, end, context_width) or context
+
+    if "line" in issue:
+        location = f"{location}:{issue['line']}:{issue.get('column', 1)}"
+
+    # repeated findings come as one record with a sample of where they occur
+    occurrences = issue.get("count", 1)
+    if occurrences > 1:
+        location = f"{location} (+{occurrences - 1} more)"
+        samples = issue.get("sample_locations", [])
+        more = occurrences - len(samples)
+        context = "\n".join([context, f"Occurs {occurrences} times, e.g. in:", *samples,
+                             *([f"... and {more} more"] if more > 0 else [])]).strip()
+
+    # identical files are scanned once and listed on the same finding
+    duplicates = issue.get("duplicate_locations", [])
+    if duplicates:
+        location = f"{location} (+{len(duplicates)} identical)"
+        copies = [copy if isinstance(copy, str) else
+                  f"{copy['location']}:{copy['line']}" if "line" in copy else copy["location"]
+                  for copy in duplicates]
+        context = "\n".join([context, "Also in:", *copies]).strip()
+
+    severity_class = ""
+    if severity == "HIGH":
+        severity_class = "severity-high"
+    elif severity == "MEDIUM":
+        severity_class = "severity-medium"
+    elif severity == "LOW":
+        severity_class = "severity-low"
+    elif severity == "INFO":
+        severity_class = "severity-info"
+
+    row = f"""
+        <tr class="{severity_class}">
+            <td>{severity}</td>
+            <td>{description}</td>
+            <td>{location}</td>
+            <td>
+    """
+
+    if context:
+        row += f"""
+                <button class="collapsible">View Details</button>
+                <div class="content">
+                    <pre>{context}</pre>
+                </div>
+        """
+    else:
+        row += "No additional details"
+
+    row += """
+            </td>
+        </tr>
+    """
+    return row
+
+def generate_html_report(app_name, result_files, stage_status=None, skipped=None, source_dir=None, context_width=None):    
+    # findings are counted and rendered as they are read, only the rows are kept
+    severity_counts = {"HIGH": 0, "MEDIUM": 0, "LOW": 0, "INFO": 0}
+    type_counts = {}
+    rows_by_type = {}
     additional_data = {
         "permissions": {},
         "libraries": {},
         "anti_tampering": {}
     }
     
+    # findings from overlapping rules of different analyzers are reported once
+    index, duplicates = shared_duplicates(result_files)
+    
+    def add_issues(records):
+        for issue in records:
+            severity = issue.get("severity", "UNKNOWN")
+            issue_type = issue.get("type", "UNKNOWN")
+            
+            # a grouped record stands for count identical findings
+            occurrences = issue.get("count", 1)
+            
+            if severity in severity_counts:
+                severity_counts[severity] += occurrences
+            type_counts[issue_type] = type_counts.get(issue_type, 0) + occurrences
+            rows_by_type.setdefault(issue_type, []).append(issue_row(issue, source_dir, context_width))
+    
     for result_file in result_files:
-        if os.path.exists(result_file):
+        # findings streamed as json lines, possibly by an analyzer that is still running
+        if result_file.endswith(".jsonl") and os.path.exists(result_file):
+            try:
+                add_issues(merged_records(result_file, iter_result_issues(result_file), index, duplicates))
+            except json.JSONDecodeError:
+                print(f"Warning: Could not parse {result_file} as JSON Lines")
+        elif os.path.exists(result_file):
             try:
                 with open(result_file, 'r') as f:
                     data = json.load(f)
                     
                     # handle different result formats
                     if isinstance(data, list):
-                        all_issues.extend(data)
+                        add_issues(merged_records(result_file, data, index, duplicates))
                     elif isinstance(data, dict):
                         if "issues" in data:
-                            all_issues.extend(data["issues"])
+                            add_issues(merged_records(result_file, data["issues"], index, duplicates))
                         
                         if "permissions" in data and "usage" in data:
                             additional_data["permissions"] = data
@@ -39,23 +175,21 @@ def generate_html_report(app_name, result_files):
             except json.JSONDecodeError:
                 print(f"Warning: Could not parse {result_file} as JSON")
     
-    # count issues by type
-    issue_counts = {}
-    severity_counts = {"HIGH": 0, "MEDIUM": 0, "LOW": 0, "INFO": 0}
-    type_counts = {}
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    for issue in all_issues:
-        severity = issue.get("severity", "UNKNOWN")
-        issue_type = issue.get("type", "UNKNOWN")
-        
-        if severity in severity_counts:
-            severity_counts[severity] += 1
-            
-        if issue_type not in type_counts:
-            type_counts[issue_type] = 0
-        type_counts[issue_type] += 1
+    # stages killed by their time or memory limit
+    incomplete_html = ""
+    incomplete = {stage: data for stage, data in (stage_status or {}).items()
+                  if data.get("status") not in ("completed", "skipped")}
+    if incomplete:
+        incomplete_html = "<p><strong>Incomplete Analysis:</strong> the following stages did not finish and their findings are missing:</p><ul>"
+        for stage, data in incomplete.items():
+            incomplete_html += f"<li>{stage} - {data.get('status')} ({data.get('detail')})</li>"
+        incomplete_html += "</ul>"
     
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    skipped_html = ""
+    if skipped:
+        skipped_html = f"<p><strong>Skipped Code:</strong> {skipped_summary(skipped)}</p>"
     
     html = f"""
     <!DOCTYPE html>
@@ -281,7 +415,9 @@ def generate_html_report(app_name, result_files):
         <div>
             <p><strong>App Name:</strong> {app_name}</p>
             <p><strong>Analysis Date:</strong> {now}</p>
-            <p><strong>Total Issues Found:</strong> {len(all_issues)}</p>
+            <p><strong>Total Issues Found:</strong> {sum(type_counts.values())}</p>
+            {skipped_html}
+            {incomplete_html}
         </div>
         
         <div class="tab">
@@ -368,18 +504,10 @@ def generate_html_report(app_name, result_files):
             <h2>Detailed Security Issues</h2>
     """
     
-    # group issues by type
-    issues_by_type = {}
-    for issue in all_issues:
-        issue_type = issue.get("type", "UNKNOWN")
-        if issue_type not in issues_by_type:
-            issues_by_type[issue_type] = []
-        issues_by_type[issue_type].append(issue)
-    
     # collapsible sections for each issue type
-    for issue_type, issues in issues_by_type.items():
+    for issue_type, rows in rows_by_type.items():
         html += f"""
-        <button class="collapsible">{issue_type} ({len(issues)})</button>
+        <button class="collapsible">{issue_type} ({type_counts[issue_type]})</button>
         <div class="content">
             <table class="issue-table">
                 <tr>
@@ -390,44 +518,7 @@ def generate_html_report(app_name, result_files):
                 </tr>
         """
         
-        for issue in issues:
-            severity = issue.get("severity", "UNKNOWN")
-            description = issue.get("description", "No description")
-            location = issue.get("location", "Unknown")
-            context = issue.get("context", "")
-            
-            severity_class = ""
-            if severity == "HIGH":
-                severity_class = "severity-high"
-            elif severity == "MEDIUM":
-                severity_class = "severity-medium"
-            elif severity == "LOW":
-                severity_class = "severity-low"
-            elif severity == "INFO":
-                severity_class = "severity-info"
-            
-            html += f"""
-                <tr class="{severity_class}">
-                    <td>{severity}</td>
-                    <td>{description}</td>
-                    <td>{location}</td>
-                    <td>
-            """
-            
-            if context:
-                html += f"""
-                        <button class="collapsible">View Details</button>
-                        <div class="content">
-                            <pre>{context}</pre>
-                        </div>
-                """
-            else:
-                html += "No additional details"
-                
-            html += """
-                    </td>
-                </tr>
-            """
+        html += "".join(rows)
         
         html += """
             </table>
@@ -590,39 +681,39 @@ def generate_html_report(app_name, result_files):
     
     # anti-tampering mechanisms
     if additional_data["anti_tampering"]:
-        signature_issues = [i for i in all_issues if i.get("type") == "Anti-Tampering"]
-        root_issues = [i for i in all_issues if i.get("type") == "Root Detection"]
-        emulator_issues = [i for i in all_issues if i.get("type") == "Emulator Detection"]
-        debug_issues = [i for i in all_issues if i.get("type") == "Anti-Debugging"]
+        signature_count = type_counts.get("Anti-Tampering", 0)
+        root_count = type_counts.get("Root Detection", 0)
+        emulator_count = type_counts.get("Emulator Detection", 0)
+        debug_count = type_counts.get("Anti-Debugging", 0)
         
         html += f"""
             <div class="defense-section">
                 <h3>Anti-Tampering Mechanisms</h3>
-                <p>The app implements {len(signature_issues)} signature verification mechanisms.</p>
+                <p>The app implements {signature_count} signature verification mechanisms.</p>
             </div>
             
             <div class="defense-section">
                 <h3>Root Detection</h3>
-                <p>The app implements {len(root_issues)} root detection mechanisms.</p>
+                <p>The app implements {root_count} root detection mechanisms.</p>
             </div>
             
             <div class="defense-section">
                 <h3>Emulator Detection</h3>
-                <p>The app implements {len(emulator_issues)} emulator detection mechanisms.</p>
+                <p>The app implements {emulator_count} emulator detection mechanisms.</p>
             </div>
             
             <div class="defense-section">
                 <h3>Anti-Debugging</h3>
-                <p>The app implements {len(debug_issues)} anti-debugging mechanisms.</p>
+                <p>The app implements {debug_count} anti-debugging mechanisms.</p>
             </div>
         """
         
         # calculate  score
         defense_score = min(100, 
-                           (len(signature_issues) * 15 + 
-                            len(root_issues) * 15 + 
-                            len(emulator_issues) * 10 + 
-                            len(debug_issues) * 10))
+                           (signature_count * 15 + 
+                            root_count * 15 + 
+                            emulator_count * 10 + 
+                            debug_count * 10))
         
         if defense_score >= 60:
             defense_class = "score-good"
@@ -697,10 +788,25 @@ def main():
     parser.add_argument("app_name", help="Name of the analyzed application")
     parser.add_argument("result_files", nargs="+", help="JSON result files from security analysis")
     parser.add_argument("-o", "--output", default="security_report.html", help="Output HTML report file")
+    parser.add_argument("--stage-status", help="JSON file with the outcome of each pipeline stage")
+    parser.add_argument("--skipped-files", help="JSON file with the generated and out-of-scope code that was skipped")
+    parser.add_argument("--source-dir", help="Decompiled APK directory to re-read finding context from")
+    parser.add_argument("--context-width", type=int, help="Characters of source shown around each match (needs --source-dir)")
     
     args = parser.parse_args()
     
-    html_report = generate_html_report(args.app_name, args.result_files)
+    stage_status = None
+    if args.stage_status and os.path.exists(args.stage_status):
+        with open(args.stage_status, 'r') as f:
+            stage_status = json.load(f)
+    
+    skipped = None
+    if args.skipped_files and os.path.exists(args.skipped_files):
+        with open(args.skipped_files, 'r') as f:
+            skipped = json.load(f).get("skipped")
+    
+    html_report = generate_html_report(args.app_name, args.result_files, stage_status, skipped,
+                                       args.source_dir, args.context_width)
     
     with open(args.output, "w", encoding="utf-8") as f:
         f.write(html_report)
@@ -0,0 +1,377 @@
+import os
+import re
+import json
+import xml.etree.ElementTree as ET
+from fnmatch import fnmatch
+from generated_files import GENERATED_FILES_FILE
+
+LIBRARY_CLASSES_FILE = "library_classes.json"
+SCAN_SCOPE_FILE = "scan_scope.json"
+FILE_MANIFEST_FILE = "file_manifest.json"
+
+# names jadx --deobf gave to renamed packages and classes, saved next to the decompiled sources
+DEOBF_MAP_FILE = "deobf_map.jobf"
+
+# bundled sdk code every analyzer has always skipped
+LIBRARY_PATH_MARKERS = ("com/google/", "androidx/")
+
+ANDROID_NS = "{http://schemas.android.com/apk/res/android}"
+
+# r8 renames packages to a, b, ab, jadx --deobf turns those into p000a, p001ab
+OBFUSCATED_SEGMENT = re.compile(r'^(?:[a-z]{1,2}|p\d{3}[a-z]{0,2})$')
+IMPORT_PATTERN = re.compile(r'^import\s+(?:static\s+)?([\w.]+?)(?:\.\*)?;', re.MULTILINE)
+COMPONENT_TAGS = ("application", "activity", "activity-alias", "service", "receiver", "provider")
+
+_library_files_cache = {}
+_scan_scope_cache = {}
+_generated_files_cache = {}
+_duplicate_files_cache = {}
+_deobf_map_cache = {}
+
+def load_deobf_map(decompiled_dir):
+    # ({raw package: alias}, {raw class: alias}) from the jobf map, lines like "p a.b = p001b" and "c a.b.c = C0002c"
+    if decompiled_dir in _deobf_map_cache:
+        return _deobf_map_cache[decompiled_dir]
+
+    packages = {}
+    classes = {}
+    map_path = os.path.join(decompiled_dir, DEOBF_MAP_FILE)
+    if os.path.exists(map_path):
+        try:
+            with open(map_path, 'r') as f:
+                for line in f:
+                    kind, _, entry = line.partition(" ")
+                    name, separator, alias = entry.partition(" = ")
+                    if not separator:
+                        continue
+                    if kind == "p":
+                        packages[name.strip()] = alias.strip()
+                    elif kind == "c":
+                        classes[name.strip()] = alias.strip()
+        except Exception as e:
+            print(f"Warning: Could not load deobfuscation map: {e}")
+
+    _deobf_map_cache[decompiled_dir] = (packages, classes)
+    return packages, classes
+
+def class_source_path(decompiled_dir, class_name):
+    # file jadx writes a dex class to: a.b$c -> sources/p000a/C0001b.java when --deobf renamed both,
+    # the dex name itself when nothing was renamed, classes without a package go to defpackage
+    packages, classes = load_deobf_map(decompiled_dir)
+    outer = class_name.split("$")[0]
+    package, _, simple = outer.rpartition(".")
+    segments = package.split(".") if package else ["defpackage"]
+    path = [packages.get(".".join(segments[:i + 1]), segment) for i, segment in enumerate(segments)]
+    return "/".join(["sources", *path, classes.get(outer, simple) + ".java"])
+
+def load_library_files(decompiled_dir):
+    # source paths of classes identified as library code by library_fingerprints.py, which names them as in the dex
+    if decompiled_dir in _library_files_cache:
+        return _library_files_cache[decompiled_dir]
+
+    library_files = set()
+    classes_path = os.path.join(decompiled_dir, LIBRARY_CLASSES_FILE)
+    if os.path.exists(classes_path):
+        try:
+            with open(classes_path, 'r') as f:
+                classes = json.load(f).get("classes", {})
+            for class_name in classes:
+                library_files.add(class_source_path(decompiled_dir, class_name))
+        except Exception as e:
+            print(f"Warning: Could not load library classes: {e}")
+
+    _library_files_cache[decompiled_dir] = library_files
+    return library_files
+
+def load_generated_files(decompiled_dir):
+    # {rel_path: policy} for generated sources classified during the app index pass
+    if decompiled_dir in _generated_files_cache:
+        return _generated_files_cache[decompiled_dir]
+
+    generated = {}
+    generated_path = os.path.join(decompiled_dir, GENERATED_FILES_FILE)
+    if os.path.exists(generated_path):
+        try:
+            with open(generated_path, 'r') as f:
+                generated = {rel_path: policy for rel_path, (_, policy) in json.load(f)["files"].items()}
+        except Exception as e:
+            print(f"Warning: Could not load generated file list: {e}")
+
+    _generated_files_cache[decompiled_dir] = generated
+    return generated
+
+def write_generated_files(decompiled_dir, generated, skipped):
+    # generated: {rel_path: (reason, policy)}, skipped: {reason: {"files": n, "bytes": n}}
+    with open(os.path.join(decompiled_dir, GENERATED_FILES_FILE), 'w') as f:
+        json.dump({"files": generated, "skipped": skipped}, f, indent=2)
+
+    _generated_files_cache.pop(decompiled_dir, None)
+
+def write_file_manifest(decompiled_dir, files, duplicates, edits=None):
+    # files: {rel_path: [content hash, bytes]}, duplicates: {scanned path: [paths with the same content]},
+    # edits: {rel_path: [[start, end, replacement length]]} the dedup normalization made to a duplicated file
+    with open(os.path.join(decompiled_dir, FILE_MANIFEST_FILE), 'w') as f:
+        json.dump({"files": files, "duplicates": duplicates, "edits": edits or {}}, f)
+
+    _duplicate_files_cache.pop(decompiled_dir, None)
+
+def load_duplicate_files(decompiled_dir):
+    # {scanned path: [copies]} from the file manifest, copies themselves are never scanned
+    if decompiled_dir in _duplicate_files_cache:
+        return _duplicate_files_cache[decompiled_dir][:2]
+
+    duplicates = {}
+    edits = {}
+    manifest_path = os.path.join(decompiled_dir, FILE_MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            duplicates = manifest["duplicates"]
+            edits = manifest.get("edits", {})
+        except Exception as e:
+            print(f"Warning: Could not load file manifest: {e}")
+
+    copies = {copy for paths in duplicates.values() for copy in paths}
+    _duplicate_files_cache[decompiled_dir] = (duplicates, copies, edits)
+    return duplicates, copies
+
+def copy_offset(decompiled_dir, rel_path, copy, offset):
+    # offset in a duplicate copy of the character at offset in rel_path, through the normalized content both share
+    load_duplicate_files(decompiled_dir)
+    edits = _duplicate_files_cache[decompiled_dir][2]
+
+    normalized = offset
+    for start, end, length in edits.get(rel_path, ()):
+        if offset < end:
+            if offset > start:
+                normalized -= offset - start - min(offset - start, length)
+            break
+        normalized -= end - start - length
+
+    shift = 0
+    for start, end, length in edits.get(copy, ()):
+        if normalized <= start - shift:
+            break
+        if normalized < start - shift + length:
+            return start + normalized - (start - shift)
+        shift += end - start - length
+    return normalized + shift
+
+def is_library_code(file_path, rel_path, library_files):
+    if any(marker in file_path for marker in LIBRARY_PATH_MARKERS):
+        return True
+    return rel_path.replace(os.sep, "/") in library_files
+
+def app_namespaces(decompiled_dir):
+    # the manifest package plus the package of every declared component class
+    manifest_path = os.path.join(decompiled_dir, "resources", "AndroidManifest.xml")
+    try:
+        root = ET.parse(manifest_path).getroot()
+    except Exception as e:
+        print(f"Warning: Could not read manifest for the app scope: {e}")
+        return None
+
+    package = root.get("package", "")
+    namespaces = {package} if package else set()
+    for tag in COMPONENT_TAGS:
+        for component in root.iter(tag):
+            name = component.get(f"{ANDROID_NS}name")
+            if not name:
+                continue
+            if name.startswith("."):
+                name = package + name
+            elif "." not in name:
+                name = f"{package}.{name}"
+            namespaces.add(name.rpartition(".")[0])
+
+    # drop namespaces nested inside another one
+    namespaces = sorted(n for n in namespaces if n)
+    return [n for n in namespaces if not any(n.startswith(other + ".") for other in namespaces if other != n)]
+
+def is_obfuscated_package(package):
+    return bool(package) and all(OBFUSCATED_SEGMENT.match(segment) for segment in package.split("."))
+
+def imported_names(file_path):
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return IMPORT_PATTERN.findall(f.read())
+    except OSError:
+        return []
+
+def obfuscated_app_packages(decompiled_dir, namespaces):
+    # renamed packages the app's own code imports, and the renamed packages those import in turn,
+    # r8 moves app classes there but a renamed package nothing in the app refers to stays out
+    java_dir = os.path.join(decompiled_dir, "sources")
+    sources = []
+    for namespace in namespaces:
+        for root, _, files in os.walk(os.path.join(java_dir, *namespace.split("."))):
+            sources.extend(os.path.join(root, file) for file in files if file.endswith((".java", ".kt")))
+
+    packages = set()
+    while sources:
+        for imported in imported_names(sources.pop()):
+            # a wildcard import names the package itself, anything else a class in it
+            for package in (imported, imported.rpartition(".")[0]):
+                directory = os.path.join(java_dir, *package.split("."))
+                if package in packages or not is_obfuscated_package(package) or not os.path.isdir(directory):
+                    continue
+                packages.add(package)
+                sources.extend(os.path.join(directory, file) for file in os.listdir(directory)
+                               if file.endswith((".java", ".kt")))
+    return sorted(packages)
+
+def write_scan_scope(decompiled_dir, mode="app"):
+    scope = {"mode": mode, "namespaces": app_namespaces(decompiled_dir) if mode == "app" else None}
+    if mode == "app" and not scope["namespaces"]:
+        print("Warning: App namespace unknown, scanning the full source tree")
+        scope = {"mode": "full", "namespaces": None}
+    if scope["mode"] == "app":
+        scope["obfuscated_packages"] = obfuscated_app_packages(decompiled_dir, scope["namespaces"])
+
+    with open(os.path.join(decompiled_dir, SCAN_SCOPE_FILE), 'w') as f:
+        json.dump(scope, f, indent=2)
+
+    _scan_scope_cache.pop(decompiled_dir, None)
+    return scope
+
+def load_scan_scope(decompiled_dir):
+    # "app" (the default) reads only first-party namespaces in depth, "full" reads the whole source tree
+    if decompiled_dir in _scan_scope_cache:
+        return _scan_scope_cache[decompiled_dir]
+
+    scope_path = os.path.join(decompiled_dir, SCAN_SCOPE_FILE)
+    scope = None
+    if os.path.exists(scope_path):
+        try:
+            with open(scope_path, 'r') as f:
+                scope = json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not load scan scope: {e}")
+
+    if scope is None:
+        namespaces = app_namespaces(decompiled_dir)
+        scope = {"mode": "app", "namespaces": namespaces} if namespaces else {"mode": "full", "namespaces": None}
+
+    if scope["mode"] == "app":
+        scope["prefixes"] = tuple("sources/" + n.replace(".", "/") + "/" for n in scope["namespaces"])
+        scope["package_dirs"] = frozenset("sources/" + p.replace(".", "/")
+                                          for p in scope.get("obfuscated_packages", ()))
+
+    _scan_scope_cache[decompiled_dir] = scope
+    return scope
+
+def in_scan_scope(rel_path, scope):
+    if scope["mode"] != "app":
+        return True
+
+    rel_path = rel_path.replace(os.sep, "/")
+    if rel_path.startswith(scope["prefixes"]):
+        return True
+
+    # renamed packages the app refers to, see obfuscated_app_packages, library fingerprints still apply there
+    return rel_path.rpartition("/")[0] in scope["package_dirs"]
+
+def is_scanned_source(decompiled_dir, rel_path):
+    # whether iter_source_files would yield this source, for paths that come from elsewhere such as xref call sites
+    rel_path = rel_path.replace(os.sep, "/")
+    if is_library_code(rel_path, rel_path, load_library_files(decompiled_dir)):
+        return False
+    if not in_scan_scope(rel_path, load_scan_scope(decompiled_dir)):
+        return False
+    return rel_path not in load_generated_files(decompiled_dir) and rel_path not in load_duplicate_files(decompiled_dir)[1]
+
+def iter_source_files(decompiled_dir, extensions=(".java", ".kt"), skip_libraries=True, scoped=True):
+    # yields (file_path, rel_path) for every decompiled source file an analyzer should scan,
+    # scoped=False ignores the app scope, generated files and duplicate copies for passes that need the whole tree
+    java_dir = os.path.join(decompiled_dir, "sources")
+    library_files = load_library_files(decompiled_dir) if skip_libraries else set()
+    scope = load_scan_scope(decompiled_dir) if scoped else {"mode": "full"}
+    generated = load_generated_files(decompiled_dir) if scoped else {}
+    copies = load_duplicate_files(decompiled_dir)[1] if scoped else set()
+
+    for root, _, files in os.walk(java_dir):
+        for file in files:
+            if not file.endswith(extensions):
+                continue
+
+            file_path = os.path.join(root, file)
+            rel_path = os.path.relpath(file_path, decompiled_dir)
+
+            if skip_libraries and is_library_code(file_path, rel_path, library_files):
+                continue
+            if not in_scan_scope(rel_path, scope) or rel_path in generated or rel_path in copies:
+                continue
+
+            yield file_path, rel_path
+
+def route(extensions=(".java", ".kt"), globs=None, scope="app", resource_dirs=None, subclass_of=None):
+    # the inputs a rule reads: scope "app" skips library code, "all" keeps it,
+    # resource_dirs such as "res/layout" also match qualified variants like res/layout-land
+    return {
+        "extensions": tuple(extensions),
+        "globs": tuple(globs or ()),
+        "scope": scope,
+        "resource_dirs": tuple(resource_dirs or ()),
+        "subclass_of": subclass_of
+    }
+
+def route_matches(rule_route, rel_path, is_library, class_files):
+    if not rel_path.endswith(rule_route["extensions"]):
+        return False
+    if rule_route["scope"] == "app" and is_library:
+        return False
+    if rule_route["globs"] and not any(fnmatch(rel_path, glob) for glob in rule_route["globs"]):
+        return False
+    if rule_route["subclass_of"] and rel_path not in class_files[rule_route["subclass_of"]]:
+        return False
+    return True
+
+def route_files(decompiled_dir, routes):
+    # one walk over the decompiled tree, returns {rule: [(file_path, rel_path)]} for the given {rule: route}
+    table = {rule: [] for rule in routes}
+    library_files = load_library_files(decompiled_dir)
+    scope = load_scan_scope(decompiled_dir)
+    generated = load_generated_files(decompiled_dir)
+    copies = load_duplicate_files(decompiled_dir)[1]
+
+    class_files = {}
+    for rule_route in routes.values():
+        base = rule_route["subclass_of"]
+        if base and base not in class_files:
+            from app_index import load_app_index, files_of_subclasses
+            class_files[base] = set(files_of_subclasses(load_app_index(decompiled_dir), base))
+
+    source_routes = {rule: r for rule, r in routes.items() if not r["resource_dirs"]}
+    resource_routes = {rule: r for rule, r in routes.items() if r["resource_dirs"]}
+
+    if source_routes:
+        for root, _, files in os.walk(os.path.join(decompiled_dir, "sources")):
+            for file in files:
+                file_path = os.path.join(root, file)
+                rel_path = os.path.relpath(file_path, decompiled_dir).replace(os.sep, "/")
+                if not in_scan_scope(rel_path, scope) or rel_path in generated or rel_path in copies:
+                    continue
+                is_library = is_library_code(file_path, rel_path, library_files)
+
+                for rule, rule_route in source_routes.items():
+                    if route_matches(rule_route, rel_path, is_library, class_files):
+                        table[rule].append((file_path, rel_path))
+
+    if resource_routes:
+        resources_dir = os.path.join(decompiled_dir, "resources")
+        for root, _, files in os.walk(resources_dir):
+            resource_dir = os.path.relpath(root, resources_dir).replace(os.sep, "/")
+            parent, _, name = resource_dir.rpartition("/")
+            for rule, rule_route in resource_routes.items():
+                if not any(resource_dir == d or (parent == d.rpartition("/")[0] and
+                                                 name.startswith(d.rpartition("/")[2] + "-"))
+                           for d in rule_route["resource_dirs"]):
+                    continue
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    rel_path = os.path.relpath(file_path, decompiled_dir).replace(os.sep, "/")
+                    if route_matches(rule_route, rel_path, False, class_files):
+                        table[rule].append((file_path, rel_path))
+
+    return table
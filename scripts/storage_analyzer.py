@@ -1,11 +1,19 @@
 import os
 import re
 import argparse
-import json
 import xml.etree.ElementTree as ET
+from source_files import route, route_files
+from findings import Finding, FindingWriter
+from findings_store import add_store_arguments, store_from_args
 
-def check_backup_enabled(decompiled_dir):
-    issues = []
+# the files each check reads, routed in one walk of the decompiled tree
+ROUTES = {
+    "storage": route(),
+    "keyboard_cache_layouts": route(extensions=(".xml",), resource_dirs=("res/layout",)),
+    "keyboard_cache_code": route()
+}
+
+def check_backup_enabled(decompiled_dir, issues):
     manifest_path = os.path.join(decompiled_dir, "resources", "AndroidManifest.xml")
     
     if not os.path.exists(manifest_path):
@@ -23,21 +31,18 @@ def check_backup_enabled(decompiled_dir):
         if application is not None:
             backup_attr = application.get("{http://schemas.android.com/apk/res/android}allowBackup")
             if backup_attr == "true" or backup_attr is None:
-                issues.append({
-                    "type": "Backup Enabled",
-                    "severity": "MEDIUM",
-                    "description": "App allows backups which could expose sensitive data",
-                    "location": "AndroidManifest.xml"
-                })
+                issues.append(Finding(
+                    "Backup Enabled",
+                    "MEDIUM",
+                    "App allows backups which could expose sensitive data",
+                    "AndroidManifest.xml"
+                ))
     except Exception as e:
         print(f"Error checking backup settings: {e}")
     
     return issues
 
-def analyze_storage_issues(decompiled_dir):
-    issues = []
-    java_dir = os.path.join(decompiled_dir, "sources")
-    
+def analyze_storage_issues(files, issues):
     # patterns for storage issues
     storage_patterns = [
         (r'getExternalStorage|getExternalFilesDir|Environment\.getExternalStorageDirectory', 
@@ -56,122 +61,94 @@ def analyze_storage_issues(decompiled_dir):
          "Database query - check for proper encryption")
     ]
     
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
+    for file_path, rel_path in files:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
                 
-                # skip library code
-                if "com/google/" in file_path or "androidx/" in file_path:
-                    continue
-                    
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        for pattern, description in storage_patterns:
-                            matches = re.finditer(pattern, content, re.IGNORECASE)
-                            for match in matches:
-                                context = content[max(0, match.start() - 40):match.end() + 40]
-                                issues.append({
-                                    "type": "Storage Issue",
-                                    "severity": "MEDIUM",
-                                    "description": description,
-                                    "location": rel_path,
-                                    "context": context.strip()
-                                })
-                except Exception as e:
-                    continue
+                for pattern, description in storage_patterns:
+                    matches = re.finditer(pattern, content, re.IGNORECASE)
+                    for match in matches:
+                        issues.append(Finding(
+                            "Storage Issue",
+                            "MEDIUM",
+                            description,
+                            rel_path,
+                            span=(file_path, match.start(), match.end())
+                        ))
+        except Exception as e:
+            continue
     
     return issues
 
-def check_keyboard_cache(decompiled_dir):
-    issues = []
-    java_dir = os.path.join(decompiled_dir, "sources")
-    layout_dir = os.path.join(decompiled_dir, "resources", "res", "layout")
-    
+def check_keyboard_cache(layout_files, code_files, issues):
     # check layout xml files for inputType
-    if os.path.exists(layout_dir):
-        for root, _, files in os.walk(layout_dir):
-            for file in files:
-                if file.endswith(".xml"):
-                    file_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(file_path, decompiled_dir)
+    for file_path, rel_path in layout_files:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
+                
+                # look for input fields without noPersonalizedLearning
+                if ("EditText" in content or "TextInputLayout" in content) and \
+                   ("password" in content.lower() or "credit" in content.lower() or 
+                    "username" in content.lower() or "email" in content.lower()):
                     
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            content = f.read()
-                            
-                            # look for input fields without noPersonalizedLearning
-                            if ("EditText" in content or "TextInputLayout" in content) and \
-                               ("password" in content.lower() or "credit" in content.lower() or 
-                                "username" in content.lower() or "email" in content.lower()):
-                                
-                                if "android:inputType" in content and not "textNoSuggestions" in content:
-                                    issues.append({
-                                        "type": "Keyboard Cache",
-                                        "severity": "LOW",
-                                        "description": "Sensitive input field may allow keyboard suggestions/caching",
-                                        "location": rel_path
-                                    })
-                    except Exception as e:
-                        continue
+                    if "android:inputType" in content and not "textNoSuggestions" in content:
+                        issues.append(Finding(
+                            "Keyboard Cache",
+                            "LOW",
+                            "Sensitive input field may allow keyboard suggestions/caching",
+                            rel_path
+                        ))
+        except Exception as e:
+            continue
     
     # check java for EditText configuration
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
+    for file_path, rel_path in code_files:
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
                 
-                # skip library code
-                if "com/google/" in file_path or "androidx/" in file_path:
-                    continue
+                if ("EditText" in content or "TextInputLayout" in content) and \
+                   ("password" in content.lower() or "credit" in content.lower() or
+                    "username" in content.lower() or "email" in content.lower()):
                     
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        if ("EditText" in content or "TextInputLayout" in content) and \
-                           ("password" in content.lower() or "credit" in content.lower() or
-                            "username" in content.lower() or "email" in content.lower()):
-                            
-                            if "setInputType" in content and not "InputType.TYPE_TEXT_FLAG_NO_SUGGESTIONS" in content:
-                                issues.append({
-                                    "type": "Keyboard Cache",
-                                    "severity": "LOW",
-                                    "description": "Programmatically configured input field may allow keyboard suggestions",
-                                    "location": rel_path
-                                })
-                except Exception as e:
-                    continue
+                    if "setInputType" in content and not "InputType.TYPE_TEXT_FLAG_NO_SUGGESTIONS" in content:
+                        issues.append(Finding(
+                            "Keyboard Cache",
+                            "LOW",
+                            "Programmatically configured input field may allow keyboard suggestions",
+                            rel_path
+                        ))
+        except Exception as e:
+            continue
     
     return issues
 
 def main():
     parser = argparse.ArgumentParser(description="Analyze decompiled APK for storage security issues")
     parser.add_argument("decompiled_dir", help="Path to the decompiled APK directory")
-    parser.add_argument("-o", "--output", help="Output JSON file for results")
+    parser.add_argument("-o", "--output", help="Output file for results, JSON Lines when it ends in .jsonl")
+    parser.add_argument("--details", help="Write every finding here and group repeated ones in the output")
+    add_store_arguments(parser)
     
     args = parser.parse_args()
+    store = store_from_args(parser, args, "storage_analyzer")
     
-    backup_issues = check_backup_enabled(args.decompiled_dir)
-    storage_issues = analyze_storage_issues(args.decompiled_dir)
-    keyboard_issues = check_keyboard_cache(args.decompiled_dir)
-    
-    all_issues = backup_issues + storage_issues + keyboard_issues
+    # findings go to the output file as each check produces them
+    files = route_files(args.decompiled_dir, ROUTES)
+    with FindingWriter(args.output, args.decompiled_dir, details_path=args.details, store=store) as all_issues:
+        check_backup_enabled(args.decompiled_dir, all_issues)
+        analyze_storage_issues(files["storage"], all_issues)
+        check_keyboard_cache(files["keyboard_cache_layouts"], files["keyboard_cache_code"], all_issues)
     
     # print summary
     print(f"\nAnalysis complete! Found {len(all_issues)} potential storage security issues:")
-    print(f"- Backup Issues: {len(backup_issues)} issues")
-    print(f"- Storage Issues: {len(storage_issues)} issues")
-    print(f"- Keyboard Cache Issues: {len(keyboard_issues)} issues")
+    print(f"- Backup Issues: {all_issues.type_counts.get('Backup Enabled', 0)} issues")
+    print(f"- Storage Issues: {all_issues.type_counts.get('Storage Issue', 0)} issues")
+    print(f"- Keyboard Cache Issues: {all_issues.type_counts.get('Keyboard Cache', 0)} issues")
     
-    # save results
     if args.output:
-        with open(args.output, 'w') as f:
-            json.dump(all_issues, f, indent=2)
         print(f"Detailed results saved to {args.output}")
 
 if __name__ == "__main__":
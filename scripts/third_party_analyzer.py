@@ -2,185 +2,166 @@ import os
 import re
 import argparse
 import json
+from findings import Finding, serialize_findings
 
-def detect_libraries(decompiled_dir):
-    libraries = {}
+# package prefixes per library, matched segment-wise against package paths and imports
+LIBRARY_PREFIXES = {
+    "Retrofit": ["retrofit2", "com.squareup.retrofit"],
+    "OkHttp": ["okhttp3", "com.squareup.okhttp"],
+    "Volley": ["com.android.volley"],
+    "Gson": ["com.google.gson"],
+    "Jackson": ["com.fasterxml.jackson"],
+    "Picasso": ["com.squareup.picasso"],
+    "Glide": ["com.bumptech.glide"],
+    "Firebase": ["com.google.firebase"],
+    "Facebook SDK": ["com.facebook"],
+    "Google Maps": ["com.google.android.gms.maps"],
+    "Crashlytics": ["com.crashlytics", "io.fabric"],
+    "Lottie": ["com.airbnb.lottie"],
+    "ZXing": ["com.google.zxing"],
+    "ReactiveX": ["io.reactivex"],
+    "Realm": ["io.realm"],
+    "Butterknife": ["butterknife"],
+    "Dagger": ["dagger"],
+    "Kotlin Coroutines": ["kotlinx.coroutines"],
+    "ExoPlayer": ["com.google.android.exoplayer", "com.google.android.exoplayer2"],
+    "Admob": ["com.google.android.gms.ads"],
+    "OneSignal": ["com.onesignal"],
+    "AWS SDK": ["com.amazonaws"],
+    "Stetho": ["com.facebook.stetho"]
+}
+
+AD_NETWORK_PREFIXES = {
+    "AdMob": ["com.google.android.gms.ads"],
+    "Facebook Audience Network": ["com.facebook.ads"],
+    "AppLovin": ["com.applovin"],
+    "Unity Ads": ["com.unity3d.ads"],
+    "MoPub": ["com.mopub"],
+    "Chartboost": ["com.chartboost"],
+    "InMobi": ["com.inmobi"],
+    "Tapjoy": ["com.tapjoy"],
+    "ironSource": ["com.ironsource"],
+    "Vungle": ["com.vungle"],
+    "AdColony": ["com.adcolony"]
+}
+
+TRACKING_PREFIXES = {
+    "Google Analytics": ["com.google.android.gms.analytics"],
+    "Firebase Analytics": ["com.google.firebase.analytics"],
+    "Flurry": ["com.flurry"],
+    "Mixpanel": ["com.mixpanel"],
+    "Amplitude": ["com.amplitude"],
+    "Crashlytics": ["com.crashlytics", "io.fabric.sdk.android.Fabric"],
+    "Appsflyer": ["com.appsflyer"],
+    "Adjust": ["com.adjust.sdk"],
+    "Branch": ["io.branch"],
+    "Segment": ["com.segment"],
+    "Lokalise": ["com.lokalise"],
+    "Leanplum": ["com.leanplum"]
+}
+
+IMPORT_PATTERN = re.compile(r'^\s*import\s+(?:static\s+)?([\w.]+)', re.MULTILINE)
+HEADER_PREFIXES = ("package", "import", "//", "/*", "*", "@file:")
+
+def build_prefix_trie(categories):
+    # each node maps a package segment to a child node, "" holds the (category, name) hits ending there
+    trie = {}
+    for category, prefixes in categories.items():
+        for name, package_prefixes in prefixes.items():
+            for prefix in package_prefixes:
+                node = trie
+                for segment in prefix.lower().split("."):
+                    node = node.setdefault(segment, {})
+                node.setdefault("", []).append((category, name))
+    return trie
+
+def match_prefixes(trie, dotted_name):
+    hits = []
+    node = trie
+    for segment in dotted_name.lower().split("."):
+        node = node.get(segment)
+        if node is None:
+            break
+        hits.extend(node.get("", []))
+    return hits
+
+def read_header(file_path):
+    # package and import lines come before the first declaration, the rest of the file is never read
+    lines = []
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped and not stripped.startswith(HEADER_PREFIXES):
+                break
+            lines.append(line)
+    return "".join(lines)
+
+def scan_libraries(decompiled_dir):
     java_dir = os.path.join(decompiled_dir, "sources")
+    trie = build_prefix_trie({
+        "libraries": LIBRARY_PREFIXES,
+        "ad_networks": AD_NETWORK_PREFIXES,
+        "tracking_libraries": TRACKING_PREFIXES
+    })
+    
+    libraries = {name: {"detected": False, "files": set(), "import_count": 0} for name in LIBRARY_PREFIXES}
+    ad_networks = {name: {"detected": False, "evidence": []} for name in AD_NETWORK_PREFIXES}
+    tracking_libs = {name: {"detected": False, "evidence": []} for name in TRACKING_PREFIXES}
+    results = {"libraries": libraries, "ad_networks": ad_networks, "tracking_libraries": tracking_libs}
+    
+    def record(category, name, rel_path, context, is_import):
+        entry = results[category][name]
+        entry["detected"] = True
+        
+        if category == "libraries":
+            entry["files"].add(rel_path)
+            if is_import:
+                entry["import_count"] += 1
+        elif len(entry["evidence"]) < 3:
+            entry["evidence"].append({
+                "file": rel_path,
+                "context": context
+            })
     
-    # common libraries and their detection patterns
-    library_patterns = {
-        "Retrofit": [r'retrofit2|com\.squareup\.retrofit'],
-        "OkHttp": [r'okhttp3|com\.squareup\.okhttp'],
-        "Volley": [r'com\.android\.volley'],
-        "Gson": [r'com\.google\.gson'],
-        "Jackson": [r'com\.fasterxml\.jackson'],
-        "Picasso": [r'com\.squareup\.picasso'],
-        "Glide": [r'com\.bumptech\.glide'],
-        "Firebase": [r'com\.google\.firebase'],
-        "Facebook SDK": [r'com\.facebook\.'],
-        "Google Maps": [r'com\.google\.android\.gms\.maps'],
-        "Crashlytics": [r'com\.crashlytics|io\.fabric'],
-        "Lottie": [r'com\.airbnb\.lottie'],
-        "ZXing": [r'com\.google\.zxing'],
-        "ReactiveX": [r'io\.reactivex'],
-        "Realm": [r'io\.realm'],
-        "Butterknife": [r'butterknife'],
-        "Dagger": [r'dagger'],
-        "Kotlin Coroutines": [r'kotlinx\.coroutines'],
-        "ExoPlayer": [r'com\.google\.android\.exoplayer'],
-        "Admob": [r'com\.google\.android\.gms\.ads'],
-        "OneSignal": [r'com\.onesignal'],
-        "AWS SDK": [r'com\.amazonaws'],
-        "Stetho": [r'com\.facebook\.stetho']
-    }
-    
-    for library_name in library_patterns:
-        libraries[library_name] = {
-            "detected": False,
-            "files": [],
-            "import_count": 0
-        }
-    
-    # search for library imports
     for root, _, files in os.walk(java_dir):
+        # the sources/ layout gives the package of every file in the directory
+        package = os.path.relpath(root, java_dir).replace(os.sep, ".")
+        package_hits = match_prefixes(trie, package) if package != "." else []
+        
         for file in files:
             if file.endswith(".java") or file.endswith(".kt"):
                 file_path = os.path.join(root, file)
                 rel_path = os.path.relpath(file_path, decompiled_dir)
                 
+                for category, name in package_hits:
+                    record(category, name, rel_path, f"package {package}", False)
+                
                 try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        for library_name, patterns in library_patterns.items():
-                            for pattern in patterns:
-                                if re.search(pattern, content, re.IGNORECASE):
-                                    libraries[library_name]["detected"] = True
-                                    
-                                    if rel_path not in libraries[library_name]["files"]:
-                                        libraries[library_name]["files"].append(rel_path)
-                                    
-                                    # count imports
-                                    imports = re.findall(r'import\s+(' + pattern + r'[^;]*);', content, re.IGNORECASE)
-                                    libraries[library_name]["import_count"] += len(imports)
+                    content = read_header(file_path)
                 except Exception as e:
                     continue
+                
+                for imported in IMPORT_PATTERN.findall(content):
+                    for category, name in match_prefixes(trie, imported):
+                        record(category, name, rel_path, f"import {imported}", True)
+    
+    for data in libraries.values():
+        data["files"] = sorted(data["files"])
     
-    detected_libraries = {name: data for name, data in libraries.items() if data["detected"]}
+    detected = {}
+    for category, entries in results.items():
+        detected[category] = {name: data for name, data in entries.items() if data["detected"]}
     
-    return detected_libraries
+    return detected["libraries"], detected["ad_networks"], detected["tracking_libraries"]
+
+def detect_libraries(decompiled_dir):
+    return scan_libraries(decompiled_dir)[0]
 
 def detect_ad_networks(decompiled_dir):
-    ad_networks = {}
-    java_dir = os.path.join(decompiled_dir, "sources")
-    
-    # common ad networks
-    ad_patterns = {
-        "AdMob": [r'com\.google\.android\.gms\.ads'],
-        "Facebook Audience Network": [r'com\.facebook\.ads'],
-        "AppLovin": [r'com\.applovin'],
-        "Unity Ads": [r'com\.unity3d\.ads|UnityAds'],
-        "MoPub": [r'com\.mopub'],
-        "Chartboost": [r'com\.chartboost'],
-        "InMobi": [r'com\.inmobi'],
-        "Tapjoy": [r'com\.tapjoy'],
-        "ironSource": [r'com\.ironsource'],
-        "Vungle": [r'com\.vungle'],
-        "AdColony": [r'com\.adcolony']
-    }
-    
-    for network_name in ad_patterns:
-        ad_networks[network_name] = {
-            "detected": False,
-            "evidence": []
-        }
-    
-    # search for ad networks
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        for network_name, patterns in ad_patterns.items():
-                            for pattern in patterns:
-                                matches = re.finditer(pattern, content, re.IGNORECASE)
-                                for match in matches:
-                                    context = content[max(0, match.start() - 40):match.end() + 40].strip()
-                                    ad_networks[network_name]["detected"] = True
-                                    
-                                    # Add first 3 evidence examples at most
-                                    if len(ad_networks[network_name]["evidence"]) < 3:
-                                        ad_networks[network_name]["evidence"].append({
-                                            "file": rel_path,
-                                            "context": context
-                                        })
-                except Exception as e:
-                    continue
-    
-    detected_ad_networks = {name: data for name, data in ad_networks.items() if data["detected"]}
-    
-    return detected_ad_networks
+    return scan_libraries(decompiled_dir)[1]
 
 def detect_tracking_libraries(decompiled_dir):
-    tracking_libs = {}
-    java_dir = os.path.join(decompiled_dir, "sources")
-    
-    # common tracking libraries
-    tracking_patterns = {
-        "Google Analytics": [r'com\.google\.android\.gms\.analytics'],
-        "Firebase Analytics": [r'com\.google\.firebase\.analytics'],
-        "Flurry": [r'com\.flurry'],
-        "Mixpanel": [r'com\.mixpanel'],
-        "Amplitude": [r'com\.amplitude'],
-        "Crashlytics": [r'com\.crashlytics|io\.fabric\.sdk\.android\.Fabric'],
-        "Appsflyer": [r'com\.appsflyer'],
-        "Adjust": [r'com\.adjust\.sdk'],
-        "Branch": [r'io\.branch'],
-        "Segment": [r'com\.segment'],
-        "Lokalise": [r'com\.lokalise'],
-        "Leanplum": [r'com\.leanplum']
-    }
-    
-    for lib_name in tracking_patterns:
-        tracking_libs[lib_name] = {
-            "detected": False,
-            "evidence": []
-        }
-    
-    # search for tracking libraries
-    for root, _, files in os.walk(java_dir):
-        for file in files:
-            if file.endswith(".java") or file.endswith(".kt"):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, decompiled_dir)
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        for lib_name, patterns in tracking_patterns.items():
-                            for pattern in patterns:
-                                matches = re.finditer(pattern, content, re.IGNORECASE)
-                                for match in matches:
-                                    context = content[max(0, match.start() - 40):match.end() + 40].strip()
-                                    tracking_libs[lib_name]["detected"] = True
-                                    
-                                    if len(tracking_libs[lib_name]["evidence"]) < 3:
-                                        tracking_libs[lib_name]["evidence"].append({
-                                            "file": rel_path,
-                                            "context": context
-                                        })
-                except Exception as e:
-                    continue
-    
-    detected_tracking_libs = {name: data for name, data in tracking_libs.items() if data["detected"]}
-    
-    return detected_tracking_libs
+    return scan_libraries(decompiled_dir)[2]
 
 def find_library_issues(libraries, ad_networks, tracking_libs):
     issues = []
@@ -188,24 +169,24 @@ def find_library_issues(libraries, ad_networks, tracking_libs):
     # check for excessive tracking
     tracking_count = len(tracking_libs)
     if tracking_count >= 3:
-        issues.append({
-            "type": "Excessive Tracking",
-            "severity": "MEDIUM",
-            "description": f"App uses {tracking_count} different analytics/tracking libraries",
-            "location": "Multiple files",
-            "context": f"Detected tracking libraries: {', '.join(tracking_libs.keys())}"
-        })
+        issues.append(Finding(
+            "Excessive Tracking",
+            "MEDIUM",
+            f"App uses {tracking_count} different analytics/tracking libraries",
+            "Multiple files",
+            f"Detected tracking libraries: {', '.join(tracking_libs.keys())}"
+        ))
     
     # check for multiple ad networks
     ad_network_count = len(ad_networks)
     if ad_network_count >= 2:
-        issues.append({
-            "type": "Multiple Ad Networks",
-            "severity": "LOW",
-            "description": f"App uses {ad_network_count} different ad networks",
-            "location": "Multiple files",
-            "context": f"Detected ad networks: {', '.join(ad_networks.keys())}"
-        })
+        issues.append(Finding(
+            "Multiple Ad Networks",
+            "LOW",
+            f"App uses {ad_network_count} different ad networks",
+            "Multiple files",
+            f"Detected ad networks: {', '.join(ad_networks.keys())}"
+        ))
     
     network_libs = []
     for lib_name in ["Retrofit", "OkHttp", "Volley"]:
@@ -213,13 +194,13 @@ def find_library_issues(libraries, ad_networks, tracking_libs):
             network_libs.append(lib_name)
     
     if network_libs:
-        issues.append({
-            "type": "Network Libraries",
-            "severity": "INFO",
-            "description": f"App uses {', '.join(network_libs)} for network communication",
-            "location": "Multiple files",
-            "context": "Review these implementations to ensure secure communication practices"
-        })
+        issues.append(Finding(
+            "Network Libraries",
+            "INFO",
+            f"App uses {', '.join(network_libs)} for network communication",
+            "Multiple files",
+            "Review these implementations to ensure secure communication practices"
+        ))
     
     return issues
 
@@ -230,9 +211,7 @@ def main():
     
     args = parser.parse_args()
     
-    libraries = detect_libraries(args.decompiled_dir)
-    ad_networks = detect_ad_networks(args.decompiled_dir)
-    tracking_libs = detect_tracking_libraries(args.decompiled_dir)
+    libraries, ad_networks, tracking_libs = scan_libraries(args.decompiled_dir)
     issues = find_library_issues(libraries, ad_networks, tracking_libs)
     
     # print summary
@@ -255,7 +234,7 @@ def main():
         "libraries": libraries,
         "ad_networks": ad_networks,
         "tracking_libraries": tracking_libs,
-        "issues": issues
+        "issues": serialize_findings(issues)
     }
     
     if args.output:
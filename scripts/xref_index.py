@@ -0,0 +1,117 @@
+import os
+import argparse
+import json
+from source_files import class_source_path, is_obfuscated_package
+from apk_analysis import analyze_apk
+
+XREF_INDEX_FILE = "xref_index.json"
+
+def build_xref_index(apk_path):
+    try:
+        import androguard
+    except ImportError:
+        print("Warning: androguard not installed, skipping xref index")
+        return None
+
+    if not os.path.isfile(apk_path):
+        print(f"Error: APK file not found: {apk_path}")
+        return None
+
+    print(f"Building cross-reference index for {apk_path}...")
+    try:
+        apk, _, dx = analyze_apk(apk_path)
+    except Exception as e:
+        print(f"Error analyzing APK bytecode: {e}")
+        return None
+
+    # map every referenced api method to the app methods calling it, platform apis are external and
+    # sdks bundled in the apk (play services, okhttp) are internal classes outside the app package
+    app_prefix = "L" + apk.get_package().replace(".", "/") + "/"
+    methods = {}
+    call_site_count = 0
+    for method in dx.get_methods():
+        internal = not method.is_external()
+        if internal and (method.class_name.startswith(app_prefix) or
+                         is_obfuscated_package(descriptor_to_class(method.class_name).rpartition(".")[0])):
+            # app code, or a package r8 renamed that no rule can name
+            continue
+        callers = method.get_xref_from()
+        if not callers:
+            continue
+
+        class_name = descriptor_to_class(method.class_name)
+        sites = None
+        for caller_class, caller_method, _ in callers:
+            # calls a bundled sdk makes to itself are not api usage
+            if internal and package_root(caller_class.name) == package_root(method.class_name):
+                continue
+            if sites is None:
+                sites = methods.setdefault(class_name, {}).setdefault(method.name, [])
+            site = f"{descriptor_to_class(caller_class.name)}->{caller_method.name}"
+            if site not in sites:
+                sites.append(site)
+                call_site_count += 1
+
+    print(f"Indexed {call_site_count} call sites across {len(methods)} referenced classes")
+
+    return {
+        "apk": os.path.abspath(apk_path),
+        "methods": methods
+    }
+
+def descriptor_to_class(descriptor):
+    # Lcom/example/Foo; -> com.example.Foo
+    if descriptor.startswith("L") and descriptor.endswith(";"):
+        descriptor = descriptor[1:-1]
+    return descriptor.replace("/", ".")
+
+def package_root(descriptor):
+    # Lcom/google/android/gms/Foo; -> com/google, Lokhttp3/OkHttpClient; -> okhttp3
+    return "/".join(descriptor[1:].split("/")[:-1][:2])
+
+def load_xref_index(decompiled_dir):
+    index_path = os.path.join(decompiled_dir, XREF_INDEX_FILE)
+    if not os.path.exists(index_path):
+        return None
+
+    try:
+        with open(index_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Warning: Could not load xref index: {e}")
+        return None
+
+def lookup_call_sites(index, class_name, method_names=None):
+    # method_names=None matches any method of the class
+    class_methods = index["methods"].get(class_name, {})
+
+    if method_names is None:
+        method_names = class_methods.keys()
+
+    sites = []
+    for method_name in method_names:
+        for site in class_methods.get(method_name, []):
+            sites.append((site, f"{class_name}.{method_name}"))
+
+    return sites
+
+def call_site_source(decompiled_dir, site):
+    # com.example.Foo$1->run -> sources/com/example/Foo.java, or the name jadx --deobf gave the class
+    return class_source_path(decompiled_dir, site.split("->")[0])
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a bytecode cross-reference index for an APK")
+    parser.add_argument("apk_path", help="Path to the apk file")
+    parser.add_argument("-o", "--output", help="Output JSON file for the index")
+
+    args = parser.parse_args()
+
+    index = build_xref_index(args.apk_path)
+
+    if index is not None and args.output:
+        with open(args.output, 'w') as f:
+            json.dump(index, f)
+        print(f"Xref index saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import pytest
+
+# the scripts import each other as top-level modules, the way main.py runs them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+MANIFEST = '''<?xml version="1.0" encoding="utf-8"?>
+<manifest xmlns:android="http://schemas.android.com/apk/res/android" package="com.example.app">
+    <application android:name=".App">
+        <activity android:name=".MainActivity" android:exported="true"/>
+        <activity android:name="com.example.app.settings.SettingsActivity"/>
+    </application>
+</manifest>
+'''
+
+# a jadx output tree: app code, a renamed package the app imports, a renamed and a named library,
+# bundled sdk code, a relocated copy of an app class and layouts with a qualified variant
+SOURCES = {
+    "sources/com/example/app/App.java": '''package com.example.app;
+
+import android.app.Application;
+
+public class App extends Application {
+}
+''',
+    "sources/com/example/app/MainActivity.java": '''package com.example.app;
+
+import android.app.Activity;
+import android.util.Log;
+import p000a.C0001b;
+
+public class MainActivity extends Activity {
+    void onCreate() {
+        Log.d("tag", "password " + new C0001b().token());
+    }
+}
+''',
+    "sources/com/example/app/settings/SettingsActivity.java": '''package com.example.app.settings;
+
+import com.example.app.MainActivity;
+
+public class SettingsActivity extends MainActivity {
+}
+''',
+    "sources/com/example/app/util/Hasher.java": '''package com.example.app.util;
+
+public class Hasher {
+    static String digest(String value) {
+        return "md5:" + value;
+    }
+}
+''',
+    "sources/com/example/app/legacy/OldHasher.java": '''package com.example.app.legacy;
+
+public class OldHasher {
+    static String digest(String value) {
+        return "md5:" + value;
+    }
+}
+''',
+    "sources/p000a/C0001b.java": '''package p000a;
+
+import p001c.C0002d;
+
+public class C0001b {
+    String token() {
+        return new C0002d().value;
+    }
+}
+''',
+    "sources/p001c/C0002d.java": '''package p001c;
+
+public class C0002d {
+    String value = "secret";
+}
+''',
+    "sources/p002e/C0003f.java": '''package p002e;
+
+public class C0003f {
+}
+''',
+    "sources/okhttp3/OkHttpClient.java": '''package okhttp3;
+
+public class OkHttpClient {
+}
+''',
+    "sources/com/google/gson/Gson.java": '''package com.google.gson;
+
+public class Gson {
+}
+''',
+    "resources/AndroidManifest.xml": MANIFEST,
+    "resources/res/layout/activity_main.xml": "<LinearLayout/>\n",
+    "resources/res/layout-land/activity_main.xml": "<LinearLayout/>\n",
+    "resources/res/values/strings.xml": "<resources/>\n"
+}
+
+@pytest.fixture
+def decompiled_app(tmp_path):
+    for rel_path, content in SOURCES.items():
+        path = tmp_path / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return str(tmp_path)
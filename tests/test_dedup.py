@@ -0,0 +1,44 @@
+from app_index import build_app_index, normalized_content
+from source_files import write_scan_scope, load_duplicate_files, copy_offset
+
+FIRST = "sources/com/example/app/legacy/OldHasher.java"
+COPY = "sources/com/example/app/util/Hasher.java"
+
+def read(decompiled_dir, rel_path):
+    with open(f"{decompiled_dir}/{rel_path}") as f:
+        return f.read()
+
+def test_relocated_and_renamed_copies_hash_alike():
+    first, _ = normalized_content("package a.b;\n\npublic class Foo {\n    int x;\n}\n", "sources/a/b/Foo.java")
+    copy, _ = normalized_content("package c.d.e;\n\npublic class Bar {\n    int x;\n}\n", "sources/c/d/e/Bar.java")
+    assert first == copy
+
+def test_imports_keep_classes_apart():
+    first, _ = normalized_content("package a;\nimport x.Y;\nclass Foo { Y y; }\n", "sources/a/Foo.java")
+    copy, _ = normalized_content("package a;\nimport z.Y;\nclass Foo { Y y; }\n", "sources/a/Foo.java")
+    assert first != copy
+
+def test_copies_are_recorded_once(decompiled_app):
+    write_scan_scope(decompiled_app)
+    build_app_index(decompiled_app)
+    duplicates, copies = load_duplicate_files(decompiled_app)
+    assert duplicates == {FIRST: [COPY]}
+    assert copies == {COPY}
+
+def test_offsets_map_into_the_copy(decompiled_app):
+    write_scan_scope(decompiled_app)
+    build_app_index(decompiled_app)
+    first = read(decompiled_app, FIRST)
+    copy = read(decompiled_app, COPY)
+
+    # the package lines and class names differ in length, the code after them lines up again
+    for text in ('"md5:"', "static String digest", "return"):
+        start = first.index(text)
+        mapped = copy_offset(decompiled_app, FIRST, COPY, start)
+        assert copy[mapped:mapped + len(text)] == text
+        assert copy_offset(decompiled_app, FIRST, COPY, start + len(text)) == mapped + len(text)
+
+    # a match on the renamed class name stays on the class name of the copy
+    start = first.index("OldHasher")
+    mapped = copy_offset(decompiled_app, FIRST, COPY, start)
+    assert copy[mapped:mapped + len("Hasher")] == "Hasher"
@@ -0,0 +1,31 @@
+from generated_files import classify_generated, SKIP, MINIMAL
+
+def test_generated_binding_impl_is_skipped():
+    header = '''package com.example.app.databinding;
+
+import android.util.SparseIntArray;
+import androidx.databinding.DataBindingComponent;
+import androidx.databinding.ViewDataBinding;
+
+public class ActivityMainBindingImpl extends ActivityMainBinding {
+'''
+    assert classify_generated("sources/com/example/app/databinding/ActivityMainBindingImpl.java", header) == ("Data binding", SKIP)
+
+def test_hand_written_binding_impl_is_scanned():
+    header = '''package com.example.app.auth;
+
+import com.example.app.auth.AccountBinding;
+
+public class AccountBindingImpl implements AccountBinding {
+    private final String token = "secret";
+'''
+    assert classify_generated("sources/com/example/app/auth/AccountBindingImpl.java", header) is None
+
+def test_dagger_names_need_the_generator_header():
+    assert classify_generated("sources/com/example/app/Api_Factory.java", "import dagger.internal.Factory;") == ("Dagger", SKIP)
+    assert classify_generated("sources/com/example/app/Api_Factory.java", "public class Api_Factory {") is None
+
+def test_name_rules_without_a_header_pattern():
+    assert classify_generated("sources/com/example/app/R$string.java", "") == ("R class", SKIP)
+    assert classify_generated("sources/com/example/app/BuildConfig.java", "") == ("BuildConfig", MINIMAL)
+    assert classify_generated("sources/com/example/app/BR.java", "") == ("Data binding", SKIP)
@@ -0,0 +1,38 @@
+from permission_analyzer import compile_permission_matcher, match_permission_apis, load_permission_map
+
+def matched_apis(permissions, content):
+    matcher = compile_permission_matcher(load_permission_map(), permissions)
+    return {(permission, api) for permission, api, _ in match_permission_apis(matcher, content, False)}
+
+def test_uri_and_path_literals_match_below_the_entry():
+    content = '''
+        Cursor c = getContentResolver().query(Uri.parse("content://sms/inbox"), null, null, null, null);
+        File f = new File("/sdcard/Download/x");
+        Uri calls = Uri.parse("content://call_log/calls");
+    '''
+    apis = matched_apis(["android.permission.READ_SMS", "android.permission.READ_EXTERNAL_STORAGE",
+                         "android.permission.READ_CALL_LOG"], content)
+    assert ("android.permission.READ_SMS", "string:content://sms") in apis
+    assert ("android.permission.READ_EXTERNAL_STORAGE", "string:/sdcard") in apis
+    assert ("android.permission.READ_CALL_LOG", "string:content://call_log") in apis
+
+def test_uri_literals_match_whole_segments_only():
+    content = 'String a = "content://smsbackup"; String b = "/sdcardx/file";'
+    apis = matched_apis(["android.permission.READ_SMS", "android.permission.READ_EXTERNAL_STORAGE"], content)
+    assert apis == set()
+
+def test_exact_uri_literal_still_matches():
+    apis = matched_apis(["android.permission.READ_CONTACTS"], 'Uri.parse("content://com.android.contacts")')
+    assert ("android.permission.READ_CONTACTS", "string:content://com.android.contacts") in apis
+
+def test_scheme_prefix_entries():
+    apis = matched_apis(["android.permission.SEND_SMS"], 'Intent i = new Intent(ACTION_SENDTO, Uri.parse("smsto:5551234"));')
+    assert ("android.permission.SEND_SMS", "string:smsto:") in apis
+
+def test_member_needs_its_class():
+    permissions = ["android.permission.ACCESS_FINE_LOCATION"]
+    qualified = "import android.location.LocationManager;\nlm.getLastKnownLocation(provider);"
+    unrelated = "class Cache { Location getLastKnownLocation(String p) { return null; } }"
+    assert ("android.permission.ACCESS_FINE_LOCATION", "android.location.LocationManager#getLastKnownLocation") \
+        in matched_apis(permissions, qualified)
+    assert not any(api.endswith("#getLastKnownLocation") for _, api in matched_apis(permissions, unrelated))
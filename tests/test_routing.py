@@ -0,0 +1,60 @@
+import json
+import sys
+import log_memory_analyzer
+from source_files import route, route_files, write_scan_scope
+from app_index import build_app_index
+
+def routed(table):
+    return {rule: sorted(rel_path for _, rel_path in files) for rule, files in table.items()}
+
+def test_each_rule_gets_its_own_files(decompiled_app):
+    write_scan_scope(decompiled_app)
+    build_app_index(decompiled_app)
+    table = routed(route_files(decompiled_app, {
+        "code": route(),
+        "activities": route(subclass_of="android.app.Activity"),
+        "settings": route(globs=("sources/com/example/app/settings/*",)),
+        "layouts": route(extensions=(".xml",), resource_dirs=("res/layout",))
+    }))
+
+    # the relocated copy of OldHasher is scanned once, through the first path
+    assert table["code"] == [
+        "sources/com/example/app/App.java",
+        "sources/com/example/app/MainActivity.java",
+        "sources/com/example/app/legacy/OldHasher.java",
+        "sources/com/example/app/settings/SettingsActivity.java",
+        "sources/p000a/C0001b.java",
+        "sources/p001c/C0002d.java"
+    ]
+    assert table["activities"] == [
+        "sources/com/example/app/MainActivity.java",
+        "sources/com/example/app/settings/SettingsActivity.java"
+    ]
+    assert table["settings"] == ["sources/com/example/app/settings/SettingsActivity.java"]
+    assert table["layouts"] == [
+        "resources/res/layout-land/activity_main.xml",
+        "resources/res/layout/activity_main.xml"
+    ]
+
+def test_library_code_only_for_scope_all(decompiled_app):
+    write_scan_scope(decompiled_app, "full")
+    table = routed(route_files(decompiled_app, {"app": route(), "all": route(scope="all")}))
+    assert "sources/com/google/gson/Gson.java" not in table["app"]
+    assert "sources/com/google/gson/Gson.java" in table["all"]
+    assert set(table["all"]) - set(table["app"]) == {"sources/com/google/gson/Gson.java"}
+
+def test_analyzer_routes_the_tree_once(decompiled_app, tmp_path, monkeypatch):
+    calls = []
+    def counting_route_files(decompiled_dir, routes):
+        calls.append(set(routes))
+        return route_files(decompiled_dir, routes)
+    monkeypatch.setattr(log_memory_analyzer, "route_files", counting_route_files)
+
+    output = tmp_path / "log_memory.json"
+    monkeypatch.setattr(sys, "argv", ["log_memory_analyzer.py", decompiled_app, "-o", str(output)])
+    log_memory_analyzer.main()
+
+    assert calls == [{"log_leakage", "memory_leakage"}]
+    issues = json.loads(output.read_text())
+    issues = issues["issues"] if isinstance(issues, dict) else issues
+    assert any(issue["type"] == "Log Leakage" and issue["location"].endswith("MainActivity.java") for issue in issues)
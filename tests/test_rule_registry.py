@@ -0,0 +1,56 @@
+from rule_registry import merge_duplicate_findings, shared_rules_skipped_by, shared_rule_of
+
+LOCATION = "sources/com/example/app/MainActivity.java"
+
+def random_issue(issue_type, description, offsets=None, line=None, location=LOCATION, **extra):
+    return {"type": issue_type, "description": description, "location": location,
+            "offsets": offsets, "line": line, **extra}
+
+def canonical(offsets=None, line=None, **extra):
+    return random_issue("Cryptography Issue", "Insecure random number generator used", offsets, line, **extra)
+
+def secondary(offsets=None, line=None, **extra):
+    return random_issue("Insecure Random", "Insecure random number generator used", offsets, line, **extra)
+
+def test_shared_rules_are_left_to_their_owner():
+    assert shared_rules_skipped_by("security_analyzer") == {
+        "webview_javascript", "exported_components", "insecure_random", "sensitive_logging"}
+    assert shared_rules_skipped_by("platform_analyzer") == set()
+    assert shared_rule_of(canonical()) == ("insecure_random", True)
+    assert shared_rule_of(secondary()) == ("insecure_random", False)
+
+def test_overlapping_span_is_merged_into_the_canonical_finding():
+    issues = [canonical(offsets=[100, 120]), secondary(offsets=[110, 130])]
+    assert merge_duplicate_findings(issues) == [issues[0]]
+
+def test_separate_spans_in_the_same_file_are_kept():
+    issues = [canonical(offsets=[100, 120]), secondary(offsets=[400, 420])]
+    assert merge_duplicate_findings(issues) == issues
+
+def test_absolute_and_relative_locations_match():
+    issues = [canonical(offsets=[100, 120]),
+              secondary(offsets=[100, 120], location="/tmp/out/decompiled/" + LOCATION)]
+    assert merge_duplicate_findings(issues) == [issues[0]]
+
+def test_line_fallback_without_offsets():
+    issues = [canonical(line=12), secondary(line=12), secondary(line=30)]
+    assert merge_duplicate_findings(issues) == [issues[0], issues[2]]
+
+def test_grouped_records_are_never_dropped():
+    issues = [canonical(offsets=[100, 120]), secondary(offsets=[100, 120], count=3)]
+    assert merge_duplicate_findings(issues) == issues
+
+def test_manifest_findings_merge_by_component():
+    issues = [
+        random_issue("Exported Component", "Activity 'com.example.app.MainActivity' is exported without permission protection",
+                     location="AndroidManifest.xml"),
+        random_issue("Exported Activity", "Activity com.example.app.MainActivity is exported and might be accessible by other apps",
+                     location="AndroidManifest.xml"),
+        random_issue("Exported Activity", "Activity com.example.app.OtherActivity is exported and might be accessible by other apps",
+                     location="AndroidManifest.xml")
+    ]
+    assert merge_duplicate_findings(issues) == [issues[0], issues[2]]
+
+def test_unshared_findings_pass_through():
+    issues = [random_issue("Log Leakage", "System.out printing sensitive data", offsets=[1, 5])] * 2
+    assert merge_duplicate_findings(issues) == issues
@@ -0,0 +1,54 @@
+import json
+from scan_diff import diff_scans, expanded_records, finding_fingerprint, load_scan
+
+def finding(description="Hardcoded API key found", location="sources/com/example/app/Api.java",
+            context='String key = "AKIA1234";', line=10, severity="HIGH", **extra):
+    return {"type": "Hardcoded Secret", "severity": severity, "description": description,
+            "location": location, "context": context, "line": line, **extra}
+
+def test_fingerprint_ignores_line_numbers_counts_and_absolute_paths():
+    assert finding_fingerprint(finding(line=10)) == finding_fingerprint(finding(line=250))
+    assert (finding_fingerprint(finding(description="High entropy string (score 4.8)"))
+            == finding_fingerprint(finding(description="High entropy string (score 5.1)")))
+    assert (finding_fingerprint(finding(location="/tmp/v1/decompiled/sources/com/example/app/Api.java"))
+            == finding_fingerprint(finding(location="/tmp/v2/decompiled/sources/com/example/app/Api.java")))
+    assert (finding_fingerprint(finding(context='String key =\n    "AKIA1234";'))
+            == finding_fingerprint(finding()))
+    assert finding_fingerprint(finding()) != finding_fingerprint(finding(context='String key = "AKIA9999";'))
+
+def test_new_fixed_and_remaining():
+    old = [finding(), finding(context="Log.d(TAG, password)", description="Sensitive data may be logged")]
+    new = [finding(line=42), finding(location="sources/com/example/app/Billing.java")]
+    delta = diff_scans(old, new)
+
+    assert [issue["line"] for issue in delta["remaining"]] == [42]
+    assert [issue["location"] for issue in delta["new"]] == ["sources/com/example/app/Billing.java"]
+    assert [issue["description"] for issue in delta["fixed"]] == ["Sensitive data may be logged"]
+
+def test_repeated_findings_are_counted():
+    delta = diff_scans([finding()] * 3, [finding()])
+    assert (len(delta["remaining"]), len(delta["fixed"]), len(delta["new"])) == (1, 2, 0)
+
+    delta = diff_scans([finding()], [finding()] * 3)
+    assert (len(delta["remaining"]), len(delta["fixed"]), len(delta["new"])) == (1, 0, 2)
+
+def test_grouped_records_expand_to_their_count():
+    issues = list(expanded_records([finding(count=3, sample_locations=["a", "b"]), finding(line=5)]))
+    assert len(issues) == 4
+    assert all("count" not in issue and "sample_locations" not in issue for issue in issues)
+
+def test_output_directories_are_read_from_the_details_files(tmp_path):
+    def write_scan(name, grouped, details):
+        results = tmp_path / name / "results"
+        (results / "details").mkdir(parents=True)
+        (results / "stage_status.json").write_text(json.dumps({"security_analyzer": "done"}))
+        (results / "security_analyzer.jsonl").write_text("".join(json.dumps(i) + "\n" for i in grouped))
+        if details is not None:
+            (results / "details" / "security_analyzer.jsonl").write_text("".join(json.dumps(i) + "\n" for i in details))
+        return str(tmp_path / name)
+
+    # the old scan lost its details file, its grouped record still counts three findings
+    old = write_scan("v1", [finding(count=3)], None)
+    new = write_scan("v2", [finding(count=2)], [finding(line=10), finding(line=80)])
+    delta = diff_scans(load_scan(old), load_scan(new))
+    assert (len(delta["remaining"]), len(delta["fixed"]), len(delta["new"])) == (2, 1, 0)
@@ -0,0 +1,41 @@
+from source_files import write_scan_scope, iter_source_files, is_scanned_source, is_obfuscated_package
+
+def scanned(decompiled_dir):
+    return sorted(rel_path for _, rel_path in iter_source_files(decompiled_dir))
+
+def test_app_scope_follows_the_renamed_packages_the_app_imports(decompiled_app):
+    scope = write_scan_scope(decompiled_app)
+    assert scope["namespaces"] == ["com.example.app"]
+    # p001c is only imported from p000a, p002e from nowhere
+    assert scope["obfuscated_packages"] == ["p000a", "p001c"]
+
+    assert scanned(decompiled_app) == [
+        "sources/com/example/app/App.java",
+        "sources/com/example/app/MainActivity.java",
+        "sources/com/example/app/legacy/OldHasher.java",
+        "sources/com/example/app/settings/SettingsActivity.java",
+        "sources/com/example/app/util/Hasher.java",
+        "sources/p000a/C0001b.java",
+        "sources/p001c/C0002d.java"
+    ]
+    assert not is_scanned_source(decompiled_app, "sources/p002e/C0003f.java")
+    assert not is_scanned_source(decompiled_app, "sources/okhttp3/OkHttpClient.java")
+
+def test_full_scope_reads_everything_but_bundled_sdk_code(decompiled_app):
+    write_scan_scope(decompiled_app, "full")
+    files = scanned(decompiled_app)
+    assert "sources/p002e/C0003f.java" in files
+    assert "sources/okhttp3/OkHttpClient.java" in files
+    assert "sources/com/google/gson/Gson.java" not in files
+
+def test_unreadable_manifest_falls_back_to_full_scope(decompiled_app):
+    with open(f"{decompiled_app}/resources/AndroidManifest.xml", "w") as f:
+        f.write("not xml")
+    assert write_scan_scope(decompiled_app)["mode"] == "full"
+
+def test_renamed_package_names():
+    assert is_obfuscated_package("a.b")
+    assert is_obfuscated_package("p000a.p012bc")
+    assert not is_obfuscated_package("okhttp3")
+    assert not is_obfuscated_package("com.example")
+    assert not is_obfuscated_package("")
@@ -0,0 +1,19 @@
+import json
+from source_files import DEOBF_MAP_FILE, class_source_path, load_library_files, LIBRARY_CLASSES_FILE
+
+def test_class_source_path_follows_the_deobfuscation_map(tmp_path):
+    (tmp_path / DEOBF_MAP_FILE).write_text("p a = p000a\np a.b = p001b\nc a.b.c = C0002c\nc com.example.d = C0003d\n")
+    decompiled_dir = str(tmp_path)
+    assert class_source_path(decompiled_dir, "a.b.c") == "sources/p000a/p001b/C0002c.java"
+    assert class_source_path(decompiled_dir, "a.b.c$1") == "sources/p000a/p001b/C0002c.java"
+    assert class_source_path(decompiled_dir, "com.example.d") == "sources/com/example/C0003d.java"
+    assert class_source_path(decompiled_dir, "com.example.LoginActivity") == "sources/com/example/LoginActivity.java"
+    assert class_source_path(decompiled_dir, "a") == "sources/defpackage/a.java"
+
+def test_library_classes_map_to_renamed_files(tmp_path):
+    (tmp_path / DEOBF_MAP_FILE).write_text("p a = p000a\nc a.b = C0001b\n")
+    (tmp_path / LIBRARY_CLASSES_FILE).write_text(json.dumps({"classes": {"a.b": "OkHttp 4.9.3"}}))
+    assert load_library_files(str(tmp_path)) == {"sources/p000a/C0001b.java"}
+
+def test_dex_names_without_a_map(tmp_path):
+    assert class_source_path(str(tmp_path), "com.example.Foo$Bar") == "sources/com/example/Foo.java"